@@ -12,7 +12,23 @@ void setup() {
   Serial.println("Bluetooth device is ready to pair.");
 }
 
+// One-byte commands from the host, enable together with USE_BINARY_PROTOCOL in the host scripts.
+// The sensor stream stays ASCII ("d1,d2,d3\n") until the sensor firmware sends binary frames.
+const bool USE_BINARY_PROTOCOL = false;
+
 void loop() {
+  if (USE_BINARY_PROTOCOL) {
+    // One-byte commands (L, R, F, S) are forwarded without waiting for a newline
+    while (SerialBT.available()) {
+      char command = SerialBT.read();
+      if (command == 'L' || command == 'R' || command == 'F' || command == 'S') {
+        NanoSerial.print(command);
+        NanoSerial.println(",0");
+      }
+    }
+    return;
+  }
+
   if (SerialBT.available()) { // Check if data is available
     String incomingString = SerialBT.readStringUntil('\n'); // Read until newline
     Serial.print("Received string: ");
@@ -0,0 +1,67 @@
+import argparse
+import time
+
+from objects.numpy_brain import load_model
+from utils.latency import LatencyTracker
+from utils.protocol import SensorFrameDecoder, encode_command
+from utils.virtual_serial import open_serial
+
+# Headless benchmark of the physical car control pipeline (receive, parse,
+# Brain.think, encode, write) against a simulated car, see utils/virtual_serial.py
+
+parser = argparse.ArgumentParser(description="Benchmark the car control pipeline against a simulated car")
+parser.add_argument("--model", default="models/model_last.pkl")
+parser.add_argument("--track", default="assets/tracks/track_0.json")
+parser.add_argument("--protocol", choices=["binary", "ascii"], default="binary")
+parser.add_argument("--rate", type=float, default=0, help="sensor readings per second, 0 for unlimited")
+parser.add_argument("--duration", type=float, default=5, help="seconds to run")
+parser.add_argument("--log", default=None, help="optional CSV file for the per-sample latencies")
+args = parser.parse_args()
+
+brain = load_model(args.model)
+
+port = open_serial(f"sim://car?track={args.track}&protocol={args.protocol}&rate={args.rate}", timeout=1)
+decoder = SensorFrameDecoder()
+latency = LatencyTracker(["receive", "parse", "think", "encode", "write"], window=10000, log_path=args.log)
+
+readings = 0
+start = time.perf_counter()
+while time.perf_counter() - start < args.duration:
+    latency.start()
+    if args.protocol == "binary":
+        data = port.read(max(port.in_waiting, 1))
+        latency.mark("receive")
+        frames = decoder.feed(data)
+        if not frames:
+            continue
+        ray_distances = frames[-1][1]
+    else:
+        data = port.readline()
+        latency.mark("receive")
+        ray_distances = [float(x) for x in data.decode("utf-8").strip().split(",") if x]
+    latency.mark("parse")
+
+    # The simulated car sends pixels, the brain was trained on distances normalized by the ray length
+    steering = brain.think([d / port.device.car.max_ray_length for d in ray_distances])
+    if isinstance(steering, list):
+        steering = steering[0]  # The car only turns or drives straight, ignore the throttle
+    latency.mark("think")
+    command = encode_command(steering, 0.2)
+    latency.mark("encode")
+    port.write(command)
+    latency.mark("write")
+    latency.finish()
+    readings += 1
+
+elapsed = time.perf_counter() - start
+port.close()
+latency.close()
+
+# Like the control scripts, only the newest reading of a batch is acted on when the host falls behind
+received = decoder.frames if args.protocol == "binary" else readings
+print(f"protocol: {args.protocol}, readings sent by the car: {port.device.messages_sent}")
+print(f"readings decoded: {received / elapsed:.0f}/s, control decisions: {readings / elapsed:.0f}/s, "
+      f"commands received by the car: {port.device.commands_received}")
+if args.protocol == "binary":
+    print(f"frames lost: {decoder.lost_frames}, checksum errors: {decoder.checksum_errors}")
+print("\n".join(latency.summary_lines()))
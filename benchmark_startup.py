@@ -0,0 +1,63 @@
+import ast
+import os
+import subprocess
+import sys
+
+# Measures the startup cost of every entry point: the time to run its top-level
+# imports in a fresh interpreter and which heavy dependencies they load.
+# The scripts start their main loop at import, so their import statements are
+# extracted with ast instead of importing the scripts themselves.
+
+ENTRY_POINTS = ["train.py", "show_model.py", "bluetooth_control.py", "car_control.py", "track_edit.py"]
+HEAVY_MODULES = ["torch", "pygame", "serial"]
+RUNS = 5
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def top_level_imports(filepath):
+    """Returns the source of the import statements at the top level of a script."""
+    with open(filepath, "r") as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return "\n".join(ast.get_source_segment(source, node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure(code):
+    """Runs code in fresh interpreters and returns the best time and the heavy modules it loaded."""
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    times = []
+    loaded = ""
+    for _ in range(RUNS):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        elapsed, _, loaded = result.stdout.strip().partition(" ")
+        times.append(float(elapsed))
+    return min(times), loaded or "-"
+
+
+print(f"{'entry point':<22} {'import time':>11}  heavy modules loaded")
+for entry_point in ENTRY_POINTS:
+    elapsed, loaded = measure(PROBE.format(imports=top_level_imports(entry_point), heavy=HEAVY_MODULES))
+    if elapsed is None:
+        print(f"{entry_point:<22} {'failed':>11}  {loaded}")
+    else:
+        print(f"{entry_point:<22} {elapsed * 1000:9.0f}ms  {loaded}")
+
+# Loading the model is part of the startup of the control scripts too
+print()
+for label, imports in [
+    ("model (pickle)", "import pickle\npickle.load(open('models/model_last.pkl', 'rb'))"),
+    ("model (numpy)", "from objects.numpy_brain import load_model\nload_model('models/model_last.pkl')"),
+]:
+    elapsed, loaded = measure(PROBE.format(imports=imports, heavy=HEAVY_MODULES))
+    print(f"{label:<22} {elapsed * 1000:9.0f}ms  {loaded}")
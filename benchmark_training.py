@@ -0,0 +1,103 @@
+import argparse
+import contextlib
+import glob
+import io
+import random
+import time
+import numpy as np
+import torch
+
+import evaluate_models
+from objects.brain import Brain
+from objects.environment import VectorCarEnv
+from objects.numpy_brain import NumpyBrain
+from objects.population import Population
+from objects.ppo import PPOTrainer
+from objects.sensors import DEFAULT_SENSORS
+from train_rl import load_tracks
+
+# Sample efficiency of PPO (train_rl.py) against the genetic algorithm of train.py.
+# Both train for the same number of environment steps (cars x ticks). The current
+# policy (for the GA, the best car kept from the last generation) is evaluated
+# regularly on all tracks with evaluate_models.py.
+
+parser = argparse.ArgumentParser(description="Compare the sample efficiency of PPO and the genetic algorithm")
+parser.add_argument("--steps", type=int, default=300_000, help="environment steps per method")
+parser.add_argument("--eval-every", type=int, default=30_000, help="environment steps between evaluations")
+parser.add_argument("--control-mode", choices=["discrete", "continuous"], default="continuous")
+parser.add_argument("--starts", type=int, default=3, help="start poses per track in the evaluation")
+parser.add_argument("--max-ticks", type=int, default=3000, help="ticks per evaluation run")
+parser.add_argument("--seed", type=int, default=0)
+args = parser.parse_args()
+
+track_paths = sorted(glob.glob("assets/tracks/*.json"))
+tracks = load_tracks()
+evaluate_models.load_tracks(track_paths)
+
+
+def evaluate(brain):
+    """Returns the completion rate and mean progress of a brain on all tracks."""
+    numpy_brain = NumpyBrain.from_brain(brain)
+    runs = [run for t in range(len(track_paths))
+            for run in evaluate_models.evaluate((0, numpy_brain, t, args.starts, args.max_ticks))]
+    return (np.mean([run["outcome"] == "completed" for run in runs]),
+            np.mean([max(run["progress"], 0) for run in runs]))
+
+
+def seed_everything():
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+
+
+results = {"ppo": [], "ga": []}
+
+# PPO
+seed_everything()
+start = time.perf_counter()
+env = VectorCarEnv(tracks, num_envs=16, control_mode=args.control_mode, seed=args.seed)
+trainer = PPOTrainer(env, Brain(DEFAULT_SENSORS.num_rays, [3], env.action_size, DEFAULT_SENSORS), seed=args.seed)
+next_eval = args.eval_every
+
+
+def evaluate_ppo(trainer):
+    global next_eval
+    if trainer.env_steps >= next_eval:
+        results["ppo"].append((trainer.env_steps, *evaluate(trainer.brain)))
+        next_eval += args.eval_every
+
+
+with contextlib.redirect_stdout(io.StringIO()):  # Car prints "track completed"
+    trainer.train(args.steps, callback=evaluate_ppo)
+ppo_time = time.perf_counter() - start
+
+# Genetic algorithm, the same population as train.py
+seed_everything()
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):  # Car prints "track completed"
+    population = Population(size=50, track=tracks[0], control_mode=args.control_mode)
+population.track_list = tracks
+steps = 0
+next_eval = args.eval_every
+generation = population.generation
+while steps < args.steps:
+    steps += sum(car["car"].is_alive for car in population.cars)
+    with contextlib.redirect_stdout(io.StringIO()):
+        population.update_population()
+    if population.generation != generation:
+        generation = population.generation
+        if steps >= next_eval:
+            # The first car of a new generation is the unchanged best of the last one
+            results["ga"].append((steps, *evaluate(population.cars[0]["brain"])))
+            next_eval += args.eval_every
+ga_time = time.perf_counter() - start
+
+print(f"{'method':<6} {'env steps':>10} {'completed':>9} {'progress':>8}")
+for method, rows in results.items():
+    for steps, completion, progress in rows:
+        print(f"{method:<6} {steps:>10} {completion:>9.0%} {progress:>8.2f}")
+print(f"\nppo: {ppo_time:.0f}s, ga: {ga_time:.0f}s (including evaluations)")
+for method, rows in results.items():
+    # Steps until the policy first completed a third of the evaluation runs
+    reached = [steps for steps, completion, _ in rows if completion >= 1 / 3]
+    print(f"{method}: {reached[0] if reached else 'not'} steps to complete 1/3 of the runs")
@@ -1,11 +1,22 @@
 import pygame
-import pickle
 import os
-import serial
 import time
 from objects.track import Track
 from objects.car import Car
-from objects.brain import Brain
+from objects.numpy_brain import load_model
+from utils.calibration import load_calibration
+from utils.latency import LatencyTracker
+from utils.virtual_serial import open_serial
+from utils.protocol import SensorFrameDecoder, encode_command, COMMAND_STOP, NUM_RAYS
+from utils.session_log import SessionRecorder
+
+# Serial port of the car, can be overridden with the CAR_PORT environment variable.
+# Any pyserial URL works too (e.g. "loop://") and "sim://car" drives a simulated car, see utils/virtual_serial.py
+PORT = os.environ.get("CAR_PORT", "COM7")
+# Binary sensor frames and one-byte commands (utils/protocol.py). The firmware in the repo still sends the
+# ASCII stream ("d1,d2,d3\n") and takes "L,0" commands, only enable this for firmware that sends binary frames
+USE_BINARY_PROTOCOL = False
+MODEL_PATH = "models/model_last.pkl"
 
 # Initialize Pygame for visualization
 pygame.init()
@@ -14,31 +25,68 @@ WINDOW_HEIGHT = 600
 screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
 pygame.display.set_caption("Physical Car Control")
 clock = pygame.time.Clock()
+font = pygame.font.SysFont("monospace", 16)
+
+# Per-stage latency of the control loop, from reading the raycast line to writing the command
+latency = LatencyTracker(
+    ["receive", "parse", "think", "encode", "write"],
+    log_path=os.path.join("logs", f"latency_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+)
+
+# Raw readings, brain outputs and commands of the session, replay them with replay_session.py
+recorder = SessionRecorder(os.path.join("logs", f"session_{time.strftime('%Y%m%d_%H%M%S')}.session"), NUM_RAYS)
 
-# Load the trained brain
+# Load the trained brain, NumPy inference keeps torch out of the control loop
 try:
-    with open("models/model_last.pkl", "rb") as f:
-        brain = pickle.load(f)
+    brain = load_model(MODEL_PATH)
 except FileNotFoundError:
     print("Error: model_last.pkl not found. Please train the model first.")
     exit(1)
+if brain.sensors is not None and brain.sensors.num_rays != NUM_RAYS:
+    print(f"Error: the model expects {brain.sensors.num_rays} rays, the car has {NUM_RAYS} sensors.")
+    exit(1)
+
+# Maps the raw sensor readings to the normalized ray lengths the brain was trained on, see utils/calibration.py
+calibration = load_calibration(MODEL_PATH)
+if calibration is None:
+    print("Warning: no sensor calibration found, the raw readings are fed to the brain. "
+          "Run python -m utils.calibration to create one.")
 
 # Initialize Bluetooth connection
 try:
     # Adjust the port name based on your system
-    bluetooth = serial.Serial('COM7', 9600, timeout=1)  # Windows
+    bluetooth = open_serial(PORT, 9600, timeout=1)
     time.sleep(2)  # Wait for connection to establish
     print("Bluetooth connection established")
-    command = "S,0"
-    bluetooth.write(command.encode())
+    bluetooth.write(COMMAND_STOP if USE_BINARY_PROTOCOL else "S,0".encode())
 except Exception as e:
     print(f"Error connecting to Bluetooth: {e}")
     exit(1)
 
+decoder = SensorFrameDecoder()
+
+def read_ray_distances():
+    """Reads the newest sensor reading from the car, returns None if no complete reading arrived."""
+    if USE_BINARY_PROTOCOL:
+        data = bluetooth.read(bluetooth.in_waiting)
+        latency.mark("receive")
+        frames = decoder.feed(data)
+        # Only the newest reading matters, acting on older ones makes the car react late
+        return frames[-1][1] if frames else None
+
+    data = bluetooth.readline()
+    latency.mark("receive")
+    data = data.decode('utf-8').strip()
+    # split the data into a list and remove empty strings without converting to float
+    data = [x for x in data.split(',') if x]
+    if len(data) == 3:
+        #convert to float
+        return [float(x) for x in data]
+    return None
+
 # Create a virtual car for visualization
 track = Track("assets/tracks/track_org.json", WINDOW_WIDTH, WINDOW_HEIGHT)
 car = Car(0, 0, track, color=(0, 0, 255))
-car.brain = brain
 
 # Main control loop
 running = True
@@ -54,36 +102,44 @@ while running:
     try:
         # Read sensor data from Bluetooth
         if bluetooth.in_waiting > 0:
-            data = bluetooth.readline().decode('utf-8').strip()
-            if data:
-                # split the data into a list and remove empty strings without converting to float
-                data = [x for x in data.split(',') if x]
-                if len(data) == 3:
-                    # data[2] = 50
-                    #convert to float
-                    ray_distances = [float(x) for x in data]
-                    
-                    # Use brain to determine steering
-                    steering = brain.think(ray_distances)
-                    
-                    # Send control command to car
-                    if steering >= 0.2:
-                        command = "L,0"
-                    elif steering <= -0.2:
-                        command = "R,0"
-                    else:
-                        command = "f,0"
-                    print(f"ray_distances: {ray_distances}, steering: {steering}, sending command: {command}")
-                    bluetooth.write(command.encode())
-                    
-                    # Draw visualization
-                    screen.fill((150, 150, 150))
-                    pygame.display.flip()
-                    command = "S,0"
-                    bluetooth.write(command.encode())
-                    print(f"sending command: {command}")
-
-                
+            latency.start()
+            ray_distances = read_ray_distances()
+            if ray_distances:
+                raw_distances = ray_distances
+                if calibration is not None:
+                    ray_distances = calibration.apply(ray_distances).tolist()
+                latency.mark("parse")
+
+                # Use brain to determine steering
+                outputs = steering = brain.think(ray_distances)
+                if isinstance(steering, list):
+                    steering = steering[0]  # The car only turns or drives straight, ignore the throttle
+                latency.mark("think")
+
+                # Send control command to car
+                if USE_BINARY_PROTOCOL:
+                    command = encode_command(steering, 0.2)
+                elif steering >= 0.2:
+                    command = "L,0".encode()
+                elif steering <= -0.2:
+                    command = "R,0".encode()
+                else:
+                    command = "f,0".encode()
+                latency.mark("encode")
+                bluetooth.write(command)
+                latency.mark("write")
+                latency.finish()
+                recorder.record(raw_distances, outputs, command)
+                print(f"ray_distances: {ray_distances}, steering: {steering}, sending command: {command}")
+
+                # Draw visualization
+                screen.fill((150, 150, 150))
+                latency.draw(screen, font, (10, 10))
+                pygame.display.flip()
+                command = COMMAND_STOP if USE_BINARY_PROTOCOL else "S,0".encode()
+                bluetooth.write(command)
+                print(f"sending command: {command}")
+
     except Exception as e:
         print(f"Error in control loop: {e}")
         time.sleep(0.1)  # Wait a bit before retrying
@@ -91,5 +147,7 @@ while running:
     clock.tick(60)
 
 # Clean up
+latency.close()
+recorder.close()
 bluetooth.close()
 pygame.quit() 
\ No newline at end of file
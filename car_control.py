@@ -3,7 +3,20 @@ import serial
 import sys
 import numpy as np
 import time
+import os
 from objects.democar import Democar
+from utils.calibration import load_calibration
+from utils.latency import LatencyTracker
+from utils.virtual_serial import open_serial
+from utils.protocol import SensorFrameDecoder, NUM_RAYS
+from utils.session_log import SessionRecorder
+
+# Serial port of the car, can be overridden with the CAR_PORT environment variable.
+# Any pyserial URL works too (e.g. "loop://") and "sim://car" drives a simulated car, see utils/virtual_serial.py
+PORT = os.environ.get("CAR_PORT", "COM7")
+# Binary sensor frames and one-byte commands (utils/protocol.py). The firmware in the repo still sends the
+# ASCII stream ("d1,d2,d3\n") and takes "L,0" commands, only enable this for firmware that sends binary frames
+USE_BINARY_PROTOCOL = False
 
 # Initialize Pygame
 pygame.init()
@@ -17,22 +30,53 @@ pygame.display.set_caption("Car Visualization")
 
 # Set up the clock for controlling frame rate
 clock = pygame.time.Clock()
+font = pygame.font.SysFont("monospace", 16)
+
+# Per-stage latency of the control loop, from reading the raycast line to writing the command
+latency = LatencyTracker(
+    ["receive", "parse", "encode", "write"],
+    log_path=os.path.join("logs", f"latency_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+)
+
+# Raw readings and commands of the session, replay them with replay_session.py
+recorder = SessionRecorder(os.path.join("logs", f"session_{time.strftime('%Y%m%d_%H%M%S')}.session"), NUM_RAYS)
 
 running = True
 ser = None
 current_command = None
 model_output = 0
 stop = False
+decoder = SensorFrameDecoder()
+
+# Maps the raw sensor readings to normalized ray lengths, see utils/calibration.py
+calibration = load_calibration("models/model_last.pkl")
 
 def read_raycast():
     if ser and ser.is_open:
         try:
-            data = ser.readline().decode('utf-8').strip()
+            if ser.in_waiting == 0:
+                return None
+            # Start timing once data has arrived, so "receive" doesn't include waiting for the next reading
+            latency.start()
+            if USE_BINARY_PROTOCOL:
+                data = ser.read(ser.in_waiting)
+                latency.mark("receive")
+                frames = decoder.feed(data)
+                if frames:
+                    latency.mark("parse")
+                    # Only the newest reading matters, older ones are already outdated
+                    return frames[-1][1]
+                return None
+
+            data = ser.readline()
+            latency.mark("receive")
+            data = data.decode('utf-8').strip()
             if data:  # Only process non-empty lines
                 try:
                     # split the data into a list and remove empty strings
                     data = [float(x) for x in data.split(',') if x]
                     if len(data) == 3:  # Ensure we have exactly 3 values
+                        latency.mark("parse")
                         return data
                 except ValueError:
                     print(f"Invalid data received: {data}")
@@ -45,7 +89,14 @@ def send_command(command):
     global current_command
     if command != current_command:  # Only send if command has changed
         try:
-            ser.write(f"{command}\n".encode())
+            if USE_BINARY_PROTOCOL:
+                # One-byte commands, the first letter of "L,0", "R,0", "F,0" and "STOP"
+                encoded_command = command[:1].upper().encode()
+            else:
+                encoded_command = f"{command}\n".encode()
+            latency.mark("encode")
+            ser.write(encoded_command)
+            latency.mark("write")
             print(f"Sent command: {command}")
             current_command = command
         except serial.SerialException:
@@ -54,15 +105,14 @@ def send_command(command):
 try:
     # Add a small delay before connecting to allow the port to reset
     time.sleep(1)
-    ser = serial.Serial('COM7', 9600, timeout=0.1)  # Reduced timeout
-    print("Connected to COM7")
+    ser = open_serial(PORT, 9600, timeout=0.1)  # Reduced timeout
+    print(f"Connected to {PORT}")
 
     # Initialize the car
     car = Democar(x=WINDOW_WIDTH/2, y=WINDOW_HEIGHT/2)
 
     while running:
         # Handle events
-        command = ""
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
@@ -94,13 +144,21 @@ try:
         # Read raycast data
         raycast = read_raycast()
         if raycast:
-            car.ray_lengths = raycast
+            if calibration is not None:
+                car.ray_lengths = calibration.apply(raycast).tolist()
+            else:
+                # Uncalibrated, draw one raw unit as two pixels
+                car.ray_lengths = [d * 2 / car.sensors.max_range for d in raycast]
         
         # Update car control
-        send_command(command)
-        current_command = command
+        send_command(new_command)
+        if raycast:
+            latency.finish()
+            # current_command is what send_command last wrote, i.e. what the car is executing
+            recorder.record(raycast, command=current_command)
         # Draw the car
         car.draw(screen)
+        latency.draw(screen, font, (10, 10), color=(0, 0, 0))
         
         # Update the display
         pygame.display.flip()
@@ -109,10 +167,12 @@ try:
         clock.tick(60)
 
 except serial.SerialException as e:
-    print(f"Error while connecting to COM7: {str(e)}")
+    print(f"Error while connecting to {PORT}: {str(e)}")
     sys.exit(1)
 
 finally:
+    latency.close()
+    recorder.close()
     # Ensure the serial port is properly closed
     if ser and ser.is_open:
         ser.close()
@@ -0,0 +1,179 @@
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from objects.car import Car
+from objects.numpy_brain import load_model
+from objects.track import Track
+
+# Headless leaderboard of model checkpoints. Every model drives on every track
+# from the same fixed start poses, the (model, track) pairs run in parallel.
+#
+#   python evaluate_models.py                      # models/*.pkl on assets/tracks/*.json
+#   python evaluate_models.py models/model_1*.pkl --starts 10 --csv leaderboard.csv
+
+WINDOW_WIDTH = 1000  # Same track scale as train.py
+WINDOW_HEIGHT = 1000
+
+parser = argparse.ArgumentParser(description="Rank model checkpoints on all tracks")
+parser.add_argument("models", nargs="*", default=None, help="model files, models/*.pkl by default")
+parser.add_argument("--tracks", nargs="+", default=None, help="track files, assets/tracks/*.json by default")
+parser.add_argument("--starts", type=int, default=5, help="start poses per track")
+parser.add_argument("--max-ticks", type=int, default=10000, help="ticks before a run is stopped")
+parser.add_argument("--workers", type=int, default=os.cpu_count())
+parser.add_argument("--csv", default=None, help="optional CSV file for the leaderboard")
+
+tracks = []
+
+
+def load_tracks(track_paths):
+    """Loads the tracks once per worker process."""
+    with contextlib.redirect_stdout(io.StringIO()):  # Track prints a line per loaded file
+        tracks.extend(Track(path, width=WINDOW_WIDTH, height=WINDOW_HEIGHT) for path in track_paths)
+
+
+def start_poses(track, count):
+    """Returns the same `count` (angle, (row, column)) start poses of a track on every run."""
+    if track.start_poses is not None:
+        indices = np.linspace(0, len(track.start_poses) - 1, count).astype(int)
+        return [(int(angle), (int(r), int(c))) for r, c, angle in track.start_poses[indices]]
+    # Older track files without precomputed poses, draw them with a fixed seed
+    state = np.random.get_state()
+    np.random.seed(0)
+    poses = [track.randomize_start_pos() for _ in range(count)]
+    np.random.set_state(state)
+    return poses
+
+
+def evaluate(task):
+    """
+    Runs a brain from every start pose of a track, all start poses at once.
+
+    Returns:
+        list[dict]: One result per start pose with the outcome, ticks and progress
+    """
+    model_index, brain, track_index, num_starts, max_ticks = task
+    track = tracks[track_index]
+    poses = start_poses(track, num_starts)
+    cars = []
+    for angle, (r, c) in poses:
+        x, y = track.pixel_to_world(c, r)
+        car = Car(x, y, track, start_angle=angle, sensors=brain.sensors)
+        car.ray_cast()
+        cars.append(car)
+
+    # Progress is unwrapped over the start line, so one lap is 1.0 and driving backwards is negative
+    last_progress = [track.progress_at(car.x, car.y) for car in cars]
+    progress = np.zeros(len(cars))
+    ticks = np.zeros(len(cars), dtype=int)
+    # Recurrent brains carry a hidden state per car between ticks
+    hidden = np.zeros((len(cars), brain.hidden_size), dtype=np.float32) if hasattr(brain, "step") else None
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Car prints "track completed"
+        for tick in range(max_ticks):
+            alive = [i for i, car in enumerate(cars) if car.is_alive]
+            if not alive:
+                break
+            readings = np.array([cars[i].ray_lengths for i in alive], dtype=np.float32)
+            if hidden is None:
+                outputs = brain.forward(readings)
+            else:
+                outputs, hidden[alive] = brain.step(readings, hidden[alive])
+            for i, output in zip(alive, outputs):
+                car = cars[i]
+                if len(output) > 1:
+                    car.control_continuous(output[0], output[1])
+                else:
+                    car.control(output[0], 0.2)
+                ticks[i] = tick + 1
+
+                current = track.progress_at(car.x, car.y)
+                if current is not None and last_progress[i] is not None:
+                    delta = current - last_progress[i]
+                    progress[i] += delta - np.round(delta)  # Crossing the start line jumps by ~1
+                if current is not None:
+                    last_progress[i] = current
+
+    results = []
+    for i, car in enumerate(cars):
+        if car.is_alive:
+            outcome = "timeout"
+        elif car.distance_traveled > Car.COMPLETION_DISTANCE:
+            outcome = "completed"
+        elif car.stuck_frames > 60:
+            outcome = "stuck"
+        else:
+            outcome = "crashed"
+        results.append({"model": model_index, "track": track_index, "outcome": outcome, "ticks": int(ticks[i]),
+                        "progress": float(progress[i]) if track.progress is not None
+                        else car.distance_traveled / Car.COMPLETION_DISTANCE})
+    return results
+
+
+def leaderboard(model_paths, results):
+    """Aggregates the runs per model and ranks the models."""
+    rows = []
+    for index, path in enumerate(model_paths):
+        runs = [run for run in results if run["model"] == index]
+        crashes = [run["ticks"] for run in runs if run["outcome"] == "crashed"]
+        rows.append({
+            "model": path,
+            "runs": len(runs),
+            "completion_rate": np.mean([run["outcome"] == "completed" for run in runs]),
+            "mean_progress": np.mean([max(run["progress"], 0) for run in runs]),
+            "crash_rate": len(crashes) / len(runs),
+            "ticks_to_crash": np.mean(crashes) if crashes else float("nan"),
+            "tracks_completed": len({run["track"] for run in runs if run["outcome"] == "completed"}),
+        })
+    # Completing is what matters, then getting far, then lasting long before crashing
+    rows.sort(key=lambda row: (row["completion_rate"], row["mean_progress"],
+                               np.nan_to_num(row["ticks_to_crash"], nan=np.inf)), reverse=True)
+    return rows
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    model_paths = sorted(args.models or glob.glob("models/*.pkl"))
+    track_paths = sorted(args.tracks or glob.glob("assets/tracks/*.json"))
+
+    # Load the models up front, this also writes the NumPy caches before the workers start
+    brains, loaded_paths = [], []
+    for path in model_paths:
+        try:
+            brains.append(load_model(path))
+            loaded_paths.append(path)
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+
+    tasks = [(m, brain, t, args.starts, args.max_ticks) for m, brain in enumerate(brains) for t in range(len(track_paths))]
+    print(f"Evaluating {len(brains)} models on {len(track_paths)} tracks from {args.starts} start poses "
+          f"({len(tasks) * args.starts} runs, {args.workers} workers)")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=load_tracks, initargs=(track_paths,)) as executor:
+        results = [run for runs in executor.map(evaluate, tasks) for run in runs]
+    elapsed = time.perf_counter() - start
+
+    rows = leaderboard(loaded_paths, results)
+    name_width = max(len("model"), *(len(row["model"]) for row in rows)) if rows else len("model")
+    print(f"\n{'rank':>4}  {'model':<{name_width}}  {'completed':>9}  {'progress':>8}  {'crashed':>7}  "
+          f"{'ticks to crash':>14}  {'tracks':>6}")
+    for rank, row in enumerate(rows, 1):
+        print(f"{rank:>4}  {row['model']:<{name_width}}  {row['completion_rate']:>9.0%}  {row['mean_progress']:>8.2f}  "
+              f"{row['crash_rate']:>7.0%}  {row['ticks_to_crash']:>14.0f}  "
+              f"{row['tracks_completed']:>3}/{len(track_paths)}")
+    print(f"\n{len(results)} runs in {elapsed:.1f}s")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["rank", *rows[0].keys()] if rows else ["rank"])
+            writer.writeheader()
+            for rank, row in enumerate(rows, 1):
+                writer.writerow({"rank": rank, **row})
+        print(f"Saved {args.csv}")
@@ -0,0 +1,27 @@
+import importlib
+
+# Classes are imported on first access, so e.g. `from objects import Track` doesn't
+# pull in torch through objects.brain. Import the submodules directly as before
+# (`from objects.track import Track`) and only the modules you use are loaded.
+_LAZY_CLASSES = {
+    "Track": "objects.track",
+    "Car": "objects.car",
+    "Democar": "objects.democar",
+    "Brain": "objects.brain",
+    "RecurrentBrain": "objects.brain",
+    "NumpyBrain": "objects.numpy_brain",
+    "NumpyRecurrentBrain": "objects.numpy_brain",
+    "Population": "objects.population",
+    "SensorConfig": "objects.sensors",
+    "SensorEffects": "objects.sensors",
+    "Genome": "objects.neat",
+    "NeatPopulation": "objects.neat",
+}
+
+__all__ = list(_LAZY_CLASSES)
+
+
+def __getattr__(name):
+    if name in _LAZY_CLASSES:
+        return getattr(importlib.import_module(_LAZY_CLASSES[name]), name)
+    raise AttributeError(f"module 'objects' has no attribute '{name}'")
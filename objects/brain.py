@@ -3,15 +3,18 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 class Brain(nn.Module):
-    def __init__(self, num_rays, hidden_layers):
+    def __init__(self, num_rays, hidden_layers, num_outputs=1, sensors=None):
         """
         A neural network brain for the car that processes raycast distances.
         
         Args:
             car: The car object this brain control            num_rays: Number of raycast distances to process
             hidden_layers: List of integers representing hidden layer sizes
+            num_outputs: 1 for steering only, 2 for steering and throttle (continuous control)
+            sensors: SensorConfig the brain is trained with, saved with the model
         """
         super(Brain, self).__init__()
+        self.sensors = sensors
         
         # Build network layers
         self.layers = nn.ModuleList()
@@ -26,11 +29,11 @@ class Brain(nn.Module):
                 hidden_layer = nn.Linear(hidden_layers[i], hidden_layers[i + 1])
                 self.layers.append(hidden_layer)
                 
-            # Output layer (steering only)
-            self.output_layer = nn.Linear(hidden_layers[-1], 1)
+            # Output layer (steering, optionally throttle)
+            self.output_layer = nn.Linear(hidden_layers[-1], num_outputs)
         else:
             # Direct input to output if no hidden layers
-            self.output_layer = nn.Linear(num_rays, 1)
+            self.output_layer = nn.Linear(num_rays, num_outputs)
         
         # Initialize weights and biases
         self.randomize_weights()
@@ -61,7 +64,8 @@ class Brain(nn.Module):
             ray_distances: List or tensor of raycast distances
             
         Returns:
-            steering values between -1 and 1
+            steering value between -1 and 1, or a list [steering, throttle]
+            for brains with more than one output
         """
         
         with torch.no_grad():
@@ -73,12 +77,100 @@ class Brain(nn.Module):
             if len(ray_distances.shape) == 1:
                 ray_distances = ray_distances.unsqueeze(0)
                 
-            # Get network output (steering only)
-            steering = self(ray_distances)[0].item()
-            
-            return steering
+            # Get network output
+            outputs = self(ray_distances)[0]
+            if len(outputs) == 1:
+                return outputs.item() # Steering only
+            return outputs.tolist()
+
+    def get_parameters(self):
+        """Returns all weights and biases as one flat NumPy vector, the layout used by objects/optimizers.py."""
+        return torch.nn.utils.parameters_to_vector(self.parameters()).detach().numpy().copy()
+
+    def set_parameters(self, vector):
+        """Sets all weights and biases from a flat vector returned by get_parameters()."""
+        with torch.no_grad():
+            torch.nn.utils.vector_to_parameters(torch.as_tensor(vector, dtype=torch.float32), self.parameters())
 
     def mutate(self, example_brain, mutation_rate=0.01):
         for layer in self.layers:
             layer.weight.data += torch.randn_like(layer.weight.data) * 0.01
             layer.bias.data += torch.randn_like(layer.bias.data) * 0.01
+
+
+class RecurrentBrain(nn.Module):
+    def __init__(self, num_rays, hidden_size=8, num_outputs=1, sensors=None):
+        """
+        A brain with memory: a GRU cell keeps a hidden state between ticks, so the
+        car can tell whether a wall is getting closer and what it just did.
+
+        Args:
+            num_rays: Number of raycast distances to process
+            hidden_size: Size of the hidden state
+            num_outputs: 1 for steering only, 2 for steering and throttle (continuous control)
+            sensors: SensorConfig the brain is trained with, saved with the model
+        """
+        super(RecurrentBrain, self).__init__()
+        self.sensors = sensors
+        self.hidden_size = hidden_size
+        self.cell = nn.GRUCell(num_rays, hidden_size)
+        self.output_layer = nn.Linear(hidden_size, num_outputs)
+        self.randomize_weights()
+        self.reset_state()
+
+    def randomize_weights(self):
+        """Initialize all weights with Xavier uniform and biases to zero."""
+        nn.init.xavier_uniform_(self.cell.weight_ih)
+        nn.init.xavier_uniform_(self.cell.weight_hh)
+        nn.init.zeros_(self.cell.bias_ih)
+        nn.init.zeros_(self.cell.bias_hh)
+        nn.init.xavier_uniform_(self.output_layer.weight)
+        nn.init.zeros_(self.output_layer.bias)
+
+    def reset_state(self):
+        """Forgets the state of think(), call it when the car is reset."""
+        self.hidden = None
+
+    def forward(self, x, hidden=None):
+        """
+        Advances a batch of cars by one tick.
+
+        Args:
+            x: Tensor of shape (batch, num_rays)
+            hidden: Tensor of shape (batch, hidden_size), None for a fresh state
+
+        Returns:
+            (outputs, hidden): outputs between -1 and 1 and the new hidden state
+        """
+        hidden = self.cell(x, hidden)
+        return torch.tanh(self.output_layer(hidden)), hidden
+
+    def think(self, ray_distances):
+        """
+        Process the raycast distances of one car and return actions, keeping the hidden state for the next call.
+
+        Returns:
+            steering value between -1 and 1, or a list [steering, throttle]
+            for brains with more than one output
+        """
+        with torch.no_grad():
+            ray_distances = torch.as_tensor(ray_distances, dtype=torch.float32).reshape(1, -1)
+            outputs, self.hidden = self(ray_distances, self.hidden)
+            outputs = outputs[0]
+            if len(outputs) == 1:
+                return outputs.item() # Steering only
+            return outputs.tolist()
+
+    def get_parameters(self):
+        """Returns all weights and biases as one flat NumPy vector, the layout used by objects/optimizers.py."""
+        return torch.nn.utils.parameters_to_vector(self.parameters()).detach().numpy().copy()
+
+    def set_parameters(self, vector):
+        """Sets all weights and biases from a flat vector returned by get_parameters()."""
+        with torch.no_grad():
+            torch.nn.utils.vector_to_parameters(torch.as_tensor(vector, dtype=torch.float32), self.parameters())
+
+    def mutate(self, example_brain, mutation_rate=0.01):
+        """Copies the weights of example_brain with Gaussian noise of standard deviation mutation_rate."""
+        parameters = example_brain.get_parameters()
+        self.set_parameters(parameters + torch.randn(len(parameters)).numpy() * mutation_rate)
@@ -0,0 +1,185 @@
+import pygame
+import numpy as np
+import os
+from objects.car import Car
+
+class CarRenderer:
+    """
+    Draws Car (and Democar) instances with pygame.
+
+    The sprite is loaded once per renderer instead of once per car, and rotated,
+    tinted copies are cached per color and angle so a car that keeps its heading
+    costs a single blit.
+    """
+    SPRITE_SIZE = (20, 30) # Size of the car image, pointing up
+
+    _shared = None
+
+    def __init__(self):
+        """Loads the car image. Needs an initialized pygame display."""
+        self.base_image = self.load_image()
+        self.cache = {}
+
+    @classmethod
+    def shared(cls):
+        """Returns a renderer shared by all cars, created on first use."""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def load_image(self):
+        """Loads the car image, scales it, and sets the base orientation."""
+        # Construct path relative to this file (objects/car_renderer.py)
+        current_dir = os.path.dirname(__file__)
+        image_path = os.path.abspath(os.path.join(current_dir, "..", "assets", "images", "car.png"))
+        try:
+            loaded_image = pygame.image.load(image_path).convert_alpha()
+            # Scale the image to exactly 20x30 pixels
+            scaled_image = pygame.transform.scale(loaded_image, self.SPRITE_SIZE)
+        except pygame.error as e:
+            print(f"Error loading car image at {image_path}: {e}")
+            # Create a placeholder rectangle if image loading fails
+            scaled_image = pygame.Surface(self.SPRITE_SIZE)
+            scaled_image.fill((255, 0, 0))
+            scaled_image.set_colorkey((0, 0, 0))
+        # Assume the loaded image points UP. Rotate it so that 0 degrees angle points RIGHT.
+        return pygame.transform.rotate(scaled_image, -90) # Rotate 90 deg clockwise
+
+    def sprite(self, angle, color):
+        """Returns the car image rotated to the angle and tinted in the color."""
+        key = (round(angle) % 360, color)
+        image = self.cache.get(key)
+        if image is None:
+            # Pygame rotates counter-clockwise
+            image = pygame.transform.rotate(self.base_image, key[0])
+            # Fill the image with the car's color, preserving alpha
+            image.fill(color, special_flags=pygame.BLEND_RGBA_MULT)
+            self.cache[key] = image
+        return image
+
+    def draw_sprite(self, screen, x, y, angle, color):
+        """Draws the car image centered on (x, y)."""
+        image = self.sprite(angle, color)
+        screen.blit(image, image.get_rect(center=(x, y)).topleft)
+
+    def draw_rays(self, screen, car):
+        """Draws the rays onto the screen."""
+         # Draw the sensor rays in the same color as the car
+        if car.is_alive and car.ray_lengths :
+            ray_angles_relative = car.sensors.angles # Relative angles in degrees
+            ray_color = car.color # Use the car's color for rays
+
+            for i, normalized_length in enumerate(car.ray_lengths):
+                # Calculate the actual length in pixels
+                actual_length = normalized_length * car.max_ray_length
+
+                # Calculate the absolute angle of this specific ray
+                ray_absolute_angle_deg = car.angle + ray_angles_relative[i]
+                ray_absolute_angle_rad = np.radians(ray_absolute_angle_deg)
+
+                # Calculate the end point of the ray
+                end_x = car.x + actual_length * np.cos(ray_absolute_angle_rad)
+                # Remember Pygame's inverted Y-axis
+                end_y = car.y - actual_length * np.sin(ray_absolute_angle_rad)
+
+                # Draw the line from car center to the ray end point
+                pygame.draw.line(screen, ray_color, (car.x, car.y), (end_x, end_y), 1) # 1 pixel thickness
+
+    def draw(self, screen, car):
+        """Draws the car and its rays onto the screen."""
+        if car.is_alive:
+            self.draw_sprite(screen, car.x, car.y, car.angle, car.color)
+
+        self.draw_rays(screen, car)
+
+
+class PopulationRenderer:
+    """
+    Draws a whole population of cars in one pass.
+
+    The positions, headings and ray lengths of all cars are gathered into arrays
+    once per frame and every point to draw is computed with NumPy. Small
+    populations are drawn with the sprites of CarRenderer in a single
+    Surface.blits call. Large ones are drawn as filled rectangles in the car
+    colors, since tinted sprites of hundreds of differently colored cars at every
+    angle don't fit a cache.
+
+    Rays are drawn for the best `max_ray_cars` cars only, each car's rays as one
+    pygame.draw.lines call through a precomputed star of points
+    (center, end 1, center, end 2, ...).
+    """
+    # Corners of the car body in its own frame, pointing right, in order around it
+    BODY = np.array([(-Car.WIDTH / 2, -Car.HEIGHT / 2), (Car.WIDTH / 2, -Car.HEIGHT / 2),
+                     (Car.WIDTH / 2, Car.HEIGHT / 2), (-Car.WIDTH / 2, Car.HEIGHT / 2)])
+
+    _shared = None
+
+    def __init__(self, max_sprite_cars=200, max_ray_cars=100):
+        """
+        Args:
+            max_sprite_cars: Populations with more living cars are drawn as rectangles instead of sprites
+            max_ray_cars: Rays are drawn for this many cars with the highest fitness, None for all
+        """
+        self.max_sprite_cars = max_sprite_cars
+        self.max_ray_cars = max_ray_cars
+        self.sprites = CarRenderer.shared()
+
+    @classmethod
+    def shared(cls):
+        """Returns a renderer shared by all populations, created on first use."""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def draw(self, screen, cars, fitness=None):
+        """
+        Draws the living cars and the rays of the best of them.
+
+        Args:
+            screen: Surface to draw on
+            cars: List of Car objects
+            fitness: Fitness of every car, picks the cars whose rays are drawn, None keeps the list order
+        """
+        alive = np.array([car.is_alive for car in cars], dtype=bool)
+        if not alive.any():
+            return
+        living = [car for car, is_alive in zip(cars, alive) if is_alive]
+        positions = np.array([(car.x, car.y) for car in living], dtype=np.float64)
+        angles = np.radians([car.angle for car in living])
+
+        if len(living) <= self.max_sprite_cars:
+            screen.blits([(image, image.get_rect(center=(car.x, car.y)).topleft)
+                          for car, image in ((car, self.sprites.sprite(car.angle, car.color)) for car in living)],
+                         doreturn=False)
+        else:
+            self.draw_bodies(screen, living, positions, angles)
+
+        order = np.arange(len(living))
+        if fitness is not None:
+            order = np.argsort(-np.asarray(fitness, dtype=np.float64)[alive], kind="stable")
+        if self.max_ray_cars is not None:
+            order = order[:self.max_ray_cars]
+        self.draw_rays(screen, [living[k] for k in order], positions[order], angles[order])
+
+    def draw_bodies(self, screen, cars, positions, angles):
+        """Draws every car as its rotated rectangle, with the corners of all cars computed at once."""
+        cos_a, sin_a = np.cos(angles)[:, None], np.sin(angles)[:, None]
+        # Same rotation as Car.check_collision, pygame's y-axis is inverted
+        corners = np.stack([positions[:, :1] + self.BODY[:, 0] * cos_a - self.BODY[:, 1] * sin_a,
+                            positions[:, 1:] - self.BODY[:, 0] * sin_a - self.BODY[:, 1] * cos_a], axis=2)
+        for car, points in zip(cars, corners.tolist()):
+            pygame.draw.polygon(screen, car.color, points)
+
+    def draw_rays(self, screen, cars, positions, angles):
+        """Draws the rays of the cars, one connected line per car from the center to every ray end and back."""
+        if not cars:
+            return
+        ray_angles = angles[:, None] + np.radians([car.sensors.angles for car in cars])
+        lengths = np.array([car.ray_lengths for car in cars], dtype=np.float64) * np.array([[car.max_ray_length] for car in cars])
+        ends = np.stack([positions[:, :1] + lengths * np.cos(ray_angles),
+                         positions[:, 1:] - lengths * np.sin(ray_angles)], axis=2)
+        star = np.empty((len(cars), 2 * ends.shape[1] + 1, 2))
+        star[:, 0::2] = positions[:, None, :]
+        star[:, 1::2] = ends
+        for car, points in zip(cars, star.tolist()):
+            pygame.draw.lines(screen, car.color, False, points)
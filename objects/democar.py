@@ -1,11 +1,13 @@
 import pygame
 import numpy as np
-import os
+from objects.car_renderer import CarRenderer
+from objects.sensors import DEFAULT_SENSORS
 
 class Democar:
-    def __init__(self, x, y, color=(255, 0, 0)):
+    def __init__(self, x, y, color=(255, 0, 0), sensors=None):
         # Initialize ray_lengths for this specific car instance
-        self.ray_lengths = [0,0,0] # Start with max length (normalized)
+        self.sensors = sensors or DEFAULT_SENSORS
+        self.ray_lengths = [0] * self.sensors.num_rays # Start with max length (normalized)
 
         self.is_alive = True
         self.color = color
@@ -15,33 +17,6 @@ class Democar:
         self.x = x
         self.y = y
 
-        # Load and prepare image
-        self.base_image = None # Original image, correctly oriented and scaled
-        self.image = None      # Rotated image for drawing
-        self.rect = None       # Rect for positioning the rotated image
-        self.load_image()
-
-    def load_image(self):
-        """Loads the car image, scales it, and sets the base orientation."""
-        # Construct path relative to this file (objects/car.py)
-        current_dir = os.path.dirname(__file__)
-        image_path = os.path.abspath(os.path.join(current_dir, "..", "assets", "images", "car.png"))
-        try:
-            loaded_image = pygame.image.load(image_path).convert_alpha()
-            # Scale the image to exactly 20x30 pixels
-            scaled_image = pygame.transform.scale(loaded_image, (20, 30))
-            # Assume the loaded image points UP. Rotate it so that 0 degrees angle points RIGHT.
-            self.base_image = pygame.transform.rotate(scaled_image, -90) # Rotate 90 deg clockwise
-            # Initialize the image and rect
-            self.update_image()
-        except pygame.error as e:
-            print(f"Error loading car image at {image_path}: {e}")
-            # Create a placeholder rectangle if image loading fails
-            self.base_image = pygame.Surface((20, 30))
-            self.base_image.fill((255, 0, 0))
-            self.base_image.set_colorkey((0, 0, 0))
-            self.update_image()
-
     def control(self, steering, sensitivity):
         """Adjusts the car's angle based on left/right input flags (0 or 1)."""
         if steering >= sensitivity:
@@ -53,24 +28,16 @@ class Democar:
         else:
             return f"F,0"
 
-    def update_image(self):
-        self.angle %= 360 # Keep angle within 0-360 degrees
-        """Updates the rotated image and its rect based on current angle."""
-        if self.base_image:
-            # Rotate the base image by the current angle
-            self.image = pygame.transform.rotate(self.base_image, self.angle)
-            # Get the rect of the rotated image and center it at the car's position
-            self.rect = self.image.get_rect(center=(self.x, self.y))
-
     def draw_rays(self, screen):
         """Draws the rays onto the screen."""
          # Draw the sensor rays in the same color as the car
         if self.is_alive and self.ray_lengths:
-            ray_angles_relative = [-45, 0, 45] # Relative angles in degrees
+            ray_angles_relative = self.sensors.angles # Relative angles in degrees
             ray_color = (0, 255, 0) #self.color # Use the car's color for rays
             
-            for i, ray_length in enumerate(self.ray_lengths):
-                ray_length = ray_length * 2
+            for i, normalized_length in enumerate(self.ray_lengths):
+                # Calculate the actual length in pixels, like Car the lengths are normalized
+                ray_length = normalized_length * self.sensors.max_range
                 
                 # Calculate the absolute angle of this specific ray
                 ray_absolute_angle_deg = self.angle + ray_angles_relative[i]
@@ -90,15 +57,9 @@ class Democar:
 
     def draw(self, screen):
         """Draws the car onto the screen."""
-        # Update the image and rect before drawing
-        self.update_image()
-        
-        if self.is_alive and self.image and self.rect:
-            # Create a colored version of the image
-            colored_image = self.image.copy()
-            # Fill the image with the car's color, preserving alpha
-            colored_image.fill(self.color, special_flags=pygame.BLEND_RGBA_MULT)
-            screen.blit(colored_image, self.rect.topleft)
+        self.angle %= 360 # Keep angle within 0-360 degrees
+
+        if self.is_alive:
+            CarRenderer.shared().draw_sprite(screen, self.x, self.y, self.angle, self.color)
         
         self.draw_rays(screen)
-
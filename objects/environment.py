@@ -0,0 +1,147 @@
+import numpy as np
+from objects.car import Car
+from objects.sensors import DEFAULT_SENSORS, SensorEffects
+
+class VectorCarEnv:
+    """
+    N independent cars on the training tracks behind a batched, Gym style interface
+    (the gymnasium VectorEnv API, without depending on gymnasium):
+
+        observations, infos = env.reset(seed=0)
+        observations, rewards, terminated, truncated, infos = env.step(actions)
+
+    Observations are the normalized ray lengths, shape (num_envs, num_rays).
+    Actions are the brain outputs between -1 and 1, shape (num_envs, action_size):
+    steering in "discrete" control mode, steering and throttle in "continuous" mode.
+
+    The reward is the progress along the track, PROGRESS_REWARD per lap (driving
+    backwards is negative), and CRASH_PENALTY when a car crashes or gets stuck.
+    Tracks saved without progress (see utils/track_pipeline.py) reward the
+    distance driven instead, PROGRESS_REWARD per Car.COMPLETION_DISTANCE.
+    Finished cars are reset to a new random start right away; their last
+    observation is in infos["final_observation"].
+    """
+    PROGRESS_REWARD = 100
+    CRASH_PENALTY = -1
+
+    def __init__(self, tracks, num_envs=16, sensors=None, control_mode="continuous", max_steps=2000, seed=None):
+        """
+        Args:
+            tracks: List of Track objects, every reset picks one at random
+            num_envs: Number of cars simulated in parallel
+            sensors: SensorConfig of the cars, 3 rays by default
+            control_mode: "discrete" (Car.control) or "continuous" (Car.control_continuous)
+            max_steps: Steps after which an episode is truncated
+            seed: Seed for the start poses, None for a random seed
+        """
+        self.tracks = tracks
+        self.num_envs = num_envs
+        self.sensors = sensors or DEFAULT_SENSORS
+        self.control_mode = control_mode
+        self.action_size = 2 if control_mode == "continuous" else 1
+        self.max_steps = max_steps
+        self.rng = np.random.default_rng(seed)
+        # Noise of the SensorConfig, reset() points it at self.rng so reset(seed=...) reproduces it
+        self.sensor_effects = SensorEffects.for_sensors(self.sensors)
+        for track in tracks:
+            if track.progress is None:
+                print(f"Warning: {track.filepath} has no progress index, rewarding the distance driven instead of lap progress")
+
+        self.cars = [None] * num_envs
+        self.last_progress = [None] * num_envs
+        self.episode_steps = np.zeros(num_envs, dtype=int)
+        self.episode_returns = np.zeros(num_envs)
+
+    @property
+    def single_observation_space(self):
+        import gymnasium  # Optional, only needed to plug the environment into gymnasium tooling
+        return gymnasium.spaces.Box(0, 1, (self.sensors.num_rays,), np.float32)
+
+    @property
+    def single_action_space(self):
+        import gymnasium
+        return gymnasium.spaces.Box(-1, 1, (self.action_size,), np.float32)
+
+    def reset(self, seed=None, options=None):
+        """Resets all cars, returns (observations, infos)."""
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        if self.sensor_effects:
+            self.sensor_effects.rng = self.rng
+            self.sensor_effects.reset()
+        for i in range(self.num_envs):
+            self.reset_env(i)
+        return self.observations(), {}
+
+    def reset_env(self, i):
+        """Puts car i at a random start pose of a random track."""
+        track = self.tracks[self.rng.integers(len(self.tracks))]
+        angle, (r, c) = track.randomize_start_pos(self.rng)
+        x, y = track.pixel_to_world(int(c), int(r))
+        car = Car(x, y, track, start_angle=int(angle), sensors=self.sensors)
+        car.ray_cast()
+        self.cars[i] = car
+        self.last_progress[i] = track.progress_at(x, y)
+        self.episode_steps[i] = 0
+        self.episode_returns[i] = 0
+
+    def observations(self, envs=None):
+        """Returns the sensor readings of the cars in envs (indices), all cars by default."""
+        cars = self.cars if envs is None else [self.cars[i] for i in envs]
+        readings = np.array([car.ray_lengths for car in cars])
+        if self.sensor_effects:
+            readings = self.sensor_effects.apply(readings)
+        return readings.astype(np.float32)
+
+    def step(self, actions):
+        """
+        Applies one action per car and advances the simulation by one tick.
+
+        Returns:
+            (observations, rewards, terminated, truncated, infos), infos has the
+            final_observation of finished cars and the episode_return and
+            episode_length of finished episodes (NaN for running ones)
+        """
+        actions = np.clip(np.asarray(actions, dtype=np.float64).reshape(self.num_envs, -1), -1, 1)
+        rewards = np.zeros(self.num_envs)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+
+        for i, car in enumerate(self.cars):
+            distance = car.distance_traveled
+            if self.control_mode == "continuous":
+                car.control_continuous(actions[i, 0], actions[i, 1])
+            else:
+                car.control(actions[i, 0], 0.2)
+
+            current = car.track.progress_at(car.x, car.y)
+            if current is not None and self.last_progress[i] is not None:
+                delta = current - self.last_progress[i]
+                rewards[i] = (delta - np.round(delta)) * self.PROGRESS_REWARD  # Crossing the start line jumps by ~1
+            elif car.track.progress is None:
+                # Older track files without progress, reward the distance instead
+                rewards[i] = (car.distance_traveled - distance) / Car.COMPLETION_DISTANCE * self.PROGRESS_REWARD
+            if current is not None:
+                self.last_progress[i] = current
+
+            if not car.is_alive:
+                terminated[i] = True
+                if car.distance_traveled <= Car.COMPLETION_DISTANCE:
+                    rewards[i] += self.CRASH_PENALTY
+
+        self.episode_steps += 1
+        self.episode_returns += rewards
+        truncated = ~terminated & (self.episode_steps >= self.max_steps)
+
+        done = terminated | truncated
+        observations = self.observations()  # One noise draw per tick, shared with final_observation
+        infos = {
+            "final_observation": observations.copy(),
+            "episode_return": np.where(done, self.episode_returns, np.nan),
+            "episode_length": np.where(done, self.episode_steps, np.nan),
+        }
+        finished = np.nonzero(done)[0]
+        for i in finished:
+            self.reset_env(i)
+        if len(finished):
+            observations[finished] = self.observations(finished)
+        return observations, rewards.astype(np.float32), terminated, truncated, infos
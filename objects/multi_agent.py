@@ -0,0 +1,209 @@
+import numpy as np
+from objects.car import Car
+
+class SpatialHash:
+    """
+    Uniform grid over the car positions, rebuilt every tick with a sort, so finding
+    all cars near each other costs O(N log N) instead of comparing every pair.
+    """
+    OFFSET = 1 << 20  # Keeps the cell coordinates of positions left of or above the window positive
+    STRIDE = 1 << 21
+
+    def __init__(self, cell_size):
+        """
+        Args:
+            cell_size: Cell width in pixels, queries are fastest for radii up to the cell size
+        """
+        self.cell_size = cell_size
+        self.positions = np.zeros((0, 2))
+
+    def build(self, positions):
+        """Sorts the positions (shape (N, 2)) into their cells."""
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.cells = np.floor(self.positions / self.cell_size).astype(np.int64) + self.OFFSET
+        keys = self.cells[:, 0] * self.STRIDE + self.cells[:, 1]
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    def neighbors(self, cells, reach=1):
+        """
+        Finds the positions in the cells around query cells.
+
+        Args:
+            cells: Integer array (M, 2) of query cells, as in self.cells
+            reach: Number of cells around each query cell to include
+
+        Returns:
+            (query, index): Index arrays pairing every query cell with the positions near it
+        """
+        query_parts, index_parts = [], []
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                query, index = self.lookup((cells[:, 0] + dx) * self.STRIDE + cells[:, 1] + dy)
+                query_parts.append(query)
+                index_parts.append(index)
+        return np.concatenate(query_parts), np.concatenate(index_parts)
+
+    def lookup(self, keys):
+        """
+        Finds the positions in cells given by their keys (column * STRIDE + row).
+
+        Returns:
+            (query, index): Index arrays pairing every key with the positions in its cell
+        """
+        start = np.searchsorted(self.sorted_keys, keys, side="left")
+        counts = np.searchsorted(self.sorted_keys, keys, side="right") - start
+        # Expand the [start, start + count) ranges of the sorted positions into one index array
+        total = counts.sum()
+        ranges = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(start, counts)
+        return np.repeat(np.arange(len(keys)), counts), self.order[ranges]
+
+    def query(self, points, reach=1):
+        """Like neighbors, for points (M, 2) in pixels instead of cells."""
+        cells = np.floor(np.asarray(points, dtype=np.float64).reshape(-1, 2) / self.cell_size).astype(np.int64) + self.OFFSET
+        return self.neighbors(cells, reach)
+
+    def pairs(self, radius):
+        """
+        Returns all pairs of positions at most radius apart.
+
+        Returns:
+            (i, j, distance): Index arrays with i < j and the distances between them
+        """
+        empty = np.zeros(0, dtype=np.intp)
+        if len(self.positions) < 2:
+            return empty, empty, np.zeros(0)
+        i, j = self.neighbors(self.cells, int(np.ceil(radius / self.cell_size)))
+        keep = i < j
+        i, j = i[keep], j[keep]
+        distance = np.hypot(*(self.positions[j] - self.positions[i]).T)
+        close = distance <= radius
+        return i[close], j[close], distance[close]
+
+
+class CarInteractions:
+    def __init__(self, sensors, radius=Car.HEIGHT / 2):
+        """
+        Lets cars on the same track collide with and see each other.
+
+        Cars are circles of `radius` for both, two cars crash when their circles
+        overlap and a ray ends where it enters another car's circle. Cars that
+        overlap another car when they are placed (e.g. at the same start pose) are
+        ghosts: they don't crash into, see or get seen by any car until they no
+        longer overlap any other car.
+
+        The spatial hash has cells of one car diameter. Crashes only compare cars
+        in neighboring cells, and every ray only looks at the cells along it until
+        it hits a car or its wall, so the work per car doesn't grow with the
+        population.
+
+        Args:
+            sensors: SensorConfig of the cars
+            radius: Radius of a car in pixels
+        """
+        self.sensors = sensors
+        self.radius = radius
+        self.hash = SpatialHash(2 * radius)
+        self.ghosts = np.zeros(0, dtype=bool)  # Per car, True while it ignores the other cars
+
+    def overlapping(self, positions):
+        """Returns the index pairs (i < j) of overlapping positions, and builds the hash with them."""
+        self.hash.build(positions)
+        i, j, distance = self.hash.pairs(2 * self.radius)
+        overlapping = distance < 2 * self.radius
+        return i[overlapping], j[overlapping]
+
+    def reset(self, cars):
+        """Call after placing the cars, cars that overlap another car become ghosts."""
+        alive = np.nonzero([car.is_alive for car in cars])[0]
+        i, j = self.overlapping([(cars[k].x, cars[k].y) for k in alive])
+        self.ghosts = np.zeros(len(cars), dtype=bool)
+        self.ghosts[alive[i]] = self.ghosts[alive[j]] = True
+
+    def ray_hits(self, positions, headings, reach):
+        """
+        Marches all rays through the spatial hash and returns where they enter another car.
+
+        The rays advance one cell_size per step. The cars in the 3x3 cells around
+        the current point of a ray are tested against it: a car whose circle
+        touches the ray has its center within radius + cell_size / 2 = cell_size of
+        one of the points, so it is always found. A ray stops at its reach, or when
+        no car found later could be closer than the hit it already has, so in a
+        crowd the rays stop after a step or two.
+
+        Args:
+            positions: Array (A, 2) of the car positions the hash was built with
+            headings: Array (A, R) of the absolute ray angles in radians
+            reach: Array (A, R) with the length of every ray in pixels
+
+        Returns:
+            np.ndarray: Array (A, R) with the distance to the first car hit by every ray, inf for none
+        """
+        step = self.hash.cell_size
+        stride = SpatialHash.STRIDE
+        offsets = (np.arange(-1, 2)[:, None] * stride + np.arange(-1, 2)).ravel()
+        owner = np.repeat(np.arange(len(positions)), headings.shape[1])
+        cos_h, sin_h, reach = np.cos(headings).ravel(), np.sin(headings).ravel(), reach.ravel()
+        hits = np.full(len(owner), np.inf)
+        active = np.arange(len(owner))
+        distance = 0.0
+        while len(active):
+            # Current point of every active ray, pygame's y-axis is inverted
+            x = positions[owner[active], 0] + distance * cos_h[active]
+            y = positions[owner[active], 1] - distance * sin_h[active]
+            cells = np.floor(np.stack([x, y], axis=1) / step).astype(np.int64) + self.hash.OFFSET
+            query, target = self.hash.lookup(((cells[:, 0] * stride + cells[:, 1])[:, None] + offsets).ravel())
+            ray = active[query // len(offsets)]
+            keep = owner[ray] != target
+            ray, target = ray[keep], target[keep]
+
+            offset = positions[target] - positions[owner[ray]]
+            # Distance along the ray to the closest point to the other car
+            along = offset[:, 0] * cos_h[ray] - offset[:, 1] * sin_h[ray]
+            across_squared = (offset ** 2).sum(axis=1) - along ** 2
+            hit = (across_squared <= self.radius ** 2) & (along > 0)
+            lengths = np.maximum(along[hit] - np.sqrt(np.maximum(self.radius ** 2 - across_squared[hit], 0)), 0)
+            np.minimum.at(hits, ray[hit], lengths)
+
+            # Cars found from the next point are at least this far along the ray
+            distance += step
+            nearest_next = distance - step - self.radius
+            active = active[(distance < reach[active] + step) & (hits[active] > nearest_next)]
+        return hits.reshape(headings.shape)
+
+    def update(self, cars, readings):
+        """
+        Crashes colliding cars and shortens the rays that hit other cars.
+
+        Args:
+            cars: List of Car objects
+            readings: Array of shape (cars, rays) with the normalized ray lengths from the walls
+
+        Returns:
+            np.ndarray: The readings including the other cars
+        """
+        readings = np.array(readings, dtype=np.float64)
+        alive = np.nonzero([car.is_alive for car in cars])[0]
+        if len(alive) < 2:
+            return readings
+        i, j = self.overlapping([(cars[k].x, cars[k].y) for k in alive])
+
+        # Ghosts stay ghosts while they overlap any car, the other overlapping pairs crash
+        ghost = self.ghosts[alive]
+        crashed = ~ghost[i] & ~ghost[j]
+        for k in np.unique(np.concatenate([i[crashed], j[crashed]])):
+            cars[alive[k]].is_alive = False
+        still_overlapping = np.zeros(len(alive), dtype=bool)
+        still_overlapping[i] = still_overlapping[j] = True
+        self.ghosts[alive[ghost & ~still_overlapping]] = False
+
+        # Rays of the cars that aren't ghosts see the others before the wall they hit
+        visible = alive[~self.ghosts[alive]]
+        if len(visible) < 2:
+            return readings
+        positions = np.array([(cars[k].x, cars[k].y) for k in visible])
+        self.hash.build(positions)
+        headings = np.radians(np.array([cars[k].angle for k in visible])[:, None] + np.asarray(self.sensors.angles))
+        hits = self.ray_hits(positions, headings, readings[visible] * self.sensors.max_range)
+        readings[visible] = np.minimum(readings[visible], hits / self.sensors.max_range)
+        return readings
@@ -0,0 +1,448 @@
+import pickle
+import numpy as np
+from objects.population import Population
+
+class NeatConfig:
+    def __init__(self, weight_mutation_rate=0.8, weight_replace_rate=0.1, weight_power=0.5,
+                 add_connection_rate=0.1, add_node_rate=0.05, toggle_rate=0.01,
+                 compatibility_threshold=3.0, target_species=5, excess_coefficient=1.0, weight_coefficient=0.5,
+                 survival_threshold=0.2, crossover_rate=0.75, stagnation=15):
+        """
+        Settings of NEAT (Stanley and Miikkulainen 2002).
+
+        Args:
+            weight_mutation_rate: Probability that a weight or bias of a child is changed
+            weight_replace_rate: Probability that a changed weight gets a new random value instead of a perturbation
+            weight_power: Standard deviation of the weight perturbations
+            add_connection_rate: Probability that a child gets a new connection
+            add_node_rate: Probability that a child splits a connection with a new node
+            toggle_rate: Probability that a child enables or disables a connection
+            compatibility_threshold: Initial genome distance below which genomes are the same species
+            target_species: The threshold is adjusted every generation to keep about this many species
+            excess_coefficient: Weight of the disjoint and excess genes in the genome distance
+            weight_coefficient: Weight of the mean weight difference of matching genes in the genome distance
+            survival_threshold: Fraction of every species allowed to reproduce
+            crossover_rate: Probability that a child has two parents instead of one
+            stagnation: Generations without improvement after which a species is removed
+        """
+        self.weight_mutation_rate = weight_mutation_rate
+        self.weight_replace_rate = weight_replace_rate
+        self.weight_power = weight_power
+        self.add_connection_rate = add_connection_rate
+        self.add_node_rate = add_node_rate
+        self.toggle_rate = toggle_rate
+        self.compatibility_threshold = compatibility_threshold
+        self.target_species = target_species
+        self.excess_coefficient = excess_coefficient
+        self.weight_coefficient = weight_coefficient
+        self.survival_threshold = survival_threshold
+        self.crossover_rate = crossover_rate
+        self.stagnation = stagnation
+
+
+class InnovationTracker:
+    """Hands out the same innovation number for the same connection in every genome."""
+
+    def __init__(self, next_node_id):
+        self.connections = {}  # (in node, out node) -> innovation number
+        self.splits = {}  # innovation number of a split connection -> id of the node that split it
+        self.next_node_id = next_node_id
+
+    def connection(self, in_node, out_node):
+        key = (in_node, out_node)
+        if key not in self.connections:
+            self.connections[key] = len(self.connections)
+        return self.connections[key]
+
+    def split(self, innovation, existing_nodes):
+        """Returns the node id for splitting a connection, shared by genomes that split the same connection."""
+        node = self.splits.get(innovation)
+        if node is None or node in existing_nodes:
+            node = self.next_node_id
+            self.next_node_id += 1
+            self.splits.setdefault(innovation, node)
+        return node
+
+
+class Genome:
+    def __init__(self, num_inputs, num_outputs, sensors=None):
+        """
+        Variable topology feed-forward network, an alternative to Brain.
+
+        Node ids 0..num_inputs-1 are the inputs (ray lengths) and the next num_outputs
+        ids the outputs (steering, optionally throttle), hidden nodes follow. All
+        non-input nodes apply tanh to the weighted sum of their inputs plus a bias.
+
+        Args:
+            num_inputs: Number of rays
+            num_outputs: 1 for steering only, 2 for steering and throttle
+            sensors: SensorConfig the genome is trained with, saved with the model
+        """
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+        self.sensors = sensors
+        self.nodes = {}  # Non-input node id -> bias
+        self.connections = {}  # Innovation number -> [in node, out node, weight, enabled]
+        self.fitness = 0.0
+        self._network = None
+
+    @classmethod
+    def initial(cls, num_inputs, num_outputs, tracker, rng, sensors=None):
+        """Creates a genome with every input connected to every output and random weights."""
+        genome = cls(num_inputs, num_outputs, sensors)
+        for out_node in range(num_inputs, num_inputs + num_outputs):
+            genome.nodes[out_node] = 0.0
+            for in_node in range(num_inputs):
+                genome.connections[tracker.connection(in_node, out_node)] = [in_node, out_node, rng.normal(0, 1), True]
+        return genome
+
+    def copy(self):
+        genome = Genome(self.num_inputs, self.num_outputs, self.sensors)
+        genome.nodes = dict(self.nodes)
+        genome.connections = {innovation: list(gene) for innovation, gene in self.connections.items()}
+        genome.fitness = self.fitness
+        return genome
+
+    @property
+    def num_hidden(self):
+        return len(self.nodes) - self.num_outputs
+
+    def mutate(self, config, tracker, rng):
+        """Perturbs weights and biases and may add a node or connection."""
+        for gene in self.connections.values():
+            if rng.random() < config.weight_mutation_rate:
+                gene[2] = rng.normal(0, 1) if rng.random() < config.weight_replace_rate \
+                    else gene[2] + rng.normal(0, config.weight_power)
+        for node in self.nodes:
+            if rng.random() < config.weight_mutation_rate:
+                self.nodes[node] += rng.normal(0, config.weight_power)
+
+        if rng.random() < config.add_node_rate:
+            self.add_node(tracker, rng)
+        if rng.random() < config.add_connection_rate:
+            self.add_connection(tracker, rng)
+        if self.connections and rng.random() < config.toggle_rate:
+            gene = self.connections[rng.choice(list(self.connections))]
+            gene[3] = not gene[3]
+        self._network = None
+
+    def add_node(self, tracker, rng):
+        """Splits an enabled connection in two with a new node in between."""
+        enabled = [innovation for innovation, gene in self.connections.items() if gene[3]]
+        if not enabled:
+            return
+        innovation = enabled[rng.integers(len(enabled))]
+        in_node, out_node, weight, _ = self.connections[innovation]
+        self.connections[innovation][3] = False
+
+        node = tracker.split(innovation, self.nodes)
+        self.nodes[node] = 0.0
+        # The new connections keep the behavior close to the old one
+        self.connections[tracker.connection(in_node, node)] = [in_node, node, 1.0, True]
+        self.connections[tracker.connection(node, out_node)] = [node, out_node, weight, True]
+
+    def add_connection(self, tracker, rng, attempts=20):
+        """Connects two unconnected nodes, keeping the network free of cycles."""
+        sources = list(range(self.num_inputs)) + [n for n in self.nodes if n >= self.num_inputs + self.num_outputs]
+        targets = list(self.nodes)
+        existing = {(gene[0], gene[1]) for gene in self.connections.values()}
+        for _ in range(attempts):
+            in_node = sources[rng.integers(len(sources))]
+            out_node = targets[rng.integers(len(targets))]
+            if in_node == out_node or (in_node, out_node) in existing or self.reaches(out_node, in_node):
+                continue
+            self.connections[tracker.connection(in_node, out_node)] = [in_node, out_node, rng.normal(0, 1), True]
+            return
+
+    def reaches(self, start, goal):
+        """Whether goal can be reached from start along connections, disabled ones included."""
+        outgoing = {}
+        for in_node, out_node, _, _ in self.connections.values():
+            outgoing.setdefault(in_node, []).append(out_node)
+        stack, seen = [start], set()
+        while stack:
+            node = stack.pop()
+            if node == goal:
+                return True
+            if node not in seen:
+                seen.add(node)
+                stack.extend(outgoing.get(node, []))
+        return False
+
+    def distance(self, other, config):
+        """Compatibility distance used for speciation."""
+        matching = self.connections.keys() & other.connections.keys()
+        disjoint = len(self.connections.keys() ^ other.connections.keys())
+        size = max(len(self.connections), len(other.connections), 1)
+        weight_difference = np.mean([abs(self.connections[i][2] - other.connections[i][2]) for i in matching]) \
+            if matching else 0.0
+        return config.excess_coefficient * disjoint / size + config.weight_coefficient * weight_difference
+
+    @staticmethod
+    def crossover(fitter, other, rng):
+        """Creates a child with the structure of the fitter parent, matching genes are inherited from either."""
+        child = fitter.copy()
+        child.fitness = 0.0
+        for innovation, gene in child.connections.items():
+            other_gene = other.connections.get(innovation)
+            if other_gene is None:
+                continue
+            if rng.random() < 0.5:
+                gene[2] = other_gene[2]
+            if not (gene[3] and other_gene[3]):
+                gene[3] = rng.random() >= 0.75  # Usually stays disabled if disabled in a parent
+        for node in child.nodes:
+            if node in other.nodes and rng.random() < 0.5:
+                child.nodes[node] = other.nodes[node]
+        return child
+
+    def depths(self):
+        """Returns the depth of every non-input node: 1 + the longest path from an input, over enabled connections."""
+        incoming = {node: [] for node in self.nodes}
+        for in_node, out_node, _, enabled in self.connections.values():
+            if enabled:
+                incoming[out_node].append(in_node)
+        depths = {node: 0 for node in range(self.num_inputs)}
+
+        def depth(node):
+            if node not in depths:
+                depths[node] = 1 + max((depth(source) for source in incoming[node]), default=0)
+            return depths[node]
+
+        for node in self.nodes:
+            depth(node)
+        return depths
+
+    @property
+    def network(self):
+        """The genome compiled for evaluation, cached until the genome mutates."""
+        if self._network is None:
+            self._network = CompiledNetworks([self])
+        return self._network
+
+    def forward(self, x):
+        """
+        Same interface as NumpyBrain.forward.
+
+        Args:
+            x: Array of shape (batch, num_rays)
+
+        Returns:
+            Array of shape (batch, outputs) with values between -1 and 1
+        """
+        return self.network.forward(x)
+
+    def think(self, ray_distances):
+        """Returns the steering value, or a list [steering, throttle] for genomes with two outputs."""
+        outputs = self.forward(np.asarray(ray_distances, dtype=np.float32).reshape(1, -1))[0]
+        if len(outputs) == 1:
+            return float(outputs[0]) # Steering only
+        return outputs.tolist()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_network"] = None  # Rebuilt on load
+        return state
+
+
+class CompiledNetworks:
+    def __init__(self, genomes):
+        """
+        Compiles genomes with different topologies into padded matrices, so they are
+        evaluated together with one batched matrix product per network depth.
+
+        Every genome gets a row in weights[depth] of shape (genomes, nodes, nodes) that
+        holds only the incoming connections of its nodes at that depth. Inputs come
+        first, then the outputs and the hidden nodes, padded to the largest genome.
+        Evaluating depth d updates the nodes of depth d from the values of the
+        shallower nodes, which are already final.
+        """
+        self.num_inputs = genomes[0].num_inputs
+        self.num_outputs = genomes[0].num_outputs
+        all_depths = [genome.depths() for genome in genomes]
+        num_nodes = max(self.num_inputs + len(genome.nodes) for genome in genomes)
+        max_depth = max(max(depths.values()) for depths in all_depths)
+
+        self.weights = np.zeros((max_depth, len(genomes), num_nodes, num_nodes), dtype=np.float32)
+        self.biases = np.zeros((len(genomes), num_nodes), dtype=np.float32)
+        self.levels = np.zeros((max_depth, len(genomes), num_nodes), dtype=bool)
+
+        for g, (genome, depths) in enumerate(zip(genomes, all_depths)):
+            # Input and output nodes keep their ids as index, hidden nodes follow in id order
+            index = {node: node for node in range(self.num_inputs + self.num_outputs)}
+            for node in sorted(genome.nodes):
+                index.setdefault(node, len(index))
+            for node, bias in genome.nodes.items():
+                self.biases[g, index[node]] = bias
+                self.levels[depths[node] - 1, g, index[node]] = True
+            for in_node, out_node, weight, enabled in genome.connections.values():
+                if enabled:
+                    self.weights[depths[out_node] - 1, g, index[out_node], index[in_node]] += weight
+
+    def forward(self, x):
+        """
+        Evaluates every genome on its row of x.
+
+        Args:
+            x: Array of shape (genomes, num_inputs), or (batch, num_inputs) for a single genome
+
+        Returns:
+            Array of shape (genomes, num_outputs) with values between -1 and 1
+        """
+        x = np.asarray(x, dtype=np.float32)
+        values = np.zeros((len(x), self.biases.shape[1]), dtype=np.float32)
+        values[:, :self.num_inputs] = x
+        for weights, level in zip(self.weights, self.levels):
+            activations = np.tanh(np.matmul(weights, values[..., None])[..., 0] + self.biases)
+            values = np.where(level, activations, values)
+        return values[:, self.num_inputs:self.num_inputs + self.num_outputs]
+
+
+class Species:
+    def __init__(self, representative, generation):
+        self.representative = representative
+        self.members = [representative]
+        self.best_fitness = -np.inf
+        self.last_improved = generation
+
+
+class NeatEvolution:
+    def __init__(self, num_inputs, num_outputs, size, config=None, sensors=None, seed=None):
+        """
+        Speciation and reproduction of a population of genomes.
+
+        Args:
+            num_inputs: Number of rays
+            num_outputs: Number of brain outputs
+            size: Number of genomes per generation
+            config: NeatConfig, the defaults if None
+            sensors: SensorConfig stored with the genomes
+            seed: Seed for the random generator, None for a random seed
+        """
+        self.size = size
+        self.config = config or NeatConfig()
+        self.rng = np.random.default_rng(seed)
+        self.tracker = InnovationTracker(num_inputs + num_outputs)
+        self.genomes = [Genome.initial(num_inputs, num_outputs, self.tracker, self.rng, sensors) for _ in range(size)]
+        self.species = []
+        self.generation = 0
+        self.best_genome = self.genomes[0]
+        self.compatibility_threshold = self.config.compatibility_threshold
+
+    def speciate(self):
+        """Assigns every genome to the first species whose representative is close enough."""
+        for species in self.species:
+            species.members = []
+        for genome in self.genomes:
+            for species in self.species:
+                if genome.distance(species.representative, self.config) < self.compatibility_threshold:
+                    species.members.append(genome)
+                    break
+            else:
+                self.species.append(Species(genome, self.generation))
+        self.species = [species for species in self.species if species.members]
+
+        # Steer the threshold towards the target number of species
+        if len(self.species) < self.config.target_species:
+            self.compatibility_threshold = max(0.3, self.compatibility_threshold - 0.3)
+        elif len(self.species) > self.config.target_species:
+            self.compatibility_threshold += 0.3
+
+    def next_generation(self, fitness):
+        """
+        Replaces the genomes with the next generation.
+
+        Args:
+            fitness: Fitness of every genome in self.genomes, higher is better
+        """
+        config = self.config
+        for genome, value in zip(self.genomes, fitness):
+            genome.fitness = float(value)
+        best = max(self.genomes, key=lambda genome: genome.fitness)
+        if best.fitness >= self.best_genome.fitness:
+            self.best_genome = best.copy()
+
+        self.speciate()
+
+        # Drop species that stopped improving, but never the one with the best genome
+        for species in self.species:
+            species_best = max(genome.fitness for genome in species.members)
+            if species_best > species.best_fitness:
+                species.best_fitness = species_best
+                species.last_improved = self.generation
+        self.species = [species for species in self.species
+                        if self.generation - species.last_improved <= config.stagnation or best in species.members]
+
+        # Explicit fitness sharing: a species gets offspring by the mean fitness of its members
+        lowest = min(genome.fitness for genome in self.genomes)
+        shares = np.array([np.mean([genome.fitness - lowest for genome in species.members]) for species in self.species])
+        shares = shares + 1e-6
+        quotas = shares / shares.sum() * self.size
+        counts = np.floor(quotas).astype(int)
+        for i in np.argsort(quotas - counts)[::-1][:self.size - counts.sum()]:
+            counts[i] += 1
+
+        genomes = []
+        for species, count in zip(self.species, counts):
+            members = sorted(species.members, key=lambda genome: genome.fitness, reverse=True)
+            if count > 0:
+                genomes.append(members[0].copy())  # The best of every species survives unchanged
+                count -= 1
+            parents = members[:max(2, int(np.ceil(config.survival_threshold * len(members))))]
+            for _ in range(count):
+                if len(parents) > 1 and self.rng.random() < config.crossover_rate:
+                    a, b = self.rng.choice(len(parents), 2, replace=False)
+                    fitter, other = (parents[a], parents[b]) if parents[a].fitness >= parents[b].fitness \
+                        else (parents[b], parents[a])
+                    child = Genome.crossover(fitter, other, self.rng)
+                else:
+                    child = parents[self.rng.integers(len(parents))].copy()
+                child.mutate(config, self.tracker, self.rng)
+                genomes.append(child)
+            species.representative = members[self.rng.integers(len(members))]
+
+        self.genomes = genomes
+        self.generation += 1
+
+
+class NeatPopulation(Population):
+    def __init__(self, size, track, control_mode="discrete", sensors=None, sensor_effects=None, config=None, seed=None,
+                 multi_agent=False):
+        """
+        Population of variable topology genomes evolved with NEAT instead of fixed size Brains.
+        All genomes are compiled into one CompiledNetworks per generation and evaluated
+        together every tick.
+
+        Args:
+            config: NeatConfig, the defaults if None
+            seed: Seed for the random generator of the evolution
+            The other arguments are the same as for Population
+        """
+        num_outputs = 2 if control_mode == "continuous" else 1
+        # Set up before Population.__init__, which creates the first generation
+        self.evolution = None
+        self.evolution_args = (num_outputs, size, config, seed)
+        self.network = None
+        super().__init__(size, track, control_mode, sensors, sensor_effects, multi_agent=multi_agent)
+
+    def next_brains(self, best_car=None):
+        if self.evolution is None:
+            num_outputs, size, config, seed = self.evolution_args
+            self.evolution = NeatEvolution(self.sensors.num_rays, num_outputs, size, config, self.sensors, seed)
+        self.network = CompiledNetworks(self.evolution.genomes)
+        return [(genome, (255, 0, 0)) for genome in self.evolution.genomes]
+
+    def think(self, readings):
+        outputs = self.network.forward(np.asarray(readings, dtype=np.float32))
+        return outputs.tolist() if self.control_mode == "continuous" else outputs[:, 0].tolist()
+
+    def breed_population(self, best_car):
+        self.evolution.next_generation([car["fitness"] for car in self.cars])
+        self.reset_population(self.track)
+
+    def save_model(self):
+        with open(f"models/model_{self.generation}.pkl", "wb") as f:
+            pickle.dump(self.evolution.best_genome, f)
+        with open("stats.txt", "w") as f:
+            for stat in self.stats:
+                f.write(f"{stat},")
@@ -0,0 +1,230 @@
+import os
+import pickle
+import numpy as np
+from objects.sensors import SensorConfig
+
+
+class NumpyBrain:
+    def __init__(self, weights, biases, sensors=None):
+        """
+        Inference-only copy of a Brain that runs on NumPy, so the physical car
+        and the viewers don't need to import torch.
+
+        Args:
+            weights: List of weight matrices, hidden layers first and the output layer last
+            biases: List of bias vectors matching the weights
+            sensors: SensorConfig the brain was trained with, None for the default
+        """
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.sensors = sensors
+
+    @classmethod
+    def from_brain(cls, brain):
+        """Copies the weights of a torch Brain."""
+        layers = list(brain.layers) + [brain.output_layer]
+        weights = [layer.weight.detach().cpu().numpy() for layer in layers]
+        biases = [layer.bias.detach().cpu().numpy() for layer in layers]
+        return cls(weights, biases, getattr(brain, "sensors", None))  # Models saved before sensors existed have none
+
+    @classmethod
+    def load(cls, filepath):
+        """Loads a brain saved with save()."""
+        with np.load(filepath) as data:
+            count = sum(name.startswith("w") for name in data.files)
+            sensors = None
+            if "sensor_angles" in data.files:
+                sensors = SensorConfig.from_settings(data["sensor_angles"], data["sensor_settings"])
+            return cls([data[f"w{i}"] for i in range(count)], [data[f"b{i}"] for i in range(count)], sensors)
+
+    def save(self, filepath):
+        """Saves the weights to a .npz file."""
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"w{i}"] = w
+            arrays[f"b{i}"] = b
+        if self.sensors is not None:
+            arrays["sensor_angles"] = np.asarray(self.sensors.angles)
+            arrays["sensor_settings"] = self.sensors.settings
+        np.savez(filepath, **arrays)
+
+    def forward(self, x):
+        """
+        Same computation as Brain.forward for a batch of inputs.
+
+        Args:
+            x: Array of shape (batch, num_rays)
+
+        Returns:
+            Array of shape (batch, outputs) with values between -1 and 1
+        """
+        for w, b in zip(self.weights[:-1], self.biases[:-1]):
+            x = np.maximum(x @ w.T + b, 0)
+        return np.tanh(x @ self.weights[-1].T + self.biases[-1])
+
+    def think(self, ray_distances):
+        """
+        Process the raycast distances and return actions.
+
+        Args:
+            ray_distances: List or array of raycast distances
+
+        Returns:
+            steering value between -1 and 1, or a list [steering, throttle]
+            for brains with more than one output
+        """
+        x = np.asarray(ray_distances, dtype=np.float32).reshape(1, -1)
+        outputs = self.forward(x)[0]
+        if len(outputs) == 1:
+            return float(outputs[0]) # Steering only
+        return outputs.tolist()
+
+
+
+class NumpyRecurrentBrain:
+    ARRAYS = ["weight_ih", "weight_hh", "bias_ih", "bias_hh", "weight_out", "bias_out"]
+
+    def __init__(self, weight_ih, weight_hh, bias_ih, bias_hh, weight_out, bias_out, sensors=None):
+        """
+        Inference-only copy of a RecurrentBrain (GRU cell and output layer) that runs on NumPy.
+
+        The weights may have a leading population dimension (see stack()), then
+        every row of a batch is evaluated with its own weights.
+
+        Args:
+            weight_ih, weight_hh, bias_ih, bias_hh: GRU cell weights in torch's (reset, update, new) layout
+            weight_out, bias_out: Output layer
+            sensors: SensorConfig the brain was trained with, None for the default
+        """
+        self.weight_ih = np.asarray(weight_ih, dtype=np.float32)
+        self.weight_hh = np.asarray(weight_hh, dtype=np.float32)
+        self.bias_ih = np.asarray(bias_ih, dtype=np.float32)
+        self.bias_hh = np.asarray(bias_hh, dtype=np.float32)
+        self.weight_out = np.asarray(weight_out, dtype=np.float32)
+        self.bias_out = np.asarray(bias_out, dtype=np.float32)
+        self.sensors = sensors
+        self.reset_state()
+
+    @classmethod
+    def from_brain(cls, brain):
+        """Copies the weights of a torch RecurrentBrain."""
+        return cls(*[tensor.detach().cpu().numpy() for tensor in (
+            brain.cell.weight_ih, brain.cell.weight_hh, brain.cell.bias_ih, brain.cell.bias_hh,
+            brain.output_layer.weight, brain.output_layer.bias)], brain.sensors)
+
+    @classmethod
+    def stack(cls, brains):
+        """Stacks the weights of RecurrentBrains or NumpyRecurrentBrains to step a whole population at once."""
+        brains = [brain if isinstance(brain, cls) else cls.from_brain(brain) for brain in brains]
+        return cls(*[np.stack([getattr(brain, name) for brain in brains]) for name in cls.ARRAYS], brains[0].sensors)
+
+    @property
+    def hidden_size(self):
+        return self.weight_hh.shape[-1]
+
+    @classmethod
+    def load(cls, filepath):
+        """Loads a brain saved with save()."""
+        with np.load(filepath) as data:
+            sensors = None
+            if "sensor_angles" in data.files:
+                sensors = SensorConfig.from_settings(data["sensor_angles"], data["sensor_settings"])
+            return cls(*[data[name] for name in cls.ARRAYS], sensors)
+
+    def save(self, filepath):
+        """Saves the weights to a .npz file."""
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        if self.sensors is not None:
+            arrays["sensor_angles"] = np.asarray(self.sensors.angles)
+            arrays["sensor_settings"] = self.sensors.settings
+        np.savez(filepath, **arrays)
+
+    @staticmethod
+    def linear(x, weight, bias):
+        if weight.ndim == 3:
+            # One weight matrix per row of the batch
+            return np.matmul(weight, x[..., None])[..., 0] + bias
+        return x @ weight.T + bias
+
+    def step(self, x, hidden):
+        """
+        Same computation as RecurrentBrain.forward: advances a batch of cars by one tick.
+
+        Args:
+            x: Array of shape (batch, num_rays)
+            hidden: Array of shape (batch, hidden_size)
+
+        Returns:
+            (outputs, hidden): outputs of shape (batch, outputs) between -1 and 1 and the new hidden state
+        """
+        gates_x = self.linear(x, self.weight_ih, self.bias_ih)
+        gates_h = self.linear(hidden, self.weight_hh, self.bias_hh)
+        size = self.hidden_size
+        reset = 1 / (1 + np.exp(-(gates_x[:, :size] + gates_h[:, :size])))
+        update = 1 / (1 + np.exp(-(gates_x[:, size:2 * size] + gates_h[:, size:2 * size])))
+        new = np.tanh(gates_x[:, 2 * size:] + reset * gates_h[:, 2 * size:])
+        hidden = (1 - update) * new + update * hidden
+        return np.tanh(self.linear(hidden, self.weight_out, self.bias_out)), hidden
+
+    def forward(self, x):
+        """
+        Runs the inputs as consecutive ticks of one car from a fresh state, e.g. a recorded session.
+
+        Args:
+            x: Array of shape (ticks, num_rays)
+
+        Returns:
+            Array of shape (ticks, outputs) with values between -1 and 1
+        """
+        hidden = np.zeros((1, self.hidden_size), dtype=np.float32)
+        outputs = []
+        for row in np.asarray(x, dtype=np.float32):
+            output, hidden = self.step(row[None], hidden)
+            outputs.append(output[0])
+        return np.array(outputs).reshape(len(outputs), -1)
+
+    def reset_state(self):
+        """Forgets the state of think(), call it when the car is reset."""
+        self.hidden = None
+
+    def think(self, ray_distances):
+        """
+        Process the raycast distances of one car and return actions, keeping the hidden state for the next call.
+
+        Returns:
+            steering value between -1 and 1, or a list [steering, throttle]
+            for brains with more than one output
+        """
+        if self.hidden is None:
+            self.hidden = np.zeros((1, self.hidden_size), dtype=np.float32)
+        outputs, self.hidden = self.step(np.asarray(ray_distances, dtype=np.float32).reshape(1, -1), self.hidden)
+        if len(outputs[0]) == 1:
+            return float(outputs[0, 0]) # Steering only
+        return outputs[0].tolist()
+
+
+def load_model(filepath):
+    """
+    Loads a pickled Brain for inference as a NumpyBrain, or a RecurrentBrain as a NumpyRecurrentBrain.
+
+    The NumPy copy is cached next to the pickle (model.pkl -> model.npz), so
+    torch is only imported the first time a model is loaded or after it changed.
+    Models without torch layers (e.g. a NEAT Genome) already run on NumPy and are
+    returned as they are.
+    """
+    cache_path = os.path.splitext(filepath)[0] + ".npz"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(filepath):
+        with np.load(cache_path) as data:
+            recurrent = "weight_hh" in data.files
+        return NumpyRecurrentBrain.load(cache_path) if recurrent else NumpyBrain.load(cache_path)
+
+    with open(filepath, "rb") as f:
+        brain = pickle.load(f)
+    if not hasattr(brain, "output_layer"):
+        return brain
+    numpy_brain = NumpyRecurrentBrain.from_brain(brain) if hasattr(brain, "cell") else NumpyBrain.from_brain(brain)
+    try:
+        numpy_brain.save(cache_path)
+    except OSError as e:
+        print(f"Could not cache {cache_path}: {e}")
+    return numpy_brain
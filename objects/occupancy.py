@@ -0,0 +1,127 @@
+import numpy as np
+from objects.sensors import wall_lookup
+
+
+class OccupancyPyramid:
+    def __init__(self, walls):
+        """
+        Multi-scale wall mask of a track: level 0 is the wall mask of the layout and
+        every level above marks the 2x2 blocks of the level below that contain a wall.
+        Rays and collision checks skip empty space in the largest empty block around
+        them, so their cost grows with the number of walls they pass, not with the
+        resolution of the layout.
+
+        Coordinates are in cells of the layout, (column, row), and everything outside
+        the layout counts as wall.
+
+        Args:
+            walls: Boolean array (rows, cols), True for wall cells
+        """
+        self.levels = [np.asarray(walls, dtype=bool)]
+        while max(self.levels[-1].shape) > 1:
+            level = self.levels[-1]
+            rows, cols = level.shape
+            # Odd sizes are padded with wall, like the space outside the layout
+            padded = np.pad(level, ((0, rows % 2), (0, cols % 2)), constant_values=True)
+            self.levels.append(padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).any(axis=(1, 3)))
+        self.rows, self.cols = self.levels[0].shape
+
+        # Level of the largest empty block around every cell, -1 for walls, so a step of a ray takes one lookup
+        self.empty_levels = np.full((self.rows, self.cols), -1, dtype=np.int8)
+        for k, mask in enumerate(self.levels):
+            empty = ~mask.repeat(1 << k, axis=0).repeat(1 << k, axis=1)[:self.rows, :self.cols]
+            if not empty.any():
+                break
+            self.empty_levels[empty] = k  # Blocks are only empty if the ones below are, the last level wins
+
+    def is_wall(self, col, row):
+        """Looks up integer cell coordinates (arrays) in the full resolution mask, outside is wall."""
+        inside = (col >= 0) & (col < self.cols) & (row >= 0) & (row < self.rows)
+        return ~inside | self.levels[0][np.clip(row, 0, self.rows - 1), np.clip(col, 0, self.cols - 1)]
+
+    def empty_level(self, col, row):
+        """Returns the level of the largest empty block around each cell, -1 for wall cells and outside."""
+        inside = (col >= 0) & (col < self.cols) & (row >= 0) & (row < self.rows)
+        level = self.empty_levels[np.clip(row, 0, self.rows - 1), np.clip(col, 0, self.cols - 1)].astype(np.intp)
+        return np.where(inside, level, -1)
+
+    def cast(self, x, y, dx, dy, max_length, max_steps=10000):
+        """
+        Traces rays until they enter a wall cell.
+
+        Args:
+            x, y: Start in cells, floats
+            dx, dy: Arrays with the direction of every ray in cells per unit of length
+            max_length: Maximum ray length in the units of dx and dy
+
+        Returns:
+            np.ndarray: Length of every ray up to the first wall cell, at most max_length
+        """
+        dx, dy = np.asarray(dx, dtype=float), np.asarray(dy, dtype=float)
+        t = np.zeros(dx.shape)
+        active = np.ones(dx.shape, dtype=bool)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for _ in range(max_steps):
+                px, py = x + t[active] * dx[active], y + t[active] * dy[active]
+                col, row = np.floor(px).astype(np.intp), np.floor(py).astype(np.intp)
+                level = self.empty_level(col, row)
+
+                # Rays in a wall cell stop, the others jump to the edge of their empty block
+                indices = np.nonzero(active)[0]
+                active[indices[level < 0]] = False
+                moving = level >= 0
+                indices, level = indices[moving], level[moving]
+                px, py, col, row = px[moving], py[moving], col[moving], row[moving]
+                size = 1 << level
+                left, top = (col >> level) << level, (row >> level) << level
+                ray_dx, ray_dy = dx[indices], dy[indices]
+                exit_x = np.where(ray_dx > 0, (left + size - px) / ray_dx, np.where(ray_dx < 0, (left - px) / ray_dx, np.inf))
+                exit_y = np.where(ray_dy > 0, (top + size - py) / ray_dy, np.where(ray_dy < 0, (top - py) / ray_dy, np.inf))
+                # A tiny step past the edge, so the next lookup is in the next block
+                step = np.minimum(exit_x, exit_y) + 1e-9 / np.maximum(np.abs(ray_dx), np.abs(ray_dy))
+                t[indices] += step
+
+                finished = t[indices] >= max_length
+                active[indices[finished]] = False
+                if not active.any():
+                    break
+        return np.minimum(t, max_length)
+
+    def rectangle_hits_wall(self, corners, spacing=0.5):
+        """
+        Checks whether a rectangle overlaps a wall cell.
+
+        If its bounding box is in empty blocks of a coarse level this takes a few
+        lookups, otherwise points along the edges are checked at full resolution.
+
+        Args:
+            corners: Array (4, 2) with the corners (column, row) in order around the rectangle
+            spacing: Distance between the checked points on the edges in cells
+        """
+        corners = np.asarray(corners, dtype=float)
+        low, high = np.floor(corners.min(axis=0)).astype(int), np.floor(corners.max(axis=0)).astype(int)
+        if (low < 0).any() or high[0] >= self.cols or high[1] >= self.rows:
+            return True
+        # The level at which the bounding box spans at most 2x2 blocks
+        k = int(np.ceil(np.log2(max(high - low) + 1)))
+        if k < len(self.levels):
+            blocks = self.levels[k][low[1] >> k:(high[1] >> k) + 1, low[0] >> k:(high[0] >> k) + 1]
+            if not blocks.any():
+                return False
+
+        edges = []
+        for start, end in zip(corners, np.roll(corners, -1, axis=0)):
+            count = int(np.ceil(np.hypot(*(end - start)) / spacing)) + 1
+            edges.append(start + np.linspace(0, 1, count)[:, None] * (end - start))
+        points = np.floor(np.concatenate(edges)).astype(np.intp)
+        return bool(self.is_wall(points[:, 0], points[:, 1]).any())
+
+
+def occupancy_pyramid(track):
+    """Returns the OccupancyPyramid of the track's layout, cached on the track like wall_lookup."""
+    cached = getattr(track, "_occupancy_pyramid", None)
+    if cached is None or cached[0] is not track.layout:
+        walls = wall_lookup(track)[1:-1, 1:-1]  # Without the border, the pyramid treats outside as wall
+        cached = (track.layout, OccupancyPyramid(walls))
+        track._occupancy_pyramid = cached
+    return cached[1]
@@ -0,0 +1,198 @@
+import numpy as np
+
+class Optimizer:
+    def __init__(self, initial, population_size, sigma, seed=None):
+        """
+        Base class of the optimizers for Brain weights, which work on the flattened
+        parameter vector of Brain.get_parameters().
+
+        A generation is one ask() (the parameters of the whole population as a
+        (population_size, parameters) matrix) followed by one tell() with the
+        fitness of every row.
+
+        Args:
+            initial: Parameter vector to start from
+            population_size: Number of parameter vectors per generation
+            sigma: Initial standard deviation of the sampled perturbations
+            seed: Seed for the random generator, None for a random seed
+        """
+        self.mean = np.asarray(initial, dtype=np.float64).copy()
+        self.num_parameters = len(self.mean)
+        self.population_size = population_size
+        self.sigma = sigma
+        self.rng = np.random.default_rng(seed)
+        self.generation = 0
+
+        self.candidates = None
+        self.best_parameters = self.mean.copy()
+        self.best_fitness = -np.inf
+
+    def ask(self):
+        """Samples the parameters of the next generation, shape (population_size, parameters)."""
+        self.candidates = self.sample()
+        return self.candidates
+
+    def tell(self, fitness):
+        """Updates the search distribution with the fitness of every candidate of the last ask()."""
+        fitness = np.asarray(fitness, dtype=np.float64)
+        best = np.argmax(fitness)
+        if fitness[best] > self.best_fitness:
+            self.best_fitness = fitness[best]
+            self.best_parameters = self.candidates[best].copy()
+        self.update(fitness)
+        self.generation += 1
+
+    def sample(self):
+        raise NotImplementedError
+
+    def update(self, fitness):
+        raise NotImplementedError
+
+
+def centered_ranks(fitness):
+    """Maps fitness values to their rank, scaled to -0.5 (worst) .. 0.5 (best)."""
+    ranks = np.empty(len(fitness))
+    ranks[np.argsort(fitness)] = np.arange(len(fitness))
+    return ranks / max(len(fitness) - 1, 1) - 0.5
+
+
+class GeneticOptimizer(Optimizer):
+    """
+    Keeps the best candidate unchanged and fills the rest of the population with
+    Gaussian mutations of it, the scheme Population uses without an optimizer.
+    """
+
+    def sample(self):
+        noise = self.rng.standard_normal((self.population_size - 1, self.num_parameters))
+        return np.vstack([self.mean, self.mean + self.sigma * noise])
+
+    def update(self, fitness):
+        self.mean = self.candidates[np.argmax(fitness)].copy()
+
+
+class OpenAIES(Optimizer):
+    def __init__(self, initial, population_size, sigma=0.1, learning_rate=0.05, weight_decay=0.005, seed=None):
+        """
+        OpenAI evolution strategy (Salimans et al. 2017) with antithetic sampling,
+        centered rank fitness shaping and Adam on the estimated gradient.
+
+        Args:
+            learning_rate: Adam step size
+            weight_decay: L2 penalty pulling the parameters towards 0
+        """
+        super().__init__(initial, population_size, sigma, seed)
+        self.learning_rate = learning_rate
+        self.weight_decay = weight_decay
+        self.noise = None
+        self.m = np.zeros(self.num_parameters)  # Adam moments
+        self.v = np.zeros(self.num_parameters)
+
+    def sample(self):
+        # Mirrored pairs +eps/-eps cancel the noise of the gradient estimate, an odd population adds the mean
+        half = self.rng.standard_normal((self.population_size // 2, self.num_parameters))
+        self.noise = np.vstack([half, -half, np.zeros((self.population_size % 2, self.num_parameters))])
+        return self.mean + self.sigma * self.noise
+
+    def update(self, fitness):
+        gradient = centered_ranks(fitness) @ self.noise / (self.population_size * self.sigma)
+        gradient -= self.weight_decay * self.mean
+
+        t = self.generation + 1
+        self.m = 0.9 * self.m + 0.1 * gradient
+        self.v = 0.999 * self.v + 0.001 * gradient ** 2
+        step = self.m / (1 - 0.9 ** t) / (np.sqrt(self.v / (1 - 0.999 ** t)) + 1e-8)
+        self.mean += self.learning_rate * step
+
+
+class CMAES(Optimizer):
+    def __init__(self, initial, population_size=None, sigma=0.5, seed=None):
+        """
+        Covariance matrix adaptation evolution strategy, (mu/mu_w, lambda) with rank-1 and
+        rank-mu updates and cumulative step size adaptation (Hansen, "The CMA Evolution
+        Strategy: A Tutorial").
+
+        Args:
+            population_size: Lambda, by default 4 + 3 * ln(parameters)
+        """
+        n = len(initial)
+        population_size = population_size or 4 + int(3 * np.log(n))
+        super().__init__(initial, population_size, sigma, seed)
+
+        # Recombination weights of the best half
+        self.mu = population_size // 2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1 / np.sum(self.weights ** 2)
+
+        # Adaptation rates
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff))
+        self.damps = 1 + 2 * max(0, np.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))  # Expected length of a N(0, I) vector
+
+        # Evolution paths and covariance matrix C = B diag(D^2) B^T
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.C = np.eye(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+        self.steps = None
+
+    def sample(self):
+        z = self.rng.standard_normal((self.population_size, self.num_parameters))
+        self.steps = (z * self.D) @ self.B.T  # Rows are distributed as N(0, C)
+        return self.mean + self.sigma * self.steps
+
+    def update(self, fitness):
+        n = self.num_parameters
+        selected = self.steps[np.argsort(-fitness)[:self.mu]]
+        step = self.weights @ selected
+        self.mean += self.sigma * step
+
+        # Step size path, uses C^(-1/2) * step
+        inv_sqrt_step = self.B @ ((self.B.T @ step) / self.D)
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(self.cs * (2 - self.cs) * self.mueff) * inv_sqrt_step
+        ps_norm = np.linalg.norm(self.ps)
+        hsig = ps_norm / np.sqrt(1 - (1 - self.cs) ** (2 * (self.generation + 1))) / self.chi_n < 1.4 + 2 / (n + 1)
+
+        # Covariance path and rank-1 + rank-mu update
+        self.pc = (1 - self.cc) * self.pc + hsig * np.sqrt(self.cc * (2 - self.cc) * self.mueff) * step
+        rank_one = np.outer(self.pc, self.pc) + (1 - hsig) * self.cc * (2 - self.cc) * self.C
+        rank_mu = (selected.T * self.weights) @ selected
+        self.C = (1 - self.c1 - self.cmu) * self.C + self.c1 * rank_one + self.cmu * rank_mu
+
+        self.sigma *= np.exp(self.cs / self.damps * (ps_norm / self.chi_n - 1))
+
+        # Keep C symmetric and positive definite
+        self.C = (self.C + self.C.T) / 2
+        eigenvalues, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+
+OPTIMIZERS = {
+    "ga": GeneticOptimizer,
+    "es": OpenAIES,
+    "cmaes": CMAES,
+}
+
+
+def make_optimizer(name, initial, population_size, **kwargs):
+    """
+    Creates an optimizer by name.
+
+    Args:
+        name: "ga", "es" or "cmaes"
+        initial: Parameter vector to start from, e.g. Brain.get_parameters()
+        population_size: Number of cars per generation
+        **kwargs: Passed to the optimizer, e.g. sigma or learning_rate
+
+    Raises:
+        ValueError: For an unknown optimizer name
+    """
+    if name not in OPTIMIZERS:
+        raise ValueError(f"Unknown optimizer {name!r}, choose one of {', '.join(OPTIMIZERS)}")
+    if name == "ga":
+        kwargs.setdefault("sigma", 0.01)  # Same noise as Brain.mutate
+    return OPTIMIZERS[name](initial, population_size, **kwargs)
@@ -1,11 +1,30 @@
 from objects.car import Car
-from objects.brain import Brain
+from objects.sensors import DEFAULT_SENSORS, SensorEffects
 import random
 import pickle
+import numpy as np
 
 class Population:
-    def __init__(self, size, track):
+    def __init__(self, size, track, control_mode="discrete", sensors=None, sensor_effects=None, optimizer=None,
+                 recurrent_size=None, multi_agent=False):
+        """
+        Args:
+            size: Number of cars per generation
+            track: Track the first generation drives on
+            control_mode: "discrete" turns or drives straight based on the steering output,
+                          "continuous" steers proportionally and uses a second output as throttle
+            sensors: SensorConfig of the cars and the brain inputs, 3 rays by default
+            sensor_effects: Optional SensorEffects applied to the readings of all cars before the brains see them
+            optimizer: None to keep the best brain and mutate it for the rest, or an optimizer name from
+                       objects/optimizers.py ("ga", "es" or "cmaes") that samples the whole generation
+            recurrent_size: Hidden state size of RecurrentBrains (GRU), None for feed-forward Brains
+            multi_agent: Cars start spread over the track, crash into each other and see each other with their rays
+        """
         self.size = size
+        self.sensors = sensors or DEFAULT_SENSORS
+        self.sensor_effects = SensorEffects.for_sensors(self.sensors, sensor_effects)
+        self.control_mode = control_mode
+        self.num_outputs = 2 if control_mode == "continuous" else 1
         self.cars = []
         self.track_list = []
         self.track = track
@@ -13,8 +32,34 @@ class Population:
         self.test_positions = 3  # Number of different start positions to test each car
         self.current_test_position = 0
         self.stats = []
+        self.recurrent_size = recurrent_size
+        self.network = None  # Stacked NumpyRecurrentBrain of the generation, see reset_population
+        self.hidden = None  # Hidden state of every car, shape (size, recurrent_size)
+        self.interactions = None
+        if multi_agent:
+            from objects.multi_agent import CarInteractions
+            self.interactions = CarInteractions(self.sensors)
+
+        self.optimizer = None
+        if optimizer:
+            from objects.optimizers import make_optimizer
+            self.optimizer = make_optimizer(optimizer, self.create_brain().get_parameters(), size)
+            self.size = self.optimizer.population_size
         self.reset_population(track)
 
+    def create_brain(self, parameters=None):
+        """Creates a brain for the sensors and control mode of the population, randomly initialized or from a parameter vector."""
+        # Imported here so importing the population doesn't load torch until brains are created
+        from objects.brain import Brain, RecurrentBrain
+
+        if self.recurrent_size:
+            brain = RecurrentBrain(self.sensors.num_rays, self.recurrent_size, self.num_outputs, self.sensors)
+        else:
+            brain = Brain(self.sensors.num_rays, [3], self.num_outputs, self.sensors)  # One input per ray
+        if parameters is not None:
+            brain.set_parameters(parameters)
+        return brain
+
     def reset_population(self, track, best_car=None):
         if self.generation % 100 == 0 and self.generation != 0:
             self.save_model()
@@ -22,43 +67,80 @@ class Population:
             #add the fitness of the best car to the stats
             self.stats.append(self.get_best_car()["fitness"])
         self.cars = []
-        start_angle, start_pos = track.randomize_start_pos()
-        x, y = track.pixel_to_world(start_pos[1], start_pos[0])
+        if self.sensor_effects:
+            self.sensor_effects.reset()
+        brains = self.next_brains(best_car)
+        for (brain, color), (x, y, start_angle) in zip(brains, self.start_poses(track, len(brains))):
+            car = Car(x, y, track, color=color, sensors=self.sensors)
+            car.angle = start_angle
+            self.cars.append({"car": car, "fitness": 0, "brain": brain})
+        if self.interactions:
+            self.interactions.reset([car["car"] for car in self.cars])
+
+        if self.recurrent_size:
+            # All brains of the generation are stepped together on one preallocated hidden state array
+            from objects.numpy_brain import NumpyRecurrentBrain
+            self.network = NumpyRecurrentBrain.stack([car["brain"] for car in self.cars])
+            self.hidden = np.zeros((len(self.cars), self.recurrent_size), dtype=np.float32)
+
+    def start_poses(self, track, count):
+        """Returns a start pose (x, y, angle) per car, the same for all cars unless they race each other."""
+        poses = []
+        for _ in range(count if self.interactions else 1):
+            start_angle, start_pos = track.randomize_start_pos()
+            x, y = track.pixel_to_world(start_pos[1], start_pos[0])
+            poses.append((x, y, start_angle))
+        return poses if self.interactions else poses * count
 
+    def next_brains(self, best_car=None):
+        """Returns the (brain, car color) pairs of the next generation."""
+        if self.optimizer:
+            # The optimizer samples the parameters of the whole generation at once
+            return [(self.create_brain(parameters), (255, 0, 0)) for parameters in self.optimizer.ask()]
+
+        brains = []
         if best_car:
             # Keep the best car unchanged
-            car = Car(x, y, track, color=(0, 0, 255))
-            car.angle = start_angle
-            self.cars.append({"car": car, "fitness": 0, "brain": best_car["brain"]})
-            
+            brains.append((best_car["brain"], (0, 0, 255)))
+
             # Create variations of the best car
             for _ in range(self.size - 1):
-                brain = Brain(3, [3])  # Simplified network for 3 ray angles
+                brain = self.create_brain()
                 brain.mutate(best_car["brain"], mutation_rate=0.01)  # Single mutation rate
-                car = Car(x, y, track)
-                car.angle = start_angle
-                self.cars.append({"car": car, "fitness": 0, "brain": brain})
+                brains.append((brain, (255, 0, 0)))
         else:
             # Initial population - all random
             for _ in range(self.size):
-                brain = Brain(3, [3])  # Simplified network for 3 ray angles
+                brain = self.create_brain()
                 brain.randomize_weights()
-                car = Car(x, y, track)
-                car.angle = start_angle
-                self.cars.append({"car": car, "fitness": 0, "brain": brain})
+                brains.append((brain, (255, 0, 0)))
+        return brains
 
     def save_model(self):
+        # With an optimizer the best brain evaluated so far, otherwise the kept best car
+        brain = self.create_brain(self.optimizer.best_parameters) if self.optimizer else self.cars[0]["brain"]
         with open(f"models/model_{self.generation}.pkl", "wb") as f:
-            pickle.dump(self.cars[0]["brain"], f)
+            pickle.dump(brain, f)
         with open("stats.txt", "w") as f:
             for stat in self.stats:
                 f.write(f"{stat},")
 
     def update_population(self):
-        for car in self.cars:
-            ray_distances = car["car"].ray_cast()
-            steering = car["brain"].think(ray_distances)
-            car["car"].control(steering, 0.2)
+        readings = [car["car"].ray_cast() for car in self.cars]
+        if self.interactions:
+            # Crash cars into each other and let the rays see the other cars, with one spatial hash per tick
+            readings = self.interactions.update([car["car"] for car in self.cars], readings).tolist()
+            for car, ray_lengths in zip(self.cars, readings):
+                car["car"].ray_lengths = ray_lengths
+        if self.sensor_effects:
+            # Degrade the readings of the whole population in one vectorized step
+            readings = self.sensor_effects.apply(readings).tolist()
+        for car, outputs in zip(self.cars, self.think(readings)):
+            if self.control_mode == "continuous":
+                steering, throttle = outputs
+                car["car"].control_continuous(steering, throttle)
+            else:
+                car["car"].control(outputs, 0.2)
             car["fitness"] = car["car"].distance_traveled
         if self.population_dead():
             if self.current_test_position < self.test_positions:
@@ -68,21 +150,37 @@ class Population:
                 self.generation += 1
                 self.current_test_position = 0
 
+    def think(self, readings):
+        """Returns the outputs of every car's brain for its readings: the steering, or [steering, throttle]."""
+        if self.recurrent_size:
+            alive = np.array([car["car"].is_alive for car in self.cars])
+            self.hidden[~alive] = 0  # Crashed cars start over with a fresh memory
+            outputs, self.hidden[:] = self.network.step(np.asarray(readings, dtype=np.float32), self.hidden)
+            return outputs.tolist() if self.control_mode == "continuous" else outputs[:, 0].tolist()
+        return [car["brain"].think(ray_distances) for car, ray_distances in zip(self.cars, readings)]
+
     def next_test_position(self):
         self.current_test_position += 1
+        if self.sensor_effects:
+            self.sensor_effects.reset()
+        if self.hidden is not None:
+            self.hidden[:] = 0
         #get a random track from the track list
         self.track = random.choice(self.track_list)
-        start_angle, start_pos = self.track.randomize_start_pos()
-        for car in self.cars:
-            car["car"].x, car["car"].y = self.track.pixel_to_world(start_pos[1], start_pos[0])
+        for car, (x, y, start_angle) in zip(self.cars, self.start_poses(self.track, len(self.cars))):
+            car["car"].x, car["car"].y = x, y
             car["car"].angle = start_angle
             car["car"].track = self.track
             car["car"].is_alive = True # Reset alive status
+        if self.interactions:
+            self.interactions.reset([car["car"] for car in self.cars])
             
 
     def draw_population(self, screen):
-        for car in self.cars:
-            car["car"].draw(screen)
+        # Imported here so headless training doesn't need pygame or a display
+        from objects.car_renderer import PopulationRenderer
+
+        PopulationRenderer.shared().draw(screen, [car["car"] for car in self.cars], [car["fitness"] for car in self.cars])
 
     def population_dead(self):
         return sum(car["car"].is_alive for car in self.cars) == 0
@@ -91,5 +189,7 @@ class Population:
         return max(self.cars, key=lambda x: x["fitness"])
 
     def breed_population(self, best_car):
+        if self.optimizer:
+            self.optimizer.tell([car["fitness"] for car in self.cars])
         self.reset_population(self.track, best_car)
 
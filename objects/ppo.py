@@ -0,0 +1,148 @@
+from collections import deque
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.distributions import Normal
+
+class PPOTrainer:
+    def __init__(self, env, brain, learning_rate=3e-4, rollout_steps=128, epochs=4, minibatch_size=256,
+                 gamma=0.99, gae_lambda=0.95, clip=0.2, value_coef=0.5, entropy_coef=0.0, max_grad_norm=0.5, seed=None):
+        """
+        Proximal policy optimization (Schulman et al. 2017) of a Brain on a VectorCarEnv.
+
+        The brain's tanh outputs are the mean of a Gaussian policy with a learned,
+        state independent standard deviation. A separate critic network estimates
+        the value of the observations for generalized advantage estimation. Only the
+        brain is needed to drive afterwards, so it can be pickled and loaded like
+        the brains trained by Population.
+
+        Args:
+            env: VectorCarEnv to collect experience from
+            brain: Brain to train, its outputs must match env.action_size
+            rollout_steps: Steps per car collected before every update
+            epochs: Passes over a rollout per update
+            minibatch_size: Samples per gradient step
+            gamma: Discount factor
+            gae_lambda: GAE lambda
+            clip: PPO ratio clipping range
+            value_coef: Weight of the critic loss
+            entropy_coef: Weight of the entropy bonus
+            max_grad_norm: Gradient norm clipping
+            seed: Seed for torch and the environment
+        """
+        if seed is not None:
+            torch.manual_seed(seed)
+        self.env = env
+        self.brain = brain
+        self.rollout_steps = rollout_steps
+        self.epochs = epochs
+        self.minibatch_size = minibatch_size
+        self.gamma = gamma
+        self.gae_lambda = gae_lambda
+        self.clip = clip
+        self.value_coef = value_coef
+        self.entropy_coef = entropy_coef
+        self.max_grad_norm = max_grad_norm
+
+        num_rays = env.sensors.num_rays
+        self.log_std = nn.Parameter(torch.full((env.action_size,), -0.5))
+        self.critic = nn.Sequential(nn.Linear(num_rays, 64), nn.Tanh(), nn.Linear(64, 64), nn.Tanh(), nn.Linear(64, 1))
+        self.optimizer = torch.optim.Adam(
+            list(brain.parameters()) + [self.log_std] + list(self.critic.parameters()), lr=learning_rate)
+
+        self.observations = torch.as_tensor(env.reset(seed=seed)[0])
+        self.env_steps = 0
+        self.updates = 0
+        self.episode_returns = deque(maxlen=100)
+        self.episode_lengths = deque(maxlen=100)
+
+    def distribution(self, observations):
+        return Normal(self.brain(observations), self.log_std.exp())
+
+    def value(self, observations):
+        return self.critic(observations).squeeze(-1)
+
+    def collect(self):
+        """Runs all cars for rollout_steps and returns the flattened batch with advantages and returns."""
+        T, N = self.rollout_steps, self.env.num_envs
+        observations = torch.zeros((T, N, self.observations.shape[1]))
+        actions = torch.zeros((T, N, self.env.action_size))
+        log_probs = torch.zeros((T, N))
+        rewards = torch.zeros((T, N))
+        dones = torch.zeros((T, N))
+        values = torch.zeros((T + 1, N))
+
+        with torch.no_grad():
+            for t in range(T):
+                distribution = self.distribution(self.observations)
+                action = distribution.sample()
+                observations[t] = self.observations
+                actions[t] = action
+                log_probs[t] = distribution.log_prob(action).sum(-1)
+                values[t] = self.value(self.observations)
+
+                next_observations, reward, terminated, truncated, infos = self.env.step(action.numpy())
+                reward = torch.as_tensor(reward)
+                if truncated.any():
+                    # A truncated episode didn't end, bootstrap from the value of where the car was
+                    final = torch.as_tensor(infos["final_observation"][truncated])
+                    reward[truncated] += self.gamma * self.value(final)
+                rewards[t] = reward
+                dones[t] = torch.as_tensor(terminated | truncated, dtype=torch.float32)
+                finished = ~np.isnan(infos["episode_return"])
+                self.episode_returns.extend(infos["episode_return"][finished])
+                self.episode_lengths.extend(infos["episode_length"][finished])
+                self.observations = torch.as_tensor(next_observations)
+            values[T] = self.value(self.observations)
+
+        # Generalized advantage estimation, backwards over the rollout
+        advantages = torch.zeros((T, N))
+        last = torch.zeros(N)
+        for t in reversed(range(T)):
+            not_done = 1 - dones[t]
+            delta = rewards[t] + self.gamma * values[t + 1] * not_done - values[t]
+            last = delta + self.gamma * self.gae_lambda * not_done * last
+            advantages[t] = last
+        returns = advantages + values[:T]
+
+        self.env_steps += T * N
+        return (observations.reshape(T * N, -1), actions.reshape(T * N, -1), log_probs.reshape(-1),
+                advantages.reshape(-1), returns.reshape(-1))
+
+    def update(self, batch):
+        """Runs the clipped PPO update on a batch from collect()."""
+        observations, actions, old_log_probs, advantages, returns = batch
+        advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-8)
+        size = len(observations)
+        for _ in range(self.epochs):
+            for indices in torch.randperm(size).split(self.minibatch_size):
+                distribution = self.distribution(observations[indices])
+                log_probs = distribution.log_prob(actions[indices]).sum(-1)
+                ratio = (log_probs - old_log_probs[indices]).exp()
+                policy_loss = -torch.min(
+                    ratio * advantages[indices],
+                    ratio.clamp(1 - self.clip, 1 + self.clip) * advantages[indices]).mean()
+                value_loss = ((self.value(observations[indices]) - returns[indices]) ** 2).mean()
+                entropy = distribution.entropy().sum(-1).mean()
+
+                loss = policy_loss + self.value_coef * value_loss - self.entropy_coef * entropy
+                self.optimizer.zero_grad()
+                loss.backward()
+                nn.utils.clip_grad_norm_(
+                    list(self.brain.parameters()) + [self.log_std] + list(self.critic.parameters()), self.max_grad_norm)
+                self.optimizer.step()
+        self.updates += 1
+
+    def train(self, total_steps, callback=None):
+        """
+        Alternates collecting and updating until total_steps environment steps were taken.
+
+        Args:
+            total_steps: Environment steps (cars x ticks) to train for
+            callback: Optional function called with the trainer after every update
+        """
+        while self.env_steps < total_steps:
+            self.update(self.collect())
+            if callback:
+                callback(self)
+        return self.brain
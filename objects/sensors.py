@@ -0,0 +1,290 @@
+import copy
+import numpy as np
+
+
+def wall_lookup(track):
+    """
+    Returns a boolean wall mask of the track layout with a border of walls around it.
+
+    The mask is cached on the track and rebuilt when the layout array is replaced.
+    """
+    cached = getattr(track, "_wall_lookup", None)
+    if cached is None or cached[0] is not track.layout:
+        cached = (track.layout, np.pad(track.layout == 0, 1, constant_values=True))
+        track._wall_lookup = cached
+    return cached[1]
+
+
+class SegmentGrid:
+    def __init__(self, vertical, horizontal, reach, bin_size=None):
+        """
+        Uniform grid of bins over the wall segments of a track. Every bin lists the
+        segments within `reach` of it, so a ray cast only tests the walls near the car.
+
+        Args:
+            vertical: Vertical segments (x, y_top, y_bottom), see Track.wall_segments
+            horizontal: Horizontal segments (y, x_left, x_right)
+            reach: Distance from a bin within which segments are listed, the ray range
+            bin_size: Bin width in pixels, reach by default
+        """
+        self.bin_size = bin_size or reach
+        ends = np.concatenate([vertical[:, [0, 1, 0, 2]], horizontal[:, [1, 0, 2, 0]]]).reshape(-1, 2, 2)
+        low, high = ends.min(axis=1), ends.max(axis=1)  # Bounding boxes (x, y) of all segments
+        self.origin = low.min(axis=0) - reach if len(ends) else np.zeros(2)
+        size = (high.max(axis=0) + reach - self.origin) if len(ends) else np.zeros(2)
+        self.shape = np.maximum(np.ceil(size / self.bin_size).astype(int), 1)
+
+        # Segments whose box overlaps the bin grown by reach, shape (bins, segments)
+        bx, by = np.meshgrid(np.arange(self.shape[0]), np.arange(self.shape[1]), indexing="ij")
+        bin_low = self.origin + np.stack([bx.ravel(), by.ravel()], axis=1) * self.bin_size - reach
+        bin_high = bin_low + self.bin_size + 2 * reach
+        overlap = ((low[None] <= bin_high[:, None]) & (high[None] >= bin_low[:, None])).all(axis=2)
+        is_vertical = np.arange(len(ends)) < len(vertical)
+        self.bins = [(vertical[mask[is_vertical]], horizontal[mask[~is_vertical]]) for mask in overlap]
+
+    def candidates(self, x, y):
+        """Returns the (vertical, horizontal) segments near (x, y)."""
+        bx, by = np.clip(((np.array([x, y]) - self.origin) // self.bin_size).astype(int), 0, self.shape - 1)
+        return self.bins[bx * self.shape[1] + by]
+
+
+def segment_grid(track, reach):
+    """Returns the SegmentGrid of the track's wall segments for rays of length reach, cached on the track."""
+    segments = track.wall_segments()
+    cached = getattr(track, "_segment_grids", None)
+    if cached is None or cached[0] is not segments:
+        cached = (segments, {})
+        track._segment_grids = cached
+    if reach not in cached[1]:
+        cached[1][reach] = SegmentGrid(*segments, reach)
+    return cached[1][reach]
+
+
+class SensorConfig:
+    exact = False  # Default for configurations pickled before exact existed
+
+    def __init__(self, angles=(-45, 0, 45), max_range=200, resolution=5, noise=0.0, exact=False):
+        """
+        Layout of the distance sensors of a car, shared by Car, Democar, Brain and Population.
+
+        Args:
+            angles: Ray angles in degrees relative to the car's heading, positive is left
+            max_range: Maximum ray length in pixels
+            resolution: Distance in pixels between the points sampled along a ray
+            noise: Standard deviation of the Gaussian noise added to the normalized lengths. The casts
+                   return exact lengths, Population and VectorCarEnv add the noise with their
+                   SensorEffects (see SensorEffects.for_sensors), so all noise comes from one seeded generator
+            exact: Intersect the rays with the wall segments of the track (Track.wall_segments)
+                   instead of sampling every `resolution` pixels, so the lengths aren't rounded to the resolution
+        """
+        self.angles = [float(angle) for angle in angles]
+        self.max_range = max_range
+        self.resolution = resolution
+        self.noise = noise
+        self.exact = exact
+
+    @classmethod
+    def evenly_spaced(cls, num_rays, field_of_view=90, **kwargs):
+        """Creates num_rays rays spread evenly over field_of_view degrees centered on the heading."""
+        if num_rays == 1:
+            return cls(angles=[0], **kwargs)
+        return cls(angles=np.linspace(-field_of_view / 2, field_of_view / 2, num_rays), **kwargs)
+
+    @property
+    def num_rays(self):
+        return len(self.angles)
+
+    def __repr__(self):
+        return (f"SensorConfig(angles={self.angles}, max_range={self.max_range}, "
+                f"resolution={self.resolution}, noise={self.noise}, exact={self.exact})")
+
+    @property
+    def settings(self):
+        """The numeric settings as saved with a model, see from_settings."""
+        return np.array([self.max_range, self.resolution, self.noise, self.exact])
+
+    @classmethod
+    def from_settings(cls, angles, settings):
+        """Creates the configuration saved as angles and settings, settings of older models lack exact."""
+        max_range, resolution, noise, *rest = np.asarray(settings).tolist()
+        return cls(angles, max_range, resolution, noise, bool(rest[0]) if rest else False)
+
+    def cast(self, track, x, y, heading):
+        """
+        Casts all rays from (x, y) at once.
+
+        Every ray is sampled every `resolution` pixels up to `max_range`, and the
+        first sample that is outside the track or on a wall ends the ray, the same
+        as stepping each ray in a loop.
+
+        Returns:
+            np.ndarray: Ray lengths normalized between 0 and 1.
+                        0 means the ray hit a wall immediately
+                        1 means the ray reached its maximum length
+        """
+        if self.exact:
+            return self.cast_exact(track, x, y, heading)
+        if min(track.PIXEL_WIDTH, track.PIXEL_HEIGHT) + track.PIXEL_MARGIN < self.resolution:
+            # Sampling would step over walls thinner than the resolution
+            return self.cast_hierarchical(track, x, y, heading)
+        steps = np.arange(1, int(np.ceil(self.max_range / self.resolution)) + 1) * self.resolution
+        steps = np.minimum(steps, self.max_range)
+
+        ray_rad = np.radians(heading + np.asarray(self.angles))
+        cell_width = track.PIXEL_WIDTH + track.PIXEL_MARGIN
+        cell_height = track.PIXEL_HEIGHT + track.PIXEL_MARGIN
+
+        # Grid coordinates of the sample points, shape (rays, steps). They are shifted
+        # by one into a border of walls around the layout, so points outside the track
+        # need no separate bounds check (and truncating to int floors them correctly)
+        grid_col = ((x - track.PIXEL_MARGIN + np.cos(ray_rad)[:, None] * steps) / cell_width + 1).astype(np.intp)
+        grid_row = ((y - track.PIXEL_MARGIN - np.sin(ray_rad)[:, None] * steps) / cell_height + 1).astype(np.intp)  # Pygame y-axis is inverted
+        np.clip(grid_col, 0, track.cols + 1, out=grid_col)
+        np.clip(grid_row, 0, track.rows + 1, out=grid_row)
+
+        # Look all points up in the flattened wall mask at once
+        grid_row *= track.cols + 2
+        grid_row += grid_col
+        hit = wall_lookup(track).ravel().take(grid_row)
+
+        # The first hit along each ray, or the full range if the ray hit nothing
+        lengths = np.where(hit.any(axis=1), steps[hit.argmax(axis=1)], steps[-1]) / self.max_range
+        return lengths
+
+    def cast_exact(self, track, x, y, heading):
+        """
+        Casts all rays from (x, y) by intersecting them with the nearby wall segments.
+
+        Returns:
+            np.ndarray: Ray lengths normalized between 0 and 1, 0 if (x, y) is on a wall or outside the track
+        """
+        cell_width = track.PIXEL_WIDTH + track.PIXEL_MARGIN
+        cell_height = track.PIXEL_HEIGHT + track.PIXEL_MARGIN
+        col = int((x - track.PIXEL_MARGIN) // cell_width) + 1
+        row = int((y - track.PIXEL_MARGIN) // cell_height) + 1
+        walls = wall_lookup(track)
+        if not (0 <= row < walls.shape[0] and 0 <= col < walls.shape[1]) or walls[row, col]:
+            return np.zeros(self.num_rays)
+
+        vertical, horizontal = segment_grid(track, self.max_range).candidates(x, y)
+        ray_rad = np.radians(heading + np.asarray(self.angles))
+        dx = np.cos(ray_rad)[:, None]
+        dy = -np.sin(ray_rad)[:, None]  # Pygame y-axis is inverted
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Distance along every ray to the line of every segment, shape (rays, segments)
+            t = (vertical[:, 0] - x) / dx
+            crossing = y + t * dy
+            t_vertical = np.where((t >= 0) & (crossing >= vertical[:, 1]) & (crossing <= vertical[:, 2]), t, np.inf)
+            t = (horizontal[:, 0] - y) / dy
+            crossing = x + t * dx
+            t_horizontal = np.where((t >= 0) & (crossing >= horizontal[:, 1]) & (crossing <= horizontal[:, 2]), t, np.inf)
+        lengths = np.minimum(t_vertical.min(axis=1, initial=np.inf), t_horizontal.min(axis=1, initial=np.inf))
+        lengths = np.minimum(lengths, self.max_range) / self.max_range
+        return lengths
+
+
+    def cast_hierarchical(self, track, x, y, heading):
+        """
+        Casts all rays from (x, y) through the occupancy pyramid of the track, for high
+        resolution layouts. The rays skip empty blocks and end exactly at the first wall cell.
+
+        Returns:
+            np.ndarray: Ray lengths normalized between 0 and 1
+        """
+        from objects.occupancy import occupancy_pyramid  # Imported here, it imports wall_lookup from this module
+
+        cell_width = track.PIXEL_WIDTH + track.PIXEL_MARGIN
+        cell_height = track.PIXEL_HEIGHT + track.PIXEL_MARGIN
+        ray_rad = np.radians(heading + np.asarray(self.angles))
+        lengths = occupancy_pyramid(track).cast(
+            (x - track.PIXEL_MARGIN) / cell_width, (y - track.PIXEL_MARGIN) / cell_height,
+            np.cos(ray_rad) / cell_width, -np.sin(ray_rad) / cell_height, self.max_range) / self.max_range  # Pygame y-axis is inverted
+        return lengths
+
+
+DEFAULT_SENSORS = SensorConfig()
+
+
+class SensorEffects:
+    def __init__(self, noise=0.0, dropout=0.0, dropout_value=1.0, quantization=0.0,
+                 clip_min=0.0, clip_max=1.0, delay=0, seed=None):
+        """
+        Degrades perfect ray lengths the way the ultrasonic sensors of the physical car do,
+        for a whole population at once. All values are in normalized ray lengths (0 to 1).
+
+        Args:
+            noise: Standard deviation of the Gaussian noise added to every reading
+            dropout: Probability that a reading is lost and replaced by dropout_value
+            dropout_value: Reading reported for a lost echo, 1.0 is "nothing in range"
+            quantization: Step size the readings are rounded to, 0 to disable
+            clip_min: Shortest distance the hardware can report
+            clip_max: Longest distance the hardware can report
+            delay: Number of ticks between measuring and the brain seeing the reading
+            seed: Seed for the random generator, None for a random seed
+        """
+        self.noise = noise
+        self.dropout = dropout
+        self.dropout_value = dropout_value
+        self.quantization = quantization
+        self.clip_min = clip_min
+        self.clip_max = clip_max
+        self.delay = delay
+        self.rng = np.random.default_rng(seed)
+        self.history = None  # (delay + 1, cars, rays) ring buffer of past readings
+        self.tick = 0
+
+    @classmethod
+    def for_sensors(cls, sensors, effects=None, seed=None):
+        """
+        Returns the effects to apply to the readings of a SensorConfig: a copy of effects
+        that also adds the noise of the SensorConfig, or effects itself if it has none.
+
+        Args:
+            sensors: SensorConfig of the cars
+            effects: SensorEffects to extend, None for only the sensor noise
+            seed: Seed for the random generator if effects is None
+
+        Returns:
+            SensorEffects or None: None if there is nothing to apply
+        """
+        if not sensors.noise:
+            return effects
+        effects = copy.copy(effects) if effects is not None else cls(seed=seed)
+        effects.noise = float(np.hypot(effects.noise, sensors.noise))  # Independent Gaussian noise adds up in quadrature
+        return effects
+
+    def reset(self):
+        """Forgets the delayed readings, call when the cars are moved to a new start."""
+        self.history = None
+        self.tick = 0
+
+    def apply(self, readings):
+        """
+        Applies delay, noise, dropouts, clipping and quantization.
+
+        Args:
+            readings: Array of shape (cars, rays) with the true normalized ray lengths
+
+        Returns:
+            np.ndarray: The readings the brains get, same shape
+        """
+        readings = np.asarray(readings, dtype=np.float64)
+
+        if self.delay > 0:
+            if self.history is None or self.history.shape[1:] != readings.shape:
+                # Until enough ticks have passed the first reading is repeated
+                self.history = np.repeat(readings[None], self.delay + 1, axis=0)
+            self.history[self.tick % (self.delay + 1)] = readings
+            self.tick += 1
+            readings = self.history[self.tick % (self.delay + 1)].copy()  # Oldest reading in the buffer
+        else:
+            readings = readings.copy()
+
+        if self.noise:
+            readings += self.rng.normal(0, self.noise, readings.shape)
+        if self.dropout:
+            readings[self.rng.random(readings.shape) < self.dropout] = self.dropout_value
+        np.clip(readings, self.clip_min, self.clip_max, out=readings)
+        if self.quantization:
+            readings = np.round(readings / self.quantization) * self.quantization
+        return readings
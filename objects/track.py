@@ -1,4 +1,4 @@
-import pygame
+import copy
 import json
 import numpy as np
 import os
@@ -21,6 +21,10 @@ class Track:
         self.start_pos = None
         self.rows = 0
         self.cols = 0
+
+        # Precomputed by utils/track_pipeline.py when the track was saved, None for older track files
+        self.start_poses = None
+        self.progress = None
         self.load_track()
         self.scale_track(width, height)
 
@@ -37,6 +41,9 @@ class Track:
             self.layout = np.array(data['layout']) # Convert layout to NumPy array
             self.start_pos = tuple(data['start_pos']) # Ensure start_pos is a tuple
             self.rows, self.cols = self.layout.shape
+            if 'start_poses' in data:
+                self.start_poses = np.array(data['start_poses'])
+                self.progress = np.array(data['progress'])
             print(f"Track loaded successfully from {self.filepath}")
             print(f"Layout dimensions: {self.rows}x{self.cols}, Start position: {self.start_pos}")
         except FileNotFoundError:
@@ -48,12 +55,22 @@ class Track:
             self.layout = None
             self.start_pos = None
 
-    def randomize_start_pos(self):
-        """Randomizes the start position of the track to a random valid position and also returns a start angle"""
+    def randomize_start_pos(self, rng=None):
+        """
+        Randomizes the start position of the track to a random valid position and also returns a start angle.
+        rng is an optional np.random.Generator for reproducible starts, the global NumPy random state by default.
+        """
+        randint = rng.integers if rng is not None else np.random.randint
+        if self.start_poses is not None:
+            # Use the start poses precomputed when the track was saved
+            r, c, angle = self.start_poses[randint(0, len(self.start_poses))]
+            self.start_pos = (int(r), int(c))
+            return int(angle), self.start_pos
+
         # Keep trying until we find a valid position
         while True:
             valid_positions = np.where(self.layout > 0)
-            random_idx = np.random.randint(0, len(valid_positions[0]))
+            random_idx = randint(0, len(valid_positions[0]))
             start_pos = (valid_positions[0][random_idx], valid_positions[1][random_idx])
 
             # Calculate the angle of the start position by making sure there are two track cells in the direction of the start angle
@@ -68,12 +85,19 @@ class Track:
 
     def draw(self, screen):
         """Draws the track walls and start position onto the provided screen surface."""
+        import pygame # Only needed for drawing, headless simulations don't load it
+
         if self.layout is None:
             print("Cannot draw track: Layout not loaded.")
             return
 
         screen.fill(self.BACKGROUND_COLOR) # Clear screen first
 
+        if min(self.PIXEL_WIDTH, self.PIXEL_HEIGHT) < 4:
+            # Too many cells to draw one by one, draw the wall cells as one image
+            screen.blit(self.wall_surface(), (self.PIXEL_MARGIN, self.PIXEL_MARGIN))
+            return
+
         for r in range(self.rows):
             for c in range(self.cols):
                 # Calculate screen coordinates for the corners of the current cell
@@ -109,6 +133,116 @@ class Track:
             else:
                 print(f"Warning: Start position {self.start_pos} is outside the grid dimensions.")
 
+    def progress_at(self, x, y):
+        """Returns the progress (0..1 around the loop) of the cell at world position (x, y), None if unknown."""
+        if self.progress is None:
+            return None
+        c = int((x - self.PIXEL_MARGIN) // (self.PIXEL_WIDTH + self.PIXEL_MARGIN))
+        r = int((y - self.PIXEL_MARGIN) // (self.PIXEL_HEIGHT + self.PIXEL_MARGIN))
+        if not (0 <= r < self.rows and 0 <= c < self.cols) or self.progress[r, c] < 0:
+            return None
+        return self.progress[r, c]
+
+    def wall_surface(self):
+        """Returns an image of the layout with the wall cells in WALL_COLOR, cached for high resolution tracks."""
+        import pygame
+
+        cached = getattr(self, "_wall_surface", None)
+        if cached is None or cached[0] is not self.layout:
+            cell_width = self.PIXEL_WIDTH + self.PIXEL_MARGIN
+            cell_height = self.PIXEL_HEIGHT + self.PIXEL_MARGIN
+            walls = (self.layout == 0).T.repeat(cell_width, axis=0).repeat(cell_height, axis=1)  # surfarray is (x, y)
+            pixels = np.empty(walls.shape + (3,), dtype=np.uint8)
+            pixels[:] = self.BACKGROUND_COLOR
+            pixels[walls] = self.WALL_COLOR
+            cached = (self.layout, pygame.surfarray.make_surface(pixels))
+            self._wall_surface = cached
+        return cached[1]
+
+    def resample(self, cell_size=1):
+        """
+        Returns a copy of the track with a high resolution layout of cell_size pixels per
+        cell and no margins, covering the same walls at the same positions.
+
+        Cars collide and sense the same walls on it, but a fine layout can also hold
+        walls thinner than a cell of the original one, e.g. from a track image. The
+        precomputed start poses and progress are resampled too.
+        """
+        cell_width = self.PIXEL_WIDTH + self.PIXEL_MARGIN
+        cell_height = self.PIXEL_HEIGHT + self.PIXEL_MARGIN
+        cols = int(np.ceil((self.cols * cell_width + self.PIXEL_MARGIN) / cell_size))
+        rows = int(np.ceil((self.rows * cell_height + self.PIXEL_MARGIN) / cell_size))
+
+        # Original cell under the center of every new cell, -1 outside the layout
+        col = np.floor(((np.arange(cols) + 0.5) * cell_size - self.PIXEL_MARGIN) / cell_width).astype(int)
+        row = np.floor(((np.arange(rows) + 0.5) * cell_size - self.PIXEL_MARGIN) / cell_height).astype(int)
+        col[col >= self.cols] = -1
+        row[row >= self.rows] = -1
+        inside = (row[:, None] >= 0) & (col[None, :] >= 0)
+
+        def resample_field(field, outside):
+            return np.where(inside, field[np.maximum(row, 0)[:, None], np.maximum(col, 0)[None, :]], outside)
+
+        track = copy.copy(self)
+        track.layout = resample_field(self.layout, 0)
+        track.rows, track.cols = track.layout.shape
+        track.PIXEL_WIDTH = track.PIXEL_HEIGHT = cell_size
+        track.PIXEL_MARGIN = 0
+        if self.start_pos is not None:
+            track.start_pos = track.world_to_cell(*self.pixel_to_world(self.start_pos[1], self.start_pos[0]))
+        if self.start_poses is not None:
+            track.start_poses = np.array([(*track.world_to_cell(*self.pixel_to_world(c, r)), angle)
+                                          for r, c, angle in self.start_poses], dtype=int)
+        if self.progress is not None:
+            track.progress = resample_field(self.progress, -1)
+        return track
+
+    def world_to_cell(self, x, y):
+        """Returns the (row, column) of the cell at world position (x, y)."""
+        return (int((y - self.PIXEL_MARGIN) // (self.PIXEL_HEIGHT + self.PIXEL_MARGIN)),
+                int((x - self.PIXEL_MARGIN) // (self.PIXEL_WIDTH + self.PIXEL_MARGIN)))
+
+    def wall_segments(self):
+        """
+        Returns the walls between track and wall cells (and around the grid) as merged line segments.
+
+        Neighboring colinear cell edges are merged into one segment, the lines
+        draw() draws cell by cell. Cell c covers x from PIXEL_MARGIN + c * (PIXEL_WIDTH + PIXEL_MARGIN)
+        to the start of the next cell, as in Car.check_collision and SensorConfig.cast.
+
+        Returns:
+            (vertical, horizontal): Arrays of shape (segments, 3), vertical segments as
+            (x, y_top, y_bottom) and horizontal ones as (y, x_left, x_right) in pixels
+        """
+        cached = getattr(self, "_wall_segments", None)
+        key = (self.layout, self.PIXEL_WIDTH, self.PIXEL_HEIGHT, self.PIXEL_MARGIN)
+        if cached is not None and cached[0][0] is key[0] and cached[0][1:] == key[1:]:
+            return cached[1]
+
+        track = np.pad(self.layout > 0, 1, constant_values=False)
+        cell_width = self.PIXEL_WIDTH + self.PIXEL_MARGIN
+        cell_height = self.PIXEL_HEIGHT + self.PIXEL_MARGIN
+
+        def runs(edges):
+            """Returns (line, start, end) of the runs of True along the rows of edges."""
+            padded = np.pad(edges, ((0, 0), (1, 1))).astype(np.int8)
+            line, start = np.nonzero(np.diff(padded, axis=1) == 1)
+            _, end = np.nonzero(np.diff(padded, axis=1) == -1)
+            return line, start, end
+
+        # Edge between padded columns k and k + 1 is the left side of layout column k, runs go along the rows
+        line, start, end = runs((track[:, :-1] ^ track[:, 1:]).T)
+        vertical = np.stack([self.PIXEL_MARGIN + line * cell_width,
+                             self.PIXEL_MARGIN + (start - 1) * cell_height,
+                             self.PIXEL_MARGIN + (end - 1) * cell_height], axis=1).astype(float)
+        line, start, end = runs(track[:-1, :] ^ track[1:, :])
+        horizontal = np.stack([self.PIXEL_MARGIN + line * cell_height,
+                               self.PIXEL_MARGIN + (start - 1) * cell_width,
+                               self.PIXEL_MARGIN + (end - 1) * cell_width], axis=1).astype(float)
+
+        self._wall_segments = (key, (vertical, horizontal))
+        return vertical, horizontal
+
     def pixel_to_world(self, x, y):
         """Converts pixel coordinates to world coordinates."""
         center_x = x * (self.PIXEL_WIDTH + self.PIXEL_MARGIN) + self.PIXEL_MARGIN + self.PIXEL_WIDTH // 2
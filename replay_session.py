@@ -0,0 +1,69 @@
+import argparse
+import sys
+import time
+import numpy as np
+
+from objects.numpy_brain import load_model
+from utils.calibration import load_calibration
+from utils.session_log import read_session
+
+# Replays recorded physical car sessions (see utils/session_log.py) through model
+# checkpoints offline and compares their decisions to the ones taken during the session.
+# All readings of a session are evaluated in one batch, far faster than real time.
+#
+#   python replay_session.py logs/session_*.session --model models/model_last.pkl models/model_2000.pkl
+
+parser = argparse.ArgumentParser(description="Replay recorded car sessions through model checkpoints")
+parser.add_argument("sessions", nargs="+")
+parser.add_argument("--model", nargs="+", default=["models/model_last.pkl"])
+parser.add_argument("--sensitivity", type=float, default=0.2, help="steering threshold for turning, as in Car.control")
+parser.add_argument("--min-agreement", type=float, default=None,
+                    help="exit with an error if a model takes the recorded decision less often than this fraction")
+args = parser.parse_args()
+
+
+def decisions(steering):
+    """Turns steering values into the discrete commands L, R and F."""
+    return np.where(steering >= args.sensitivity, "L", np.where(steering <= -args.sensitivity, "R", "F"))
+
+
+failed = False
+for session_path in args.sessions:
+    records = read_session(session_path)
+    if len(records) == 0:
+        print(f"{session_path}: no records")
+        continue
+    duration = records["time"][-1] - records["time"][0]
+    recorded_steering = records["outputs"][:, 0]
+    recorded_commands = np.array([chr(c).upper() if c else "" for c in records["command"]])
+    print(f"{session_path}: {len(records)} readings over {duration:.1f}s")
+
+    for model_path in args.model:
+        brain = load_model(model_path)
+        calibration = load_calibration(model_path)
+
+        start = time.perf_counter()
+        inputs = records["rays"] if calibration is None else calibration.apply(records["rays"])
+        # Recurrent brains step through the records in order, carrying their hidden state
+        outputs = brain.forward(np.asarray(inputs, dtype=np.float32))
+        elapsed = time.perf_counter() - start
+        steering = outputs[:, 0]
+
+        # Compare to the brain outputs of the session where they were recorded, otherwise to the commands sent
+        has_outputs = ~np.isnan(recorded_steering)
+        if has_outputs.any():
+            agreement = np.mean(decisions(steering[has_outputs]) == decisions(recorded_steering[has_outputs]))
+            difference = np.mean(np.abs(steering[has_outputs] - recorded_steering[has_outputs]))
+            details = f"mean steering difference {difference:.3f}"
+        else:
+            has_command = np.isin(recorded_commands, ["L", "R", "F"])
+            agreement = np.mean(decisions(steering[has_command]) == recorded_commands[has_command]) if has_command.any() else np.nan
+            details = f"compared to {has_command.sum()} commands sent"
+
+        speedup = duration / elapsed if elapsed > 0 else float("inf")
+        print(f"  {model_path}: decision agreement {agreement:.1%}, {details}, "
+              f"replayed in {elapsed * 1000:.1f}ms ({speedup:,.0f}x real time)")
+        if args.min_agreement is not None and not agreement >= args.min_agreement:
+            failed = True
+
+sys.exit(1 if failed else 0)
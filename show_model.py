@@ -1,10 +1,9 @@
 import pygame
-import pickle
 import os
 from objects.track import Track
 from objects.car import Car
-from objects.brain import Brain
-import random
+from objects.car_renderer import CarRenderer
+from objects.numpy_brain import load_model
 
 # Initialize Pygame
 pygame.init()
@@ -25,8 +24,7 @@ track = Track(track_file_path, width=WINDOW_WIDTH, height=WINDOW_HEIGHT)
 
 # Load the trained brain
 try:
-    with open("models/model_last.pkl", "rb") as f:
-        brain = pickle.load(f)
+    brain = load_model("models/model_last.pkl")
 except FileNotFoundError:
     print("Error: model_last.pkl not found. Please train the model first.")
     exit(1)
@@ -34,10 +32,9 @@ except FileNotFoundError:
 # Create a single car with the trained brain
 start_angle, start_pos = track.randomize_start_pos()
 x, y = track.pixel_to_world(start_pos[1], start_pos[0])
-car = Car(x, y, track, color=(0, 0, 255))  # Blue color for the car
+car = Car(x, y, track, color=(0, 0, 255), sensors=brain.sensors)  # Blue color for the car
 car.angle = start_angle
-car.ROTATION_SPEED = 1
-car.brain = brain  # Properly assign the loaded brain to the car
+renderer = CarRenderer()
 
 # Main game loop
 running = True
@@ -53,9 +50,12 @@ while running:
     # Update car
     if car.is_alive:
         ray_distances = car.ray_cast()
-        steering = car.brain.think(ray_distances)  # Use car's brain instead of global brain
-        car.control(steering, 0.2)
-        car.update()
+        actions = brain.think(ray_distances)
+        if isinstance(actions, list):  # Model trained with continuous control
+            car.control_continuous(*actions)
+        else:
+            car.control(actions, 0.2)
+            car.update()
         car.distance_traveled = 0
     else:
         # Reset car at a new random position when it dies
@@ -70,7 +70,7 @@ while running:
 
     # Draw everything
     track.draw(screen)
-    car.draw(screen)
+    renderer.draw(screen, car)
 
     # Update display
     pygame.display.flip()
@@ -1,12 +1,13 @@
 from utils.support_functions import *
+from utils.track_pipeline import prepare_track, next_track_path, write_track
 import pygame
 import numpy as np
 import sys
-import json # Added json import
 import os # Added os import
 
 rows, columns = 27, 19
-TSP = TSPDecoder(rows=rows, columns=columns)
+# Set TSP_PORT=sim://tsp to draw with a simulated pressure pad
+TSP = TSPDecoder(port=os.environ.get("TSP_PORT"), rows=rows, columns=columns)
 
 # Define constants
 PIXEL_WIDTH = 20
@@ -16,6 +17,7 @@ WALL_COLOR = (255, 255, 255) # Define wall color
 BACKGROUND_COLOR = (0, 0, 0)
 START_COLOR = (0, 255, 0) # Define start position color
 TRACK_DIR = "assets/demo_tracks" # Directory to save tracks
+MIN_CORRIDOR_WIDTH = 1 # Narrowest corridor (in cells) a saved track may have
 
 # Initialise the PyGame screen according to resolution
 pygame.init()
@@ -24,53 +26,91 @@ WINDOW_SIZE = [
     rows * PIXEL_HEIGHT + rows * PIXEL_MARGIN + 2 * PIXEL_MARGIN
 ]
 
-def draw_track_walls(screen, grid):
-    screen.fill(BACKGROUND_COLOR) # Clear screen first
+def draw_cell(screen, grid, r, c):
     rows, cols = grid.shape
     wall_width = 1 # Thickness of the wall lines
 
-    for r in range(rows):
-        for c in range(cols):
-            # Calculate screen coordinates for the corners of the current cell
-            x = c * (PIXEL_WIDTH + PIXEL_MARGIN) + PIXEL_MARGIN
-            y = r * (PIXEL_HEIGHT + PIXEL_MARGIN) + PIXEL_MARGIN
-            cell_rect = pygame.Rect(x, y, PIXEL_WIDTH, PIXEL_HEIGHT)
-
-            if grid[r, c] > 0: # This is a track cell
-                # Check neighbor above
-                if r == 0 or grid[r - 1, c] == 0:
-                    pygame.draw.line(screen, WALL_COLOR, cell_rect.topleft, cell_rect.topright, wall_width)
-                # Check neighbor below
-                if r == rows - 1 or grid[r + 1, c] == 0:
-                     pygame.draw.line(screen, WALL_COLOR, cell_rect.bottomleft, cell_rect.bottomright, wall_width)
-                # Check neighbor left
-                if c == 0 or grid[r, c - 1] == 0:
-                    pygame.draw.line(screen, WALL_COLOR, cell_rect.topleft, cell_rect.bottomleft, wall_width)
-                # Check neighbor right
-                if c == cols - 1 or grid[r, c + 1] == 0:
-                    pygame.draw.line(screen, WALL_COLOR, cell_rect.topright, cell_rect.bottomright, wall_width)
-
-    # Draw start position if it exists
-    if start_pos:
-        r, c = start_pos
+    # Calculate screen coordinates for the corners of the current cell
+    x = c * (PIXEL_WIDTH + PIXEL_MARGIN) + PIXEL_MARGIN
+    y = r * (PIXEL_HEIGHT + PIXEL_MARGIN) + PIXEL_MARGIN
+    cell_rect = pygame.Rect(x, y, PIXEL_WIDTH, PIXEL_HEIGHT)
+
+    # Clear the cell, including the bottom/right wall lines that lie just outside its rect
+    screen.fill(BACKGROUND_COLOR, (x, y, PIXEL_WIDTH + 1, PIXEL_HEIGHT + 1))
+
+    if grid[r, c] > 0: # This is a track cell
+        # Check neighbor above
+        if r == 0 or grid[r - 1, c] == 0:
+            pygame.draw.line(screen, WALL_COLOR, cell_rect.topleft, cell_rect.topright, wall_width)
+        # Check neighbor below
+        if r == rows - 1 or grid[r + 1, c] == 0:
+             pygame.draw.line(screen, WALL_COLOR, cell_rect.bottomleft, cell_rect.bottomright, wall_width)
+        # Check neighbor left
+        if c == 0 or grid[r, c - 1] == 0:
+            pygame.draw.line(screen, WALL_COLOR, cell_rect.topleft, cell_rect.bottomleft, wall_width)
+        # Check neighbor right
+        if c == cols - 1 or grid[r, c + 1] == 0:
+            pygame.draw.line(screen, WALL_COLOR, cell_rect.topright, cell_rect.bottomright, wall_width)
+
+    # Draw start position if it is in this cell
+    if start_pos == (r, c):
         x = c * (PIXEL_WIDTH + PIXEL_MARGIN) + PIXEL_MARGIN + PIXEL_WIDTH // 2
         y = r * (PIXEL_HEIGHT + PIXEL_MARGIN) + PIXEL_MARGIN + PIXEL_HEIGHT // 2
         pygame.draw.circle(screen, START_COLOR, (x, y), min(PIXEL_WIDTH, PIXEL_HEIGHT) // 3)
 
-def has_neighbor(grid, r, c):
+def draw_track_walls(screen, grid):
+    screen.fill(BACKGROUND_COLOR) # Clear screen first
     rows, cols = grid.shape
-    for dr in [-1, 0, 1]:
-        for dc in [-1, 0, 1]:
-            # Skip the center cell itself
-            if dr == 0 and dc == 0:
+
+    for r in range(rows):
+        for c in range(cols):
+            draw_cell(screen, grid, r, c)
+
+def update_track_walls(screen, grid, changed):
+    # The walls of a cell depend on its 4 neighbors, so redraw the changed cells and their neighbors only
+    redraw = changed.copy()
+    redraw[1:, :] |= changed[:-1, :]
+    redraw[:-1, :] |= changed[1:, :]
+    redraw[:, 1:] |= changed[:, :-1]
+    redraw[:, :-1] |= changed[:, 1:]
+
+    for r, c in zip(*np.nonzero(redraw)):
+        draw_cell(screen, grid, r, c)
+
+def neighbor_mask(drawn):
+    # Dilate the drawn cells with a 3x3 kernel, leaving out the center cell itself
+    rows, cols = drawn.shape
+    padded = np.pad(drawn, 1)
+    mask = np.zeros_like(drawn)
+    for dr in range(3):
+        for dc in range(3):
+            if dr == 1 and dc == 1:
                 continue
-            nr, nc = r + dr, c + dc
-            # Check boundaries
-            if 0 <= nr < rows and 0 <= nc < cols:
-                # Check if neighbor has been drawn (is non-zero)
-                if grid[nr, nc] > 0:
-                    return True
-    return False
+            mask |= padded[dr:dr + rows, dc:dc + cols]
+    return mask
+
+def capture_frame(grid, new_grid):
+    global start_pos
+    # Pressed cells that got harder than before
+    candidates = (new_grid > grid) & (new_grid > 127)
+    drawn = grid > 0
+
+    if not candidates.any():
+        return np.zeros_like(drawn)
+
+    if not drawn.any():
+        # Allow the first pixel to be drawn anywhere and make it the start position
+        r, c = np.unravel_index(np.argmax(candidates), grid.shape)
+        start_pos = (int(r), int(c))
+        grid[start_pos] = new_grid[start_pos]
+        print(f"Start position set to: {start_pos}")
+
+    # Only update pixels that have a drawn neighbor
+    update = candidates & neighbor_mask(grid > 0)
+    grid[update] = new_grid[update]
+
+    # Cells can only turn from wall into track, return the ones that did
+    return (grid > 0) & ~drawn
 
 screen = pygame.display.set_mode(WINDOW_SIZE)
 pygame.display.set_caption("Haptic Skin visualiser")
@@ -78,30 +118,27 @@ pygame.display.set_caption("Haptic Skin visualiser")
 # Initialise the PyGame Clock for timing
 clock = pygame.time.Clock()
 grid = np.zeros((TSP.rows, TSP.columns))
-new_grid = np.zeros((TSP.rows, TSP.columns))
 start_pos = None # Initialize start position
+draw_track_walls(screen, grid) # Walls are only redrawn where the grid changes after this
+last_stats_update = 0 # Time of the last TSP stats update in the window title
 
 # Ensure track directory exists
 os.makedirs(TRACK_DIR, exist_ok=True)
 
 def save_track(grid_data, start_position):
+    # Validate the layout and precompute the data the simulator needs
+    try:
+        data_to_save = prepare_track(grid_data, start_position, min_width=MIN_CORRIDOR_WIDTH)
+    except ValueError as e:
+        print(f"Cannot save track: {e}")
+        return False
+
     # Find the next available track number
-    track_num = 0
-    while os.path.exists(os.path.join(TRACK_DIR, f"track_{track_num}.json")):
-        track_num += 1
-    filepath = os.path.join(TRACK_DIR, f"track_{track_num}.json")
-
-    # Prepare data for JSON
-    track_layout = grid_data.astype(int).tolist() # Convert numpy array to list
-    data_to_save = {
-        "layout": track_layout,
-        "start_pos": start_position
-    }
+    filepath = next_track_path(TRACK_DIR)
 
     # Save to JSON
     try:
-        with open(filepath, 'w') as f:
-            json.dump(data_to_save, f, indent=4)
+        write_track(data_to_save, filepath)
         print(f"Track saved successfully to {filepath}")
         return True
     except Exception as e:
@@ -112,6 +149,7 @@ def reset_state():
     global grid, start_pos
     grid = np.zeros((TSP.rows, TSP.columns))
     start_pos = None
+    draw_track_walls(screen, grid)
     print("Grid reset.")
 
 while True:
@@ -134,31 +172,23 @@ while True:
     if reset_pending:
         reset_state()
 
-    # Get the frame
-    if TSP.frame_available:
-        new_grid = TSP.readFrame()
-
-    for row in range(rows):
-        for column in range(columns):
-            prev_pixel = grid[row][column]
-            new_pixel = new_grid[row][column]
-
-            if new_pixel > prev_pixel and new_pixel > 127:
-                # Only update if the pixel has a neighbor or if the grid is empty
-                can_draw = False
-                if np.any(grid) and has_neighbor(grid, row, column):
-                    can_draw = True
-                elif not np.any(grid): # Allow the first pixel to be drawn anywhere
-                    can_draw = True
-
-                if can_draw:
-                    grid[row][column] = new_pixel
-                    # Set start position if it's the first pixel being drawn
-                    if start_pos is None:
-                        start_pos = (row, column)
-                        print(f"Start position set to: {start_pos}")
+    # Get every frame received since the last loop, so fast strokes between two loops are not lost
+    frames, _ = TSP.readFrames()
 
-    draw_track_walls(screen, grid)
+    changed = np.zeros(grid.shape, dtype=bool)
+    for new_grid in frames:
+        changed |= capture_frame(grid, new_grid)
+
+    update_track_walls(screen, grid, changed)
+
+    # Show the measured sensor throughput once per second
+    if pygame.time.get_ticks() - last_stats_update > 1000:
+        last_stats_update = pygame.time.get_ticks()
+        stats = TSP.getStats()
+        pygame.display.set_caption(
+            f"Haptic Skin visualiser - {stats['frame_rate']:.0f} FPS, "
+            f"{stats['frames_dropped']} dropped, {stats['resyncs']} resyncs"
+        )
 
     # Limit the framerate to 60FPS
     clock.tick(60)
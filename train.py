@@ -1,6 +1,8 @@
 import pygame
 from objects.track import Track
 from objects.population import Population # Import Population class
+from objects.neat import NeatPopulation
+from objects.sensors import SensorConfig, SensorEffects
 import os
 import random
 # Initialize Pygame
@@ -23,7 +25,29 @@ for file in os.listdir("assets/tracks"):
     track = Track(track_file_path, width=WINDOW_WIDTH, height=WINDOW_HEIGHT)
     track_list.append(track)
 
-population = Population(size=50, track=track_list[0])
+# "discrete" (left/right/straight) or "continuous" (proportional steering and throttle)
+CONTROL_MODE = "discrete"
+# Ray angles in degrees relative to the heading, range and sample spacing in pixels.
+# exact=True intersects the rays with the track's wall segments instead of sampling them
+SENSORS = SensorConfig(angles=[-45, 0, 45], max_range=200, resolution=5)
+# Noise, dropouts, quantization and delay of the real sensors, None to train on perfect readings.
+# E.g. SensorEffects(noise=0.02, dropout=0.01, quantization=0.05, delay=2)
+SENSOR_EFFECTS = None
+# None keeps the best car and mutates it for the rest, or "ga", "es" (OpenAI-ES) or "cmaes", see objects/optimizers.py
+OPTIMIZER = None
+# Hidden state size of recurrent (GRU) brains that remember earlier readings, None for feed-forward brains
+RECURRENT_SIZE = None
+# Race all cars against each other: spread start poses, car-to-car crashes and rays that see other cars
+MULTI_AGENT = False
+# Evolve the network topology with NEAT (objects/neat.py) instead of fixed size brains, ignores OPTIMIZER
+NEAT = False
+if NEAT:
+    population = NeatPopulation(size=50, track=track_list[0], control_mode=CONTROL_MODE, sensors=SENSORS,
+                                sensor_effects=SENSOR_EFFECTS, multi_agent=MULTI_AGENT)
+else:
+    population = Population(size=50, track=track_list[0], control_mode=CONTROL_MODE, sensors=SENSORS,
+                            sensor_effects=SENSOR_EFFECTS, optimizer=OPTIMIZER, recurrent_size=RECURRENT_SIZE,
+                            multi_agent=MULTI_AGENT)
 population.track_list = track_list
 
 # Game state
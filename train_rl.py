@@ -0,0 +1,64 @@
+import argparse
+import contextlib
+import glob
+import io
+import os
+import pickle
+import time
+import numpy as np
+
+from objects.brain import Brain
+from objects.environment import VectorCarEnv
+from objects.ppo import PPOTrainer
+from objects.sensors import SensorConfig
+from objects.track import Track
+
+# Headless PPO training of a Brain with batched rollouts on CPU. The trained brain is
+# pickled like the ones from train.py, so show_model.py, evaluate_models.py and the
+# car control scripts load it the same way.
+#
+#   python train_rl.py --steps 1000000 --envs 16
+
+WINDOW_WIDTH = 1000  # Same track scale as train.py
+WINDOW_HEIGHT = 1000
+
+
+def load_tracks(pattern="assets/tracks/*.json"):
+    with contextlib.redirect_stdout(io.StringIO()):  # Track prints a line per loaded file
+        return [Track(path, width=WINDOW_WIDTH, height=WINDOW_HEIGHT) for path in sorted(glob.glob(pattern))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a brain with PPO on a batched car environment")
+    parser.add_argument("--steps", type=int, default=1_000_000, help="environment steps (cars x ticks) to train for")
+    parser.add_argument("--envs", type=int, default=16, help="cars simulated in parallel")
+    parser.add_argument("--rollout", type=int, default=128, help="steps per car between updates")
+    parser.add_argument("--hidden", type=int, nargs="*", default=[3], help="hidden layer sizes of the brain")
+    parser.add_argument("--control-mode", choices=["discrete", "continuous"], default="continuous")
+    parser.add_argument("--lr", type=float, default=3e-4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-every", type=int, default=50, help="updates between checkpoints")
+    args = parser.parse_args()
+
+    sensors = SensorConfig(angles=[-45, 0, 45], max_range=200, resolution=5)
+    env = VectorCarEnv(load_tracks(), num_envs=args.envs, sensors=sensors, control_mode=args.control_mode, seed=args.seed)
+    brain = Brain(sensors.num_rays, args.hidden, env.action_size, sensors)
+    trainer = PPOTrainer(env, brain, learning_rate=args.lr, rollout_steps=args.rollout, seed=args.seed)
+
+    os.makedirs("models", exist_ok=True)
+    start = time.perf_counter()
+
+    def report(trainer):
+        if trainer.updates % 10 == 0:
+            mean_return = np.mean(trainer.episode_returns) if trainer.episode_returns else float("nan")
+            mean_length = np.mean(trainer.episode_lengths) if trainer.episode_lengths else float("nan")
+            print(f"update {trainer.updates}, steps {trainer.env_steps}, episode return {mean_return:.1f}, "
+                  f"episode length {mean_length:.0f}, {trainer.env_steps / (time.perf_counter() - start):.0f} steps/s")
+        if trainer.updates % args.save_every == 0:
+            with open(f"models/model_rl_{trainer.updates}.pkl", "wb") as f:
+                pickle.dump(trainer.brain, f)
+
+    trainer.train(args.steps, callback=report)
+    with open("models/model_rl_last.pkl", "wb") as f:
+        pickle.dump(trainer.brain, f)
+    print("Saved models/model_rl_last.pkl")
@@ -0,0 +1,449 @@
+"""
+Fixed-point export of a trained brain for inference on the car itself, so the
+control loop doesn't wait for the Bluetooth round trip to the host.
+
+The weights of every layer are quantized to int8 (or int16) with a power of two
+scale, activations are int16 with FRAC_BITS fractional bits, sums are
+accumulated in 32 bit (64 bit for int16 weights) and tanh is a small lookup
+table with linear interpolation. FixedPointBrain emulates the integer
+arithmetic of the generated C header bit for bit, so its outputs are what the
+car computes.
+
+    python -m utils.arduino_export export models/model_last.pkl --output Bluetooth/brain.h
+    python -m utils.arduino_export verify models/model_last.pkl --sessions logs/*.session
+
+verify compares the steering decisions of the fixed-point brain to the float
+model on recorded sessions and on readings simulated on the training tracks,
+and exits with an error if they differ by more than the tolerance.
+
+If the model has a calibration (see utils/calibration.py) its knots are
+exported as well, and brain_calibrate() maps the raw readings of the binary
+protocol (tenths of the sensor unit) to the normalized ray lengths on the car.
+"""
+import argparse
+import contextlib
+import glob
+import io
+import sys
+import numpy as np
+
+from utils.calibration import load_calibration
+from utils.protocol import DISTANCE_SCALE
+
+FRAC_BITS = 12  # Activations are int16 with 12 fractional bits, -8..8
+ONE = 1 << FRAC_BITS
+INT16_MIN, INT16_MAX = -(1 << 15), (1 << 15) - 1
+TANH_STEP_BITS = 4  # The tanh table has 16 entries per unit
+TANH_RANGE = 4  # tanh(x) is 1 (in fixed point) for |x| >= 4
+TANH_TABLE = np.rint(np.tanh(np.arange(TANH_RANGE * (1 << TANH_STEP_BITS) + 1) / (1 << TANH_STEP_BITS))
+                     * ONE).astype(np.int64)
+
+
+def to_fixed(values) -> np.ndarray:
+    """Converts floats to saturated int16 fixed point with FRAC_BITS fractional bits."""
+    return np.clip(np.rint(np.asarray(values, dtype=np.float64) * ONE), INT16_MIN, INT16_MAX).astype(np.int64)
+
+
+def shift_round(values: np.ndarray, shift: int) -> np.ndarray:
+    """Arithmetic right shift with rounding, as `(x + (1 << (shift - 1))) >> shift` in C."""
+    if shift == 0:
+        return values
+    return (values + (1 << (shift - 1))) >> shift
+
+
+def fixed_tanh(x: np.ndarray) -> np.ndarray:
+    """tanh of fixed-point values with the interpolated lookup table of the C header."""
+    magnitude = np.minimum(np.abs(x), TANH_RANGE * ONE)
+    step = FRAC_BITS - TANH_STEP_BITS
+    index = magnitude >> step
+    fraction = magnitude & ((1 << step) - 1)
+    upper = TANH_TABLE[np.minimum(index + 1, len(TANH_TABLE) - 1)]
+    y = TANH_TABLE[index] + (((upper - TANH_TABLE[index]) * fraction) >> step)
+    return np.where(x < 0, -y, y)
+
+
+class FixedPointBrain:
+    """
+    Integer arithmetic emulation of a NumpyBrain quantized for the car.
+
+    Parameters
+    ----------
+    weights : list
+        Per layer, the integer weight matrix (outputs x inputs).
+    biases : list
+        Per layer, the int32 biases, scaled like the accumulator.
+    shifts : list
+        Per layer, the power of two scale of the weights.
+    bits : int
+        8 or 16, the size of the weights.
+    sensors : SensorConfig, optional
+        SensorConfig of the float model.
+    """
+
+    def __init__(self, weights, biases, shifts, bits: int = 8, sensors=None):
+        self.weights = [np.asarray(w, dtype=np.int64) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.int64) for b in biases]
+        self.shifts = list(shifts)
+        self.bits = bits
+        self.sensors = sensors
+
+    @classmethod
+    def quantize(cls, brain, bits: int = 8) -> "FixedPointBrain":
+        """
+        Quantizes the weights of a NumpyBrain.
+
+        Every layer gets the largest power of two scale that fits its largest
+        weight into `bits` bits and its biases into the 32 bit accumulator.
+
+        Raises
+        ------
+        ValueError
+            If the brain isn't a feed-forward NumpyBrain or bits isn't 8 or 16.
+        """
+        if not hasattr(brain, "weights") or not isinstance(brain.weights, list):
+            raise ValueError(f"Only feed-forward brains can be exported, got {type(brain).__name__}")
+        if bits not in (8, 16):
+            raise ValueError(f"Weights must be 8 or 16 bit, got {bits}")
+        limit = (1 << (bits - 1)) - 1
+        weights, biases, shifts = [], [], []
+        for w, b in zip(brain.weights, brain.biases):
+            largest_weight = max(float(np.abs(w).max()), 1e-9)
+            shift = int(np.floor(np.log2(limit / largest_weight)))
+            largest_bias = float(np.abs(b).max())
+            if largest_bias > 0:
+                shift = min(shift, int(np.floor(np.log2((1 << 30) / largest_bias))) - FRAC_BITS)
+            shift = int(np.clip(shift, 0, 24))
+            weights.append(np.clip(np.rint(w * (1 << shift)), -limit, limit).astype(np.int64))
+            biases.append(np.rint(b * (1 << (shift + FRAC_BITS))).astype(np.int64))
+            shifts.append(shift)
+        return cls(weights, biases, shifts, bits, brain.sensors)
+
+    def forward_fixed(self, x: np.ndarray) -> np.ndarray:
+        """
+        Runs fixed-point inputs through the layers like brain_think() in the header.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            int16 fixed-point ray lengths, shape (batch, num_rays).
+
+        Returns
+        -------
+        np.ndarray
+            int16 fixed-point outputs, shape (batch, outputs).
+        """
+        x = np.asarray(x, dtype=np.int64)
+        for i, (w, b, shift) in enumerate(zip(self.weights, self.biases, self.shifts)):
+            accumulator = x @ w.T + b
+            x = np.clip(shift_round(accumulator, shift), INT16_MIN, INT16_MAX)
+            x = fixed_tanh(x) if i == len(self.weights) - 1 else np.maximum(x, 0)
+        return x
+
+    def forward(self, x) -> np.ndarray:
+        """Same interface as NumpyBrain.forward, with the results of the integer arithmetic."""
+        return self.forward_fixed(to_fixed(x)) / ONE
+
+    def think(self, ray_distances):
+        outputs = self.forward(np.asarray(ray_distances, dtype=np.float32).reshape(1, -1))[0]
+        if len(outputs) == 1:
+            return float(outputs[0]) # Steering only
+        return outputs.tolist()
+
+
+def calibration_knots(calibration):
+    """
+    Converts the knots of a calibration to the integers of the header.
+
+    Returns
+    -------
+    raw, normalized : np.ndarray
+        Per ray, the raw knots in protocol units (tenths) and the normalized ray
+        lengths in fixed point, padded to the same length by repeating the last knot.
+    """
+    size = max(len(points) for points in calibration.raw_points)
+    raw = np.array([np.pad(np.rint(points * DISTANCE_SCALE), (0, size - len(points)), mode="edge")
+                    for points in calibration.raw_points], dtype=np.int64)
+    normalized = np.array([np.pad(to_fixed(np.clip(points, 0, 1)), (0, size - len(points)), mode="edge")
+                           for points in calibration.normalized_points], dtype=np.int64)
+    return raw, normalized
+
+
+def fixed_calibrate(raw, calibration=None) -> np.ndarray:
+    """
+    Emulates brain_calibrate() on readings in protocol units.
+
+    Parameters
+    ----------
+    raw : array_like
+        Readings in tenths of the sensor unit, shape (batch, num_rays).
+    calibration : Calibration, optional
+        The exported calibration, without one the raw reading is used like on the host.
+
+    Returns
+    -------
+    np.ndarray
+        Fixed-point normalized ray lengths, shape (batch, num_rays).
+    """
+    raw = np.asarray(raw, dtype=np.int64)
+    if calibration is None:
+        return np.clip(raw * ONE // DISTANCE_SCALE, INT16_MIN, INT16_MAX)
+
+    raw_knots, normalized_knots = calibration_knots(calibration)
+    result = np.empty_like(raw)
+    for ray in range(raw.shape[1]):
+        r, n, values = raw_knots[ray], normalized_knots[ray], raw[:, ray]
+        # Segment of every reading, readings outside the knots take the first or last value
+        segment = np.clip(np.searchsorted(r, values, side="right") - 1, 0, len(r) - 2)
+        r0, r1, n0, n1 = r[segment], r[segment + 1], n[segment], n[segment + 1]
+        span = np.maximum(r1 - r0, 1)
+        offset = np.clip(values - r0, 0, r1 - r0)
+        product = (n1 - n0) * offset
+        result[:, ray] = n0 + np.sign(product) * (np.abs(product) // span)  # C division truncates toward zero
+    return result
+
+
+def c_array(c_type: str, name: str, values) -> str:
+    values = np.asarray(values).ravel()
+    return f"static const {c_type} {name}[{len(values)}] = {{{', '.join(str(int(v)) for v in values)}}};"
+
+
+def header(brain: FixedPointBrain, calibration=None, sensitivity: float = 0.2, source: str = "") -> str:
+    """
+    Generates the C header with the quantized weights and the inference code.
+
+    Parameters
+    ----------
+    brain : FixedPointBrain
+        The quantized brain.
+    calibration : Calibration, optional
+        Calibration of the car's sensors, exported for brain_calibrate().
+    sensitivity : float
+        Steering threshold for turning, as in Car.control.
+    source : str
+        Model the header was generated from, for the comment at the top.
+    """
+    weight_type = "int8_t" if brain.bits == 8 else "int16_t"
+    accumulator_type = "int32_t" if brain.bits == 8 else "int64_t"
+    num_rays = brain.weights[0].shape[1]
+    num_outputs = brain.weights[-1].shape[0]
+    width = max(max(w.shape) for w in brain.weights)
+
+    lines = [
+        f"// Generated by python -m utils.arduino_export from {source}, don't edit.",
+        "//",
+        "//   #include \"brain.h\"",
+        f"//   int16_t rays[BRAIN_NUM_RAYS], outputs[BRAIN_NUM_OUTPUTS];",
+        "//   for (int i = 0; i < BRAIN_NUM_RAYS; i++) rays[i] = brain_calibrate(i, distance_tenths[i]);",
+        "//   brain_think(rays, outputs);",
+        "//   char command = brain_command(outputs[0]);  // 'L', 'R' or 'F'",
+        "//",
+        f"// Values are fixed point with {FRAC_BITS} fractional bits ({ONE} is 1.0).",
+        "#ifndef BRAIN_H",
+        "#define BRAIN_H",
+        "",
+        "#include <stdint.h>",
+        "",
+        f"#define BRAIN_NUM_RAYS {num_rays}",
+        f"#define BRAIN_NUM_OUTPUTS {num_outputs}",
+        f"#define BRAIN_FRAC_BITS {FRAC_BITS}",
+        f"#define BRAIN_SENSITIVITY {int(np.ceil(sensitivity * ONE))}",
+        "",
+    ]
+    for i, (w, b, shift) in enumerate(zip(brain.weights, brain.biases, brain.shifts)):
+        lines.append(c_array(weight_type, f"BRAIN_W{i}", w))
+        lines.append(c_array("int32_t", f"BRAIN_B{i}", b))
+        lines.append(f"#define BRAIN_SHIFT{i} {shift}")
+    lines.append(c_array("int16_t", "BRAIN_TANH", TANH_TABLE))
+    if calibration is not None:
+        raw, normalized = calibration_knots(calibration)
+        lines.append(f"#define BRAIN_CALIBRATION_KNOTS {raw.shape[1]}")
+        lines.append(c_array("int32_t", "BRAIN_CALIBRATION_RAW", raw))
+        lines.append(c_array("int16_t", "BRAIN_CALIBRATION_NORMALIZED", normalized))
+
+    lines += [
+        "",
+        "static inline int16_t brain_saturate(int32_t x) {",
+        "  return x > INT16_MAX ? INT16_MAX : (x < INT16_MIN ? INT16_MIN : (int16_t)x);",
+        "}",
+        "",
+        "static inline int16_t brain_tanh(int16_t x) {",
+        f"  int32_t magnitude = x < 0 ? -(int32_t)x : x;",
+        f"  if (magnitude > {TANH_RANGE * ONE}) magnitude = {TANH_RANGE * ONE};",
+        f"  int32_t index = magnitude >> {FRAC_BITS - TANH_STEP_BITS};",
+        f"  int32_t fraction = magnitude & {(1 << (FRAC_BITS - TANH_STEP_BITS)) - 1};",
+        f"  int32_t upper = BRAIN_TANH[index < {len(TANH_TABLE) - 1} ? index + 1 : index];",
+        f"  int32_t y = BRAIN_TANH[index] + (((upper - BRAIN_TANH[index]) * fraction) >> {FRAC_BITS - TANH_STEP_BITS});",
+        "  return (int16_t)(x < 0 ? -y : y);",
+        "}",
+        "",
+        f"static inline void brain_layer(const {weight_type} *w, const int32_t *b, uint8_t shift, const int16_t *in,",
+        "                               int16_t *out, uint8_t num_in, uint8_t num_out, uint8_t last) {",
+        "  for (uint8_t o = 0; o < num_out; o++) {",
+        f"    {accumulator_type} sum = b[o];",
+        f"    for (uint8_t i = 0; i < num_in; i++) sum += ({accumulator_type})w[o * num_in + i] * in[i];",
+        f"    if (shift > 0) sum = (sum + (({accumulator_type})1 << (shift - 1))) >> shift;",
+        "    int16_t value = brain_saturate(sum > INT32_MAX ? INT32_MAX : (sum < INT32_MIN ? INT32_MIN : (int32_t)sum));",
+        "    out[o] = last ? brain_tanh(value) : (value > 0 ? value : 0);",
+        "  }",
+        "}",
+        "",
+        "// rays: normalized ray lengths, outputs: steering (and throttle) between -1.0 and 1.0",
+        "static inline void brain_think(const int16_t *rays, int16_t *outputs) {",
+        f"  int16_t buffers[2][{width}];",
+        "  const int16_t *in = rays;",
+    ]
+    for i, w in enumerate(brain.weights):
+        last = i == len(brain.weights) - 1
+        out = "outputs" if last else f"buffers[{i % 2}]"
+        lines.append(f"  brain_layer(BRAIN_W{i}, BRAIN_B{i}, BRAIN_SHIFT{i}, in, {out}, {w.shape[1]}, {w.shape[0]}, "
+                     f"{int(last)});")
+        if not last:
+            lines.append(f"  in = {out};")
+    lines += ["}", ""]
+
+    if calibration is not None:
+        lines += [
+            "// Raw reading in tenths of the sensor unit (as in the binary protocol) to the normalized ray length",
+            "static inline int16_t brain_calibrate(uint8_t ray, int32_t raw) {",
+            "  const int32_t *r = BRAIN_CALIBRATION_RAW + ray * BRAIN_CALIBRATION_KNOTS;",
+            "  const int16_t *n = BRAIN_CALIBRATION_NORMALIZED + ray * BRAIN_CALIBRATION_KNOTS;",
+            "  uint8_t s = 0;",
+            "  while (s < BRAIN_CALIBRATION_KNOTS - 2 && raw >= r[s + 1]) s++;",
+            "  int32_t span = r[s + 1] - r[s] > 0 ? r[s + 1] - r[s] : 1;",
+            "  int32_t offset = raw - r[s];",
+            "  if (offset < 0) offset = 0;",
+            "  if (offset > r[s + 1] - r[s]) offset = r[s + 1] - r[s];",
+            "  return n[s] + (int16_t)(((int32_t)(n[s + 1] - n[s]) * offset) / span);",
+            "}",
+        ]
+    else:
+        lines += [
+            "// No calibration was exported, the raw reading is used like on the host (saturates at 8.0)",
+            "static inline int16_t brain_calibrate(uint8_t ray, int32_t raw) {",
+            f"  return brain_saturate(raw * {ONE} / {DISTANCE_SCALE});",
+            "}",
+        ]
+    lines += [
+        "",
+        "static inline char brain_command(int16_t steering) {",
+        "  return steering >= BRAIN_SENSITIVITY ? 'L' : (steering <= -BRAIN_SENSITIVITY ? 'R' : 'F');",
+        "}",
+        "",
+        "#endif",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def decisions(steering: np.ndarray, sensitivity: float) -> np.ndarray:
+    """Turns steering values into the discrete commands L, R and F."""
+    return np.where(steering >= sensitivity, "L", np.where(steering <= -sensitivity, "R", "F"))
+
+
+def simulated_readings(brain, track_pattern: str, ticks: int, starts: int = 3) -> np.ndarray:
+    """Drives the float brain on the tracks and returns the readings it saw, shape (readings, num_rays)."""
+    from objects.car import Car
+    from objects.track import Track
+
+    readings = []
+    with contextlib.redirect_stdout(io.StringIO()):  # Track and Car print progress
+        for path in sorted(glob.glob(track_pattern)):
+            track = Track(path, width=1000, height=1000)  # The scale train.py trains on
+            for _ in range(starts):
+                angle, (r, c) = track.randomize_start_pos()
+                x, y = track.pixel_to_world(c, r)
+                car = Car(x, y, track, start_angle=angle, sensors=brain.sensors)
+                for _ in range(ticks):
+                    rays = car.ray_cast()
+                    readings.append(rays)
+                    outputs = brain.forward(np.asarray(rays, dtype=np.float32).reshape(1, -1))[0]
+                    if len(outputs) > 1:
+                        car.control_continuous(outputs[0], outputs[1])
+                    else:
+                        car.control(outputs[0], 0.2)
+                    if not car.is_alive:
+                        break
+    return np.array(readings, dtype=np.float32)
+
+
+def compare(name: str, float_steering: np.ndarray, fixed_steering: np.ndarray, sensitivity: float,
+            tolerance: float) -> tuple:
+    """
+    Prints and returns the largest steering difference and the decision agreement.
+
+    Readings where the float steering is within the tolerance of a turning
+    threshold are left out of the agreement, a discrete controller keeps the
+    steering close to the threshold and either decision is as good there.
+    """
+    difference = float(np.max(np.abs(float_steering - fixed_steering))) if len(float_steering) else 0.0
+    clear = np.abs(np.abs(float_steering) - sensitivity) > tolerance
+    agreement = float(np.mean(decisions(float_steering[clear], sensitivity)
+                              == decisions(fixed_steering[clear], sensitivity))) if clear.any() else 1.0
+    print(f"{name}: {len(float_steering)} readings, max steering difference {difference:.4f}, "
+          f"decision agreement {agreement:.2%} ({np.sum(~clear)} at the threshold)")
+    return difference, agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a brain as a fixed-point C header for the car")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="write the C header")
+    export_parser.add_argument("model", help="pickled model, e.g. models/model_last.pkl")
+    export_parser.add_argument("--output", default="Bluetooth/brain.h")
+
+    verify_parser = subparsers.add_parser("verify", help="compare the fixed-point brain to the float model")
+    verify_parser.add_argument("model")
+    verify_parser.add_argument("--sessions", nargs="*", default=[], help="recorded sessions, see utils/session_log.py")
+    verify_parser.add_argument("--tracks", default="assets/tracks/*.json", help="tracks to simulate readings on")
+    verify_parser.add_argument("--ticks", type=int, default=500, help="simulated ticks per start pose")
+    verify_parser.add_argument("--tolerance", type=float, default=0.02, help="largest allowed steering difference")
+    verify_parser.add_argument("--min-agreement", type=float, default=0.99,
+                               help="smallest allowed fraction of equal L/R/F decisions away from the threshold")
+
+    for subparser in (export_parser, verify_parser):
+        subparser.add_argument("--bits", type=int, choices=[8, 16], default=8, help="size of the weights")
+        subparser.add_argument("--sensitivity", type=float, default=0.2,
+                               help="steering threshold for turning, as in Car.control")
+    args = parser.parse_args()
+
+    from objects.numpy_brain import load_model
+    float_brain = load_model(args.model)
+    try:
+        brain = FixedPointBrain.quantize(float_brain, args.bits)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    calibration = load_calibration(args.model)
+
+    if args.command == "export":
+        with open(args.output, "w") as f:
+            f.write(header(brain, calibration, args.sensitivity, args.model))
+        size = sum(w.size * args.bits // 8 + b.size * 4 for w, b in zip(brain.weights, brain.biases))
+        print(f"Wrote {args.output}: {len(brain.weights)} layers, {size} bytes of weights, shifts {brain.shifts}"
+              f"{'' if calibration else ', no calibration found'}")
+        return
+
+    from utils.session_log import read_session
+    results = []
+    for session_path in args.sessions:
+        raw = read_session(session_path)["rays"]
+        # The host calibrates with the lookup table, the car with brain_calibrate()
+        inputs = raw if calibration is None else calibration.apply(raw)
+        float_steering = float_brain.forward(np.asarray(inputs, dtype=np.float32))[:, 0]
+        fixed_inputs = fixed_calibrate(np.rint(raw * DISTANCE_SCALE), calibration)
+        fixed_steering = brain.forward_fixed(fixed_inputs)[:, 0] / ONE
+        results.append(compare(session_path, float_steering, fixed_steering, args.sensitivity, args.tolerance))
+
+    readings = simulated_readings(float_brain, args.tracks, args.ticks)
+    if len(readings):
+        results.append(compare("simulated", float_brain.forward(readings)[:, 0], brain.forward(readings)[:, 0],
+                               args.sensitivity, args.tolerance))
+
+    failed = [r for r in results if r[0] > args.tolerance or r[1] < args.min_agreement]
+    print("FAILED" if failed else "OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
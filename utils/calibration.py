@@ -0,0 +1,252 @@
+"""
+Calibration between the raw distances of the physical car's sensors and the
+normalized ray lengths (0..1 of SensorConfig.max_range) the brain was trained on.
+
+The mapping is fitted per ray from a log of readings taken at known distances,
+stored next to the model (models/model_last.pkl -> models/model_last.calibration.json)
+and expanded into a lookup table when it is loaded, so calibrating a reading in
+the control loop is a single array index.
+
+Log format (CSV, one row per ray and reading):
+
+    ray,raw,distance
+
+where `raw` is the value the car sent and `distance` the measured distance
+to the obstacle in the same real-world unit for every row (e.g. cm).
+
+Record readings with the car placed at known distances from a wall, then fit:
+
+    python -m utils.calibration record calibration.csv --distances 20,28,28
+    python -m utils.calibration fit calibration.csv --pixels-per-unit 2.5
+"""
+import argparse
+import csv
+import json
+import os
+import numpy as np
+
+from utils.protocol import DISTANCE_SCALE, SensorFrameDecoder
+from utils.virtual_serial import open_serial
+
+RAW_STEP = 1 / DISTANCE_SCALE  # Lookup table resolution, the resolution of the binary protocol
+
+
+class Calibration:
+    """
+    Piecewise linear per-ray mapping from raw readings to normalized ray lengths.
+
+    Parameters
+    ----------
+    raw_points : list
+        Per ray, the increasing raw readings of the knots.
+    normalized_points : list
+        Per ray, the normalized ray lengths at the knots.
+    raw_step : float, optional
+        Resolution of the lookup table in raw units.
+    """
+
+    def __init__(self, raw_points, normalized_points, raw_step: float = RAW_STEP):
+        self.raw_points = [np.asarray(points, dtype=float) for points in raw_points]
+        self.normalized_points = [np.asarray(points, dtype=float) for points in normalized_points]
+        self.raw_step = raw_step
+
+        # Readings beyond the last knot map to the value of the last knot
+        raw_max = max(points[-1] for points in self.raw_points)
+        grid = np.arange(int(np.ceil(raw_max / raw_step)) + 1) * raw_step
+        self.lut = np.clip(np.stack([np.interp(grid, raw, normalized) for raw, normalized
+                                     in zip(self.raw_points, self.normalized_points)]), 0, 1)
+        self.ray_index = np.arange(self.num_rays)
+
+    @property
+    def num_rays(self) -> int:
+        return len(self.raw_points)
+
+    def apply(self, readings) -> np.ndarray:
+        """
+        Converts raw readings to normalized ray lengths with the lookup table.
+
+        Parameters
+        ----------
+        readings : array_like
+            One raw reading per ray.
+
+        Returns
+        -------
+        np.ndarray
+            Normalized ray lengths between 0 and 1.
+        """
+        return self.lut[self.ray_index, self.lut_index(readings)]
+
+    def lut_index(self, readings) -> np.ndarray:
+        """Returns the lookup table columns of raw readings."""
+        index = np.rint(np.asarray(readings, dtype=float) / self.raw_step).astype(np.intp)
+        return np.clip(index, 0, self.lut.shape[1] - 1, out=index)
+
+    @classmethod
+    def fit(cls, rays, raw, normalized, raw_step: float = RAW_STEP) -> "Calibration":
+        """
+        Fits the mapping from logged readings.
+
+        The readings of every ray are grouped by the reference distance, each group
+        becomes a knot at its median raw reading, and the knots are made monotonic
+        since a farther obstacle can't give a shorter ray.
+
+        Parameters
+        ----------
+        rays : array_like
+            Ray index of every sample.
+        raw : array_like
+            Raw reading of every sample.
+        normalized : array_like
+            Reference normalized ray length of every sample.
+
+        Returns
+        -------
+        Calibration
+
+        Raises
+        ------
+        ValueError
+            If a ray has readings at fewer than two distances.
+        """
+        rays = np.asarray(rays, dtype=int)
+        raw = np.asarray(raw, dtype=float)
+        normalized = np.asarray(normalized, dtype=float)
+
+        raw_points, normalized_points = [], []
+        for ray in range(rays.max() + 1):
+            ray_raw, ray_normalized = raw[rays == ray], normalized[rays == ray]
+            distances = np.unique(ray_normalized)
+            if len(distances) < 2:
+                raise ValueError(f"Ray {ray} needs readings at two or more distances, got {len(distances)}")
+            knots = np.array([np.median(ray_raw[ray_normalized == d]) for d in distances])
+            order = np.argsort(knots, kind="stable")
+            raw_points.append(knots[order])
+            normalized_points.append(np.maximum.accumulate(distances[order]))
+        return cls(raw_points, normalized_points, raw_step)
+
+    def save(self, filepath: str) -> None:
+        """Saves the knots as JSON, the lookup table is rebuilt on load."""
+        data = {
+            "raw_step": self.raw_step,
+            "rays": [{"raw": raw.tolist(), "normalized": normalized.tolist()}
+                     for raw, normalized in zip(self.raw_points, self.normalized_points)]
+        }
+        with open(filepath, "w") as f:
+            json.dump(data, f, indent=2)
+
+    @classmethod
+    def load(cls, filepath: str) -> "Calibration":
+        """Loads a calibration saved with save()."""
+        with open(filepath, "r") as f:
+            data = json.load(f)
+        return cls([ray["raw"] for ray in data["rays"]], [ray["normalized"] for ray in data["rays"]],
+                   data["raw_step"])
+
+
+def calibration_path(model_path: str) -> str:
+    """Returns the path of the calibration stored with a model."""
+    return os.path.splitext(model_path)[0] + ".calibration.json"
+
+
+def load_calibration(model_path: str):
+    """Loads the calibration stored with a model, or returns None if the model has none."""
+    path = calibration_path(model_path)
+    if not os.path.exists(path):
+        return None
+    return Calibration.load(path)
+
+
+def read_log(filepath: str) -> tuple:
+    """
+    Reads a calibration log.
+
+    Returns
+    -------
+    rays, raw, distance : np.ndarray
+        The columns of the log.
+    """
+    with open(filepath, "r", newline="") as f:
+        rows = [(int(row["ray"]), float(row["raw"]), float(row["distance"])) for row in csv.DictReader(f)]
+    if not rows:
+        raise ValueError(f"{filepath} has no readings")
+    rays, raw, distance = zip(*rows)
+    return np.array(rays), np.array(raw), np.array(distance)
+
+
+def record(filepath: str, port: str, distances: list, samples: int, binary: bool = False) -> None:
+    """Appends `samples` readings of the car to the log, with the measured distance of every ray."""
+    connection = open_serial(port, 9600, timeout=1)
+    decoder = SensorFrameDecoder()
+    readings = []
+    try:
+        while len(readings) < samples:
+            if binary:
+                readings.extend(reading for _, reading in decoder.feed(connection.read(max(connection.in_waiting, 1))))
+            else:
+                # Partial lines right after the port opens and debug prints are skipped
+                line = connection.readline().decode("utf-8", errors="ignore").strip()
+                try:
+                    values = [float(x) for x in line.split(",") if x]
+                except ValueError:
+                    continue
+                if len(values) == len(distances):
+                    readings.append(values)
+    finally:
+        connection.close()
+
+    new_file = not os.path.exists(filepath)
+    with open(filepath, "a", newline="") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["ray", "raw", "distance"])
+        for reading in readings[:samples]:
+            for ray, (raw, distance) in enumerate(zip(reading, distances)):
+                writer.writerow([ray, raw, distance])
+    print(f"Recorded {min(len(readings), samples)} readings to {filepath}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate the car's distance sensors against the simulated rays")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="log readings of the car at known distances")
+    record_parser.add_argument("log")
+    record_parser.add_argument("--distances", required=True,
+                               help="measured distance of every ray to the obstacle, e.g. 20,28,28")
+    record_parser.add_argument("--samples", type=int, default=50)
+    record_parser.add_argument("--port", default=os.environ.get("CAR_PORT", "COM7"))
+    record_parser.add_argument("--binary", action="store_true", help="the car sends binary sensor frames")
+
+    fit_parser = commands.add_parser("fit", help="fit a calibration from a log and store it with the model")
+    fit_parser.add_argument("log")
+    fit_parser.add_argument("--model", default="models/model_last.pkl")
+    fit_parser.add_argument("--pixels-per-unit", type=float, required=True,
+                            help="simulated pixels per real-world distance unit of the track")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.log, args.port, [float(d) for d in args.distances.split(",")], args.samples, args.binary)
+    else:
+        from objects.numpy_brain import load_model
+        from objects.sensors import DEFAULT_SENSORS
+
+        sensors = load_model(args.model).sensors or DEFAULT_SENSORS
+        rays, raw, distance = read_log(args.log)
+        normalized = distance * args.pixels_per_unit / sensors.max_range
+        try:
+            calibration = Calibration.fit(rays, raw, normalized)
+        except ValueError as e:
+            print(f"Could not fit a calibration: {e}")
+            raise SystemExit(1)
+        if calibration.num_rays != sensors.num_rays:
+            print(f"Warning: the log has {calibration.num_rays} rays, the model expects {sensors.num_rays}")
+
+        for ray in range(calibration.num_rays):
+            mask = rays == ray
+            residual = calibration.lut[ray, calibration.lut_index(raw[mask])] - np.clip(normalized[mask], 0, 1)
+            print(f"ray {ray}: {mask.sum()} readings, {len(calibration.raw_points[ray])} knots, "
+                  f"rms error {np.sqrt(np.mean(residual ** 2)) * sensors.max_range:.1f}px")
+        path = calibration_path(args.model)
+        calibration.save(path)
+        print(f"Saved {path}")
@@ -0,0 +1,216 @@
+import os
+import time
+import numpy as np
+
+
+class LatencyTracker:
+    """
+    Rolling per-stage latency statistics for the physical car control loops.
+
+    Every iteration of a control loop is one sample. A sample is opened with
+    `start`, each stage is closed with `mark` (which stores the time since the
+    previous mark) and the sample is committed with `finish`. The last `window`
+    samples are kept in a preallocated array so the percentiles can be computed
+    every frame without allocating new lists.
+
+    Methods
+    -------
+    start(self) -> None
+        Opens a new sample.
+
+    mark(self, stage: str) -> None
+        Closes the given stage of the current sample.
+
+    finish(self) -> None
+        Commits the current sample to the rolling window and the log file.
+
+    percentiles(self, stage: str) -> tuple
+        Returns the (p50, p95, p99) latency of a stage in milliseconds.
+
+    draw(self, screen, font, position) -> None
+        Draws the latency table and a histogram of the total latency.
+    """
+
+    PERCENTILES = (50, 95, 99)
+    TEXT_COLOR = (200, 200, 200)
+    BAR_COLOR = (0, 200, 0)
+    HISTOGRAM_BINS = 20
+
+    def __init__(self, stages, window: int = 500, log_path: str = None, flush_every: int = 50):
+        """
+        Initializes the LatencyTracker instance.
+
+        Parameters
+        ----------
+        stages : list[str]
+            Names of the stages of the control loop, in the order they happen.
+        window : int, optional
+            Number of samples used for the rolling statistics.
+        log_path : str, optional
+            CSV file every sample is appended to. No log is written if not provided.
+        flush_every : int, optional
+            Number of samples buffered before the log file is flushed.
+        """
+        self.stages = list(stages)
+        self.columns = self.stages + ["total"]
+        self.column_index = {column: i for i, column in enumerate(self.columns)}
+        self.window = window
+
+        # One row per column, one entry per sample, NaN marks a stage that was not reached
+        self.samples = np.full((len(self.columns), window), np.nan)
+        self.count = 0
+
+        # Stage durations of the sample that is currently being measured
+        self.current = np.full(len(self.columns), np.nan)
+        self.sample_start = None
+        self.last_mark = None
+
+        self.flush_every = flush_every
+        self.log_file = None
+        if log_path:
+            os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+            self.log_file = open(log_path, "w")
+            self.log_file.write("timestamp," + ",".join(f"{c}_ms" for c in self.columns) + "\n")
+
+    def start(self) -> None:
+        """
+        Opens a new sample, discarding any sample that was not finished.
+
+        Returns
+        -------
+        None
+        """
+        self.current.fill(np.nan)
+        self.sample_start = time.perf_counter()
+        self.last_mark = self.sample_start
+
+    def mark(self, stage: str) -> None:
+        """
+        Closes a stage of the current sample.
+
+        Parameters
+        ----------
+        stage : str
+            Name of the stage, must be one of the stages given at construction.
+
+        Returns
+        -------
+        None
+        """
+        if self.sample_start is None:
+            return
+        now = time.perf_counter()
+        self.current[self.column_index[stage]] = (now - self.last_mark) * 1000
+        self.last_mark = now
+
+    def finish(self) -> None:
+        """
+        Commits the current sample to the rolling window and the log file.
+
+        Returns
+        -------
+        None
+        """
+        if self.sample_start is None:
+            return
+        self.current[-1] = (self.last_mark - self.sample_start) * 1000
+        self.samples[:, self.count % self.window] = self.current
+        self.count += 1
+        self.sample_start = None
+
+        if self.log_file:
+            values = ",".join("" if np.isnan(v) else f"{v:.3f}" for v in self.current)
+            self.log_file.write(f"{time.time():.6f},{values}\n")
+            if self.count % self.flush_every == 0:
+                self.log_file.flush()
+
+    def percentiles(self, stage: str) -> tuple:
+        """
+        Returns the rolling latency percentiles of a stage.
+
+        Parameters
+        ----------
+        stage : str
+            Name of the stage, or "total" for the whole sample.
+
+        Returns
+        -------
+        tuple
+            (p50, p95, p99) in milliseconds, NaN if the stage has no samples yet.
+        """
+        values = self.samples[self.column_index[stage]]
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return (np.nan,) * len(self.PERCENTILES)
+        return tuple(np.percentile(values, self.PERCENTILES))
+
+    def summary_lines(self) -> list:
+        """
+        Returns the latency table as lines of text.
+
+        Returns
+        -------
+        list[str]
+            One header line followed by one line per stage.
+        """
+        lines = [f"{'stage':<8} {'p50':>7} {'p95':>7} {'p99':>7}  (ms, n={min(self.count, self.window)})"]
+        for column in self.columns:
+            p50, p95, p99 = self.percentiles(column)
+            lines.append(f"{column:<8} {p50:7.2f} {p95:7.2f} {p99:7.2f}")
+        return lines
+
+    def draw(self, screen, font, position=(10, 10), color=None) -> None:
+        """
+        Draws the latency table and a histogram of the total latency.
+
+        Parameters
+        ----------
+        screen : pygame.Surface
+            Surface to draw on.
+        font : pygame.font.Font
+            Font used for the table, a monospace font keeps the columns aligned.
+        position : tuple, optional
+            Top left corner of the table.
+        color : tuple, optional
+            Text color, defaults to TEXT_COLOR.
+
+        Returns
+        -------
+        None
+        """
+        import pygame
+
+        color = color or self.TEXT_COLOR
+        x, y = position
+        line_height = font.get_linesize()
+        for line in self.summary_lines():
+            screen.blit(font.render(line, True, color), (x, y))
+            y += line_height
+
+        # Histogram of the total latency, up to the p99 so outliers don't squash the bars
+        totals = self.samples[-1]
+        totals = totals[~np.isnan(totals)]
+        if len(totals) == 0:
+            return
+        upper = max(np.percentile(totals, 99), 1e-3)
+        counts, _ = np.histogram(np.clip(totals, 0, upper), bins=self.HISTOGRAM_BINS, range=(0, upper))
+        bar_width = 8
+        max_height = 60
+        y += 5
+        for i, count in enumerate(counts):
+            height = int(max_height * count / counts.max())
+            pygame.draw.rect(screen, self.BAR_COLOR, (x + i * bar_width, y + max_height - height, bar_width - 1, height))
+        label = font.render(f"total 0 - {upper:.1f} ms", True, color)
+        screen.blit(label, (x, y + max_height + 2))
+
+    def close(self) -> None:
+        """
+        Flushes and closes the log file.
+
+        Returns
+        -------
+        None
+        """
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
@@ -0,0 +1,222 @@
+"""
+Binary protocol between the host and the car.
+
+Sensor frames (car -> host), 10 bytes, little endian:
+
+    0xAA 0x55 | seq (uint8) | d1 d2 d3 (uint16, distance * DISTANCE_SCALE) | checksum (uint8)
+
+The checksum is the sum of the sequence number and the six distance bytes
+modulo 256. The ASCII stream ("123.45,67.89,200.00\\r\\n") needs ~21 bytes per
+reading, so the same 9600 baud link carries roughly twice as many readings.
+
+Commands (host -> car) are a single byte, see the COMMAND_* constants. They
+are relayed to the motor controller by Bluetooth.ino.
+
+The protocol is opt-in (USE_BINARY_PROTOCOL in the host scripts and
+Bluetooth.ino), the firmware in the repo still sends the ASCII stream. Check
+the framing over a loopback port with:
+
+    python -m utils.protocol
+"""
+import struct
+
+SYNC = b"\xaa\x55"
+NUM_RAYS = 3
+DISTANCE_SCALE = 10  # Distances are sent in tenths of the sensor unit
+MAX_DISTANCE = 0xFFFF / DISTANCE_SCALE
+
+PAYLOAD_FORMAT = "<B" + "H" * NUM_RAYS  # seq + distances
+PAYLOAD_SIZE = struct.calcsize(PAYLOAD_FORMAT)
+FRAME_SIZE = len(SYNC) + PAYLOAD_SIZE + 1
+
+COMMAND_LEFT = b"L"
+COMMAND_RIGHT = b"R"
+COMMAND_FORWARD = b"F"
+COMMAND_STOP = b"S"
+
+
+def checksum(payload: bytes) -> int:
+    """
+    Computes the checksum of a frame payload.
+
+    Parameters
+    ----------
+    payload : bytes
+        Sequence number and distance bytes of the frame.
+
+    Returns
+    -------
+    int
+        Sum of the payload bytes modulo 256.
+    """
+    return sum(payload) & 0xFF
+
+
+def encode_sensor_frame(seq: int, distances) -> bytes:
+    """
+    Packs one sensor reading into a frame.
+
+    Parameters
+    ----------
+    seq : int
+        Sequence number, wraps around at 256.
+    distances : list[float]
+        The NUM_RAYS distances measured by the car.
+
+    Returns
+    -------
+    bytes
+        The encoded frame of FRAME_SIZE bytes.
+    """
+    values = [int(round(min(max(d, 0), MAX_DISTANCE) * DISTANCE_SCALE)) for d in distances]
+    payload = struct.pack(PAYLOAD_FORMAT, seq & 0xFF, *values)
+    return SYNC + payload + bytes([checksum(payload)])
+
+
+def encode_command(steering: float, sensitivity: float = 0.2) -> bytes:
+    """
+    Converts the steering output of a brain into a command byte.
+
+    Parameters
+    ----------
+    steering : float
+        Steering value between -1 and 1.
+    sensitivity : float, optional
+        Threshold above which the car turns.
+
+    Returns
+    -------
+    bytes
+        One of COMMAND_LEFT, COMMAND_RIGHT or COMMAND_FORWARD.
+    """
+    if steering >= sensitivity:
+        return COMMAND_LEFT
+    elif steering <= -sensitivity:
+        return COMMAND_RIGHT
+    return COMMAND_FORWARD
+
+
+class SensorFrameDecoder:
+    """
+    Incremental decoder for the binary sensor stream.
+
+    Bytes can be fed in chunks of any size, e.g. everything `in_waiting` on the
+    serial port. Incomplete frames are kept until the rest arrives and corrupt
+    frames are skipped by searching for the next sync marker.
+
+    Methods
+    -------
+    feed(self, data: bytes) -> list
+        Adds received bytes and returns the frames completed by them.
+    """
+
+    def __init__(self):
+        """
+        Initializes the SensorFrameDecoder instance.
+        """
+        self.buffer = bytearray()
+        self.last_seq = None
+
+        # Link quality counters
+        self.frames = 0
+        self.checksum_errors = 0
+        self.lost_frames = 0
+
+    def feed(self, data: bytes) -> list:
+        """
+        Adds received bytes and returns the frames completed by them.
+
+        Parameters
+        ----------
+        data : bytes
+            Bytes read from the serial port.
+
+        Returns
+        -------
+        list[tuple]
+            (seq, distances) for every complete and valid frame, oldest first.
+        """
+        self.buffer += data
+        frames = []
+        start = 0
+        while True:
+            start = self.buffer.find(SYNC, start)
+            if start < 0:
+                # Keep a trailing half sync marker
+                start = len(self.buffer) - 1 if self.buffer.endswith(SYNC[:1]) else len(self.buffer)
+                break
+            if len(self.buffer) - start < FRAME_SIZE:
+                break
+
+            payload = bytes(self.buffer[start + len(SYNC):start + FRAME_SIZE - 1])
+            if checksum(payload) != self.buffer[start + FRAME_SIZE - 1]:
+                # Not a real frame or corrupted, resync on the next marker
+                self.checksum_errors += 1
+                start += 1
+                continue
+
+            seq, *values = struct.unpack(PAYLOAD_FORMAT, payload)
+            if self.last_seq is not None:
+                self.lost_frames += (seq - self.last_seq - 1) & 0xFF
+            self.last_seq = seq
+            self.frames += 1
+            frames.append((seq, [v / DISTANCE_SCALE for v in values]))
+            start += FRAME_SIZE
+
+        del self.buffer[:start]
+        return frames
+
+
+def loopback_check(port: str = "loop://") -> bool:
+    """
+    Sends sensor frames through a serial port that echoes its writes and decodes them.
+
+    The stream contains a frame with a corrupted checksum and line noise between
+    frames, the decoder has to drop the corrupted frame, resync on the next sync
+    marker and count the lost sequence number.
+
+    Parameters
+    ----------
+    port : str, optional
+        pyserial URL of a loopback port, or a port with a loopback plug.
+
+    Returns
+    -------
+    bool
+        True if exactly the valid frames were decoded.
+    """
+    import serial # Only the check needs pyserial
+
+    readings = [[12.3, 45.6, 200.0], [0.0, 6553.5, 1.0], [99.9, 99.9, 99.9], [7.5, 8.5, 9.5]]
+    frames = [encode_sensor_frame(seq, distances) for seq, distances in enumerate(readings)]
+    corrupted = bytearray(frames[1])
+    corrupted[-1] ^= 0xFF
+    # Noise containing a half sync marker before the corrupted frame, and a stray marker after it
+    stream = frames[0] + b"\x00\xaa" + bytes(corrupted) + SYNC[:1] + frames[2] + frames[3]
+
+    link = serial.serial_for_url(port, timeout=1)
+    decoder = SensorFrameDecoder()
+    decoded = []
+    try:
+        link.write(stream)
+        # Read in small uneven chunks, frames arrive split across reads
+        while len(decoded) < 3:
+            chunk = link.read(3)
+            if not chunk:
+                break
+            decoded += decoder.feed(chunk)
+    finally:
+        link.close()
+
+    expected = [(seq, readings[seq]) for seq in (0, 2, 3)]
+    passed = decoded == expected and decoder.checksum_errors >= 1 and decoder.lost_frames == 1
+    print(f"Decoded {len(decoded)} frames, {decoder.checksum_errors} checksum errors, {decoder.lost_frames} lost")
+    print("Loopback check passed" if passed else f"Loopback check failed, got {decoded}")
+    return passed
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Check the framing over a loopback port: python -m utils.protocol [port]
+    sys.exit(0 if loopback_check(*sys.argv[1:2]) else 1)
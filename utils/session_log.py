@@ -0,0 +1,168 @@
+"""
+Append-only binary recordings of physical car sessions.
+
+A session file starts with a header and is followed by fixed size records:
+
+    header:  b"CARSESS" | version (uint8) | num_rays (uint8)
+    record:  time (float64, seconds since the epoch)
+             rays (num_rays x float32, raw readings as received from the car)
+             outputs (2 x float32, steering and throttle of the brain, NaN if unused)
+             command (uint8, the command byte sent to the car, 0 if none)
+
+Records are written into preallocated buffers and a background thread appends
+full buffers to the file, so recording costs the control loop a few array
+assignments. A session cut short by a crash loses at most the unflushed buffer,
+and a partially written last record is ignored by read_session.
+"""
+import os
+import queue
+import struct
+import threading
+import time
+import numpy as np
+
+MAGIC = b"CARSESS"
+VERSION = 1
+HEADER_FORMAT = "<7sBB"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+def record_dtype(num_rays: int) -> np.dtype:
+    """Returns the NumPy dtype of a record with num_rays readings."""
+    return np.dtype([("time", "<f8"), ("rays", "<f4", (num_rays,)), ("outputs", "<f4", (2,)), ("command", "u1")])
+
+
+class SessionRecorder:
+    """
+    Records timestamped readings, brain outputs and commands to a session file.
+
+    Parameters
+    ----------
+    filepath : str
+        File to append the records to, created with a header if it doesn't exist.
+    num_rays : int
+        Number of readings per record.
+    capacity : int, optional
+        Records per buffer, a buffer is written to the file when it is full.
+
+    Methods
+    -------
+    record(self, rays, outputs=None, command=b"") -> None
+        Adds a record with the current time.
+
+    flush(self) -> None
+        Hands the records collected so far to the writer thread.
+
+    close(self) -> None
+        Writes the remaining records and stops the writer thread.
+    """
+
+    def __init__(self, filepath: str, num_rays: int, capacity: int = 1024):
+        self.filepath = filepath
+        self.num_rays = num_rays
+        self.dtype = record_dtype(num_rays)
+
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        with open(filepath, "ab") as f:
+            if f.tell() == 0:
+                f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, num_rays))
+            elif read_header(filepath)[1] != num_rays:
+                raise ValueError(f"{filepath} was recorded with a different number of rays")
+
+        # Two buffers: the control loop fills one while the writer thread saves the other
+        self.free_buffers = queue.Queue()
+        self.free_buffers.put(np.zeros(capacity, dtype=self.dtype))
+        self.buffer = np.zeros(capacity, dtype=self.dtype)
+        self.count = 0
+        self.full_buffers = queue.Queue()
+        self.records_written = 0
+
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def record(self, rays, outputs=None, command=b"") -> None:
+        """
+        Adds a record with the current time.
+
+        Parameters
+        ----------
+        rays : array_like
+            Raw readings of the car.
+        outputs : float or array_like, optional
+            Steering, or [steering, throttle], of the brain.
+        command : bytes or str, optional
+            The command sent to the car, only the first byte is stored.
+        """
+        entry = self.buffer[self.count]
+        entry["time"] = time.time()
+        entry["rays"] = rays
+        entry["outputs"] = np.nan
+        if outputs is not None:
+            outputs = np.atleast_1d(outputs)
+            entry["outputs"][:len(outputs)] = outputs
+        if isinstance(command, str):
+            command = command.encode()
+        entry["command"] = command[0] if command else 0
+
+        self.count += 1
+        if self.count == len(self.buffer):
+            self.flush()
+
+    def flush(self) -> None:
+        """Hands the records collected so far to the writer thread."""
+        if self.count == 0:
+            return
+        self.full_buffers.put((self.buffer, self.count))
+        self.buffer = self.free_buffers.get()  # Waits if the writer is still busy with the other buffer
+        self.count = 0
+
+    def close(self) -> None:
+        """Writes the remaining records and stops the writer thread."""
+        self.flush()
+        self.full_buffers.put(None)
+        self.writer.join()
+
+    def _write_loop(self) -> None:
+        with open(self.filepath, "ab") as f:
+            while True:
+                item = self.full_buffers.get()
+                if item is None:
+                    return
+                buffer, count = item
+                f.write(buffer[:count].tobytes())
+                f.flush()
+                self.records_written += count
+                self.free_buffers.put(buffer)
+
+
+def read_header(filepath: str) -> tuple:
+    """
+    Reads the header of a session file.
+
+    Returns
+    -------
+    version, num_rays : int
+    """
+    with open(filepath, "rb") as f:
+        magic, version, num_rays = struct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))
+    if magic != MAGIC:
+        raise ValueError(f"{filepath} is not a session recording")
+    return version, num_rays
+
+
+def read_session(filepath: str) -> np.ndarray:
+    """
+    Reads all records of a session file.
+
+    Returns
+    -------
+    np.ndarray
+        Structured array with the fields time, rays, outputs and command.
+    """
+    _, num_rays = read_header(filepath)
+    dtype = record_dtype(num_rays)
+    with open(filepath, "rb") as f:
+        f.seek(HEADER_SIZE)
+        data = f.read()
+    # Ignore a last record that was only partially written
+    return np.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize)
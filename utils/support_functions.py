@@ -1,10 +1,9 @@
+from __future__ import annotations
 import json
 import numpy as np
-import serial
-import serial.serialutil
-import serial.tools.list_ports
 import time
 import threading
+from utils.virtual_serial import open_serial
 
 
 class TSPDecoder:
@@ -22,15 +21,27 @@ class TSPDecoder:
     updateFrame(self) -> None:
         Updates the frame data continuously from the TSP device.
 
+    publishFrame(self, timestamp: float) -> None:
+        Makes the frame decoded into the next ring buffer slot available.
+
     readFrame(self) -> np.ndarray:
         Returns the current frame data.
 
+    readFrames(self) -> tuple:
+        Returns all frames received since the last read, with their timestamps.
+
+    frameRate(self) -> float:
+        Returns the measured frame rate of the TSP stream.
+
+    getStats(self) -> dict:
+        Returns the frame, drop and resync counters.
+
     getSerialPort(self) -> serial.tools.list_ports_common.ListPortInfo:
         Returns the port/device of the first connected Arduino.
 
     """
 
-    def __init__(self, port: str = None, baudrate: int = 921600, rows: int = 27, columns: int = 19):
+    def __init__(self, port: str = None, baudrate: int = 921600, rows: int = 27, columns: int = 19, history: int = 64):
         """
        Initializes the TSPDecoder instance.
 
@@ -38,25 +49,40 @@ class TSPDecoder:
        ----------
        port : str, optional
            The serial port to use. If not provided, it finds the first connected Arduino.
+           "sim://tsp" connects to a simulated pressure pad, see utils/virtual_serial.py.
        baudrate : int, optional
            Baud rate for serial communication.
        rows : int, optional
            Number of rows in the frame.
        columns : int, optional
            Number of columns in the frame.
+       history : int, optional
+           Number of frames kept in the ring buffer for readFrames.
        """
 
         # Initialize TSPDecoder instance with specified rows and columns
         self.rows = rows
         self.columns = columns
-        self.frame = np.zeros([rows, columns])
+
+        # Preallocated ring buffer of timestamped frames, the update thread decodes straight into it.
+        # write_count is the number of frames published so far, slot write_count % history is being written.
+        self.history = history
+        self.ring = np.zeros([history, rows, columns])
+        self.ring_times = np.zeros(history)
+        self.write_count = 0
+        self.read_count = 0
+        self.frame = self.ring[-1]
+
+        # Stream statistics
+        self.frames_dropped = 0
+        self.resyncs = 0
 
         # If no port is provided, get the first connected Arduino's port
         if not port:
             port = self.getSerialPort()
 
         # Initialize serial port communication with specified parameters
-        self.port = serial.Serial(port, baudrate, timeout=1)
+        self.port = open_serial(port, baudrate, timeout=1)
 
         # Initialize the bool to check serial connection is present
         self.availabool = True
@@ -95,6 +121,7 @@ class TSPDecoder:
                 if (buf.__len__() != 6) or (l != "FRAME\n"):
                     if antispam:
                         print("Resyncing....")
+                        self.resyncs += 1
                         antispam = False
                 if l == "FRAME\n":
                     break
@@ -105,73 +132,96 @@ class TSPDecoder:
         """
         Updates the frame data continuously from the TSP device.
 
+        The received bytes are reinterpreted in place with np.frombuffer and
+        decoded into the next slot of the ring buffer, which is then published
+        by advancing the write counter. No arrays are allocated per frame.
+
         Returns
         -------
         None
         """
 
-        # Resynchronize TSP communication
+        # Resynchronize TSP communication, this consumes the header of the first frame
         self.resync()
+        synced = True
+
+        # Frame length, one byte per cell plus the trailing newline
+        cells = self.rows * self.columns
+        length = cells + 1
+
+        import serial.serialutil
 
         # Run indefinitely, possible because a Thread was opened
         while True:
 
-            time.sleep(0.0010)  # small delay to break give TSP time to push more data
-
             # Only try to read frames when the serial object is available
             try:
-                
+
                 # Check for lost synchronization and resync if needed
-                l = self.port.readline()
-                
-                img = np.zeros((self.rows, self.columns))
-                
-                if l.decode()[-4:] == "FR0\n":
-                    self.frame = img
-                    self.frame_available = True
-                    continue
-                
-                if l.decode()[-6:] != "FRAME\n":
-                    print("Lost sync '%s'" % (l.decode()))
-                    self.resync()
-
-                # Calculate the frame length
-                length = self.rows * self.columns + 1
-                
-                res =  self.port.read(length)
-                length -= len(res)
+                if not synced:
+                    l = self.port.readline()
+
+                    if l[-4:] == b"FR0\n":
+                        self.ring[self.write_count % self.history].fill(0)
+                        self.publishFrame(time.perf_counter())
+                        continue
+
+                    if l[-6:] != b"FRAME\n":
+                        print("Lost sync '%s'" % (l.decode(errors="replace")))
+                        self.resync()
+                synced = False
+
+                res = self.port.read(length)
 
                 # Continue reading until the specified length is reached
-                while length != 0:
-                    l = self.port.read(length)
-                    length -= len(l)
-                    res += l
-
-                # Process the received data into the frame
-                r = 0
-                c = 0
-                for v in res[:-1]:
-                    img[r][c] = 1.5 * (v)
-                    c += 1
-                    if c == self.columns:
-                        c = 0
-                        r += 1
-
-                # Update the frame with clipped and rotated image data
-                self.frame = np.clip(np.rot90(img, 2), 0, 255)
-                self.frame_available = True
-                
-                
+                while len(res) != length:
+                    res += self.port.read(length - len(res))
+
+                timestamp = time.perf_counter()
+
+                # Process the received data into the next ring slot: scale, rotate by 180 degrees and clip
+                slot = self.ring[self.write_count % self.history]
+                img = np.frombuffer(res, dtype=np.uint8, count=cells).reshape(self.rows, self.columns)
+                np.multiply(img[::-1, ::-1], 1.5, out=slot)
+                np.clip(slot, 0, 255, out=slot)
+                self.publishFrame(timestamp)
+
                 self.availabool = True
 
             # Make the serial flag unavailable if serial is closed
             except serial.serialutil.SerialException:
                 self.availabool = False
+                time.sleep(0.1)
+
+    def publishFrame(self, timestamp: float) -> None:
+        """
+        Makes the frame decoded into the next ring buffer slot available.
+
+        Incrementing the write counter is atomic, so readers never see a half
+        decoded frame and no lock is needed.
+
+        Parameters
+        ----------
+        timestamp : float
+            time.perf_counter() at which the frame was received.
+
+        Returns
+        -------
+        None
+        """
+        slot = self.write_count % self.history
+        self.ring_times[slot] = timestamp
+        self.frame = self.ring[slot]
+        self.write_count += 1
+        self.frame_available = True
 
     def readFrame(self) -> np.array:
         """
         Returns the current frame data.
 
+        Frames that arrived before the current one are skipped, use readFrames
+        to get all of them.
+
         Returns
         -------
         np.ndarray
@@ -180,11 +230,75 @@ class TSPDecoder:
         
         if self.frame_available:
             self.frame_available = False
-            return self.frame
+            self.read_count = self.write_count
+            # Copy, the ring buffer slot is reused by the update thread
+            return self.frame.copy()
         else:
             return None
 
+    def readFrames(self) -> tuple:
+        """
+        Returns all frames received since the last read, with their timestamps.
+
+        Frames that were overwritten in the ring buffer before they could be
+        read are counted in frames_dropped.
 
+        Returns
+        -------
+        frames : np.ndarray
+            3D NumPy array of shape (n, rows, columns), oldest frame first.
+        timestamps : np.ndarray
+            time.perf_counter() at which each frame was received.
+        """
+        end = self.write_count
+        # The oldest slot is the one the update thread is writing into
+        start = max(self.read_count, end - self.history + 1)
+        indices = np.arange(start, end) % self.history
+        frames = self.ring[indices]
+        timestamps = self.ring_times[indices]
+
+        # Frames published while copying may have overwritten the oldest copied slots
+        overwritten = min(max(self.write_count - self.history + 1 - start, 0), len(indices))
+        frames = frames[overwritten:]
+        timestamps = timestamps[overwritten:]
+
+        self.frames_dropped += start - self.read_count + overwritten
+        self.read_count = end
+        self.frame_available = False
+        return frames, timestamps
+
+    def frameRate(self) -> float:
+        """
+        Returns the measured frame rate of the TSP stream.
+
+        Returns
+        -------
+        float
+            Frames per second over the frames currently held in the ring buffer.
+        """
+        end = self.write_count
+        count = min(end, self.history - 1)
+        if count < 2:
+            return 0.0
+        newest = self.ring_times[(end - 1) % self.history]
+        oldest = self.ring_times[(end - count) % self.history]
+        return float((count - 1) / (newest - oldest)) if newest > oldest else 0.0
+
+    def getStats(self) -> dict:
+        """
+        Returns the frame, drop and resync counters.
+
+        Returns
+        -------
+        dict
+            frames_received, frames_dropped, resyncs and frame_rate.
+        """
+        return {
+            "frames_received": self.write_count,
+            "frames_dropped": self.frames_dropped,
+            "resyncs": self.resyncs,
+            "frame_rate": self.frameRate()
+        }
 
     def available(self) -> bool:
         """
@@ -211,6 +325,8 @@ class TSPDecoder:
         device : serial.tools.list_ports_common.ListPortInfo
             Full device path.
         """
+        import serial.tools.list_ports
+
         # Get all available ports
         ports = list(serial.tools.list_ports.comports())
         device = None
@@ -0,0 +1,388 @@
+"""
+Imports track drawings into the grid schema written by track_edit.py, so real
+course layouts can be used for training.
+
+Two kinds of drawings are supported:
+
+- Bitmaps (PNG, BMP, ... anything pygame.image.load reads): light pixels are
+  track, dark or transparent pixels are wall.
+- SVG files with a centerline as a <polyline>, <polygon> or a <path> of straight
+  segments (M, L, H, V, Z). The track is every point within half the stroke
+  width of the line.
+
+The drawing is rasterized at the chosen number of rows and columns and run
+through utils.track_pipeline.prepare_track, which validates the loop and
+precomputes the start poses, distance field and progress. That is slow for
+large grids, so the result is cached under assets/track_cache/ by the hash of
+the drawing's contents and the import options, and importing the same drawing
+again only loads the file:
+
+    python -m utils.track_import course.png --rows 270 --cols 190
+    python -m utils.track_import course.svg --rows 400 --cols 400 --width 12 --output assets/tracks
+
+Fine grids work best with Track.resample(1), which keeps collisions and rays
+exact when a cell is smaller than the car.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import xml.etree.ElementTree as ET
+import numpy as np
+
+from utils.track_pipeline import distance_field, next_track_path, prepare_track, start_angle, write_track
+
+CACHE_DIR = os.path.join("assets", "track_cache")
+# Part of the cache key, increase it when the rasterization changes so old results are not reused
+CACHE_VERSION = 1
+NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def content_hash(filepath: str, **options) -> str:
+    """
+    Hashes the contents of a file together with the options it is imported with.
+
+    Parameters
+    ----------
+    filepath : str
+        File to hash, its name and location don't matter.
+    **options
+        JSON serializable import options.
+
+    Returns
+    -------
+    str
+        Hex SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(json.dumps({"version": CACHE_VERSION, **options}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def load_image_mask(filepath: str, threshold: int = 128, invert: bool = False) -> np.ndarray:
+    """
+    Reads a bitmap drawing into a track mask at the resolution of the image.
+
+    Parameters
+    ----------
+    filepath : str
+        Image file, any format pygame can load.
+    threshold : int, optional
+        Brightness (0..255) from which a pixel is track.
+    invert : bool, optional
+        Dark pixels are track instead, for drawings of the track in black on white.
+
+    Returns
+    -------
+    np.ndarray
+        2D boolean array (rows, cols), True for track pixels.
+    """
+    import pygame # Only needed for bitmaps, pygame.image.load works without a display
+
+    image = pygame.image.load(filepath)
+    brightness = pygame.surfarray.array3d(image).mean(axis=2).T # surfarray is (x, y)
+    track = brightness < threshold if invert else brightness >= threshold
+    if image.get_flags() & pygame.SRCALPHA:
+        track &= pygame.surfarray.array_alpha(image).T >= 128 # Transparent pixels are outside the track
+    return track
+
+
+def resample_mask(mask: np.ndarray, rows: int, cols: int, samples: int = 4) -> np.ndarray:
+    """
+    Scales a mask to rows x cols cells, a cell is track if most of its area is.
+
+    Parameters
+    ----------
+    mask : np.ndarray
+        2D boolean array at any resolution.
+    rows, cols : int
+        Size of the result.
+    samples : int, optional
+        Points per cell and axis the area is estimated from.
+
+    Returns
+    -------
+    np.ndarray
+        2D boolean array (rows, cols).
+    """
+    height, width = mask.shape
+    y = ((np.arange(rows * samples) + 0.5) * height / (rows * samples)).astype(int)
+    x = ((np.arange(cols * samples) + 0.5) * width / (cols * samples)).astype(int)
+    covered = mask[y[:, None], x[None, :]].reshape(rows, samples, cols, samples).mean(axis=(1, 3))
+    return covered > 0.5
+
+
+def parse_svg_centerline(filepath: str) -> tuple:
+    """
+    Reads the centerline of a track from an SVG file.
+
+    The longest <polyline>, <polygon> or <path> in the file is used. Paths may
+    only contain straight segments, flatten curves in the drawing program first.
+
+    Parameters
+    ----------
+    filepath : str
+        SVG file.
+
+    Raises
+    ------
+    ValueError
+        If the file has no usable line.
+
+    Returns
+    -------
+    points : np.ndarray
+        Array (N, 2) of (x, y) points in SVG user units.
+    width : float or None
+        stroke-width of the line, None if it isn't set.
+    closed : bool
+        Whether the line is a closed loop.
+    bounds : tuple
+        (x, y, width, height) of the drawing, from the viewBox or the size of the SVG.
+    """
+    root = ET.parse(filepath).getroot()
+    lines = []
+    for element in root.iter():
+        tag = element.tag.rsplit("}", 1)[-1] # Strip the SVG namespace
+        if tag in ("polyline", "polygon"):
+            values = [float(v) for v in NUMBER.findall(element.get("points", ""))]
+            points, closed = np.array(values[:len(values) // 2 * 2]).reshape(-1, 2), tag == "polygon"
+        elif tag == "path":
+            points, closed = parse_path(element.get("d", ""))
+        else:
+            continue
+        if len(points) >= 2:
+            lines.append((points, stroke_width(element), closed))
+    if not lines:
+        raise ValueError(f"No polyline, polygon or path in {filepath}")
+    points, width, closed = max(lines, key=lambda line: np.hypot(*np.diff(line[0], axis=0).T).sum())
+    closed = closed or bool(np.allclose(points[0], points[-1]))
+
+    if root.get("viewBox"):
+        bounds = tuple(float(v) for v in NUMBER.findall(root.get("viewBox")))
+    elif root.get("width") and root.get("height"):
+        bounds = (0.0, 0.0, float(NUMBER.match(root.get("width")).group()), float(NUMBER.match(root.get("height")).group()))
+    else:
+        # No canvas size, fit the line with room for the track on every side
+        pad = width or 0
+        low, high = points.min(axis=0) - pad, points.max(axis=0) + pad
+        bounds = (low[0], low[1], high[0] - low[0], high[1] - low[1])
+    return points, width, closed, bounds
+
+
+def stroke_width(element):
+    """Returns the stroke-width of an SVG element from its attribute or style, None if it isn't set."""
+    style = dict(map(str.strip, item.split(":", 1)) for item in element.get("style", "").split(";") if ":" in item)
+    value = element.get("stroke-width") or style.get("stroke-width")
+    match = NUMBER.match(value) if value else None
+    return float(match.group()) if match else None
+
+
+def parse_path(d: str) -> tuple:
+    """
+    Converts the d attribute of an SVG path with straight segments into points.
+
+    Parameters
+    ----------
+    d : str
+        Path data with M, L, H, V and Z commands, absolute or relative.
+
+    Raises
+    ------
+    ValueError
+        If the path contains curves or arcs.
+
+    Returns
+    -------
+    points : np.ndarray
+        Array (N, 2) of the points along the path.
+    closed : bool
+        True if the path ends with Z.
+    """
+    points, closed = [], False
+    x = y = 0.0
+    for command, arguments in re.findall(r"([A-Za-z])([^A-Za-z]*)", d):
+        values = [float(v) for v in NUMBER.findall(arguments)]
+        relative = command.islower()
+        if command in "Zz":
+            closed = True
+            continue
+        if command not in "MmLlHhVv":
+            raise ValueError(f"Path command {command} is not supported, only straight segments (M, L, H, V, Z)")
+        if command in "Hh":
+            moves = [(v, None) for v in values]
+        elif command in "Vv":
+            moves = [(None, v) for v in values]
+        else:
+            moves = list(zip(values[::2], values[1::2]))
+        for px, py in moves:
+            # Relative coordinates are relative to the previous point, also within one command
+            if px is not None:
+                x = px + x if relative else px
+            if py is not None:
+                y = py + y if relative else py
+            points.append((x, y))
+    return np.array(points, dtype=float).reshape(-1, 2), closed
+
+
+def rasterize_centerline(points: np.ndarray, width: float, bounds: tuple, rows: int, cols: int,
+                         closed: bool = True) -> np.ndarray:
+    """
+    Marks every cell whose center is within width / 2 of the centerline as track.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        Array (N, 2) of (x, y) points of the centerline.
+    width : float
+        Track width in the units of the points.
+    bounds : tuple
+        (x, y, width, height) of the drawing that is mapped onto the grid.
+    rows, cols : int
+        Size of the grid.
+    closed : bool, optional
+        Connect the last point to the first.
+
+    Returns
+    -------
+    np.ndarray
+        2D boolean array (rows, cols).
+    """
+    left, top, extent_x, extent_y = bounds
+    cell_x, cell_y = extent_x / cols, extent_y / rows
+    centers_x = left + (np.arange(cols) + 0.5) * cell_x
+    centers_y = top + (np.arange(rows) + 0.5) * cell_y
+    if closed and not np.allclose(points[0], points[-1]):
+        points = np.vstack([points, points[:1]])
+
+    track = np.zeros((rows, cols), dtype=bool)
+    radius = width / 2
+    for start, end in zip(points[:-1], points[1:]):
+        # Only the cells in the bounding box of the segment and its width can be close enough
+        low, high = np.minimum(start, end) - radius, np.maximum(start, end) + radius
+        c0, c1 = np.searchsorted(centers_x, [low[0], high[0]])
+        r0, r1 = np.searchsorted(centers_y, [low[1], high[1]])
+        if c0 >= c1 or r0 >= r1:
+            continue
+        x, y = centers_x[None, c0:c1], centers_y[r0:r1, None]
+        direction = end - start
+        length_squared = max(direction @ direction, 1e-12)
+        t = np.clip(((x - start[0]) * direction[0] + (y - start[1]) * direction[1]) / length_squared, 0, 1)
+        distance_squared = (x - start[0] - t * direction[0]) ** 2 + (y - start[1] - t * direction[1]) ** 2
+        track[r0:r1, c0:c1] |= distance_squared <= radius ** 2
+    return track
+
+
+def choose_start_pos(track: np.ndarray) -> tuple:
+    """
+    Picks the start position farthest from the walls that has room to start to the right or left.
+
+    Parameters
+    ----------
+    track : np.ndarray
+        2D boolean array of track cells.
+
+    Raises
+    ------
+    ValueError
+        If no cell has room to start.
+
+    Returns
+    -------
+    tuple
+        (row, column) of the start position.
+    """
+    distance = distance_field(track)
+    cells = np.argwhere(track)
+    for r, c in cells[np.argsort(-distance[track], kind="stable")]:
+        if start_angle(track, r, c) in (0, 180):
+            return int(r), int(c)
+    raise ValueError("No cell on the track has room to start")
+
+
+def import_track(filepath: str, rows: int, cols: int, width: float = None, threshold: int = 128,
+                 invert: bool = False, start_pos: tuple = None, min_width: int = 1,
+                 cache_dir: str = CACHE_DIR) -> str:
+    """
+    Converts a bitmap or SVG drawing into a track file, or returns the cached conversion.
+
+    Parameters
+    ----------
+    filepath : str
+        PNG/bitmap or SVG drawing.
+    rows, cols : int
+        Resolution of the track grid.
+    width : float, optional
+        Track width of SVG centerlines in SVG units, defaults to the stroke-width of the line.
+    threshold : int, optional
+        Brightness from which a bitmap pixel is track.
+    invert : bool, optional
+        Dark bitmap pixels are track instead.
+    start_pos : tuple, optional
+        (row, column) of the start position in the grid, by default the free cell farthest from the walls.
+    min_width : int, optional
+        Minimum corridor width in cells, see prepare_track.
+    cache_dir : str, optional
+        Directory of the cached track files.
+
+    Raises
+    ------
+    ValueError
+        If the drawing can't be read or isn't a drivable loop at this resolution.
+
+    Returns
+    -------
+    str
+        Path of the track file, load it with Track(path, width, height).
+    """
+    options = {"rows": rows, "cols": cols, "width": width, "threshold": threshold, "invert": invert,
+               "start_pos": list(start_pos) if start_pos is not None else None, "min_width": min_width}
+    cache_path = os.path.join(cache_dir, content_hash(filepath, **options)[:32] + ".json")
+    if os.path.exists(cache_path):
+        return cache_path
+
+    if filepath.lower().endswith(".svg"):
+        points, stroke, closed, bounds = parse_svg_centerline(filepath)
+        width = width if width is not None else stroke
+        if width is None:
+            raise ValueError("The SVG line has no stroke-width, pass the track width")
+        track = rasterize_centerline(points, width, bounds, rows, cols, closed)
+    else:
+        track = resample_mask(load_image_mask(filepath, threshold, invert), rows, cols)
+
+    data = prepare_track(track, start_pos if start_pos is not None else choose_start_pos(track), min_width)
+    os.makedirs(cache_dir, exist_ok=True)
+    write_track(data, cache_path)
+    print(f"Imported {filepath} as a {rows}x{cols} track: {cache_path}")
+    return cache_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a bitmap or SVG track drawing as a track file")
+    parser.add_argument("drawing")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--cols", type=int, required=True)
+    parser.add_argument("--width", type=float, help="track width of an SVG centerline, defaults to its stroke-width")
+    parser.add_argument("--threshold", type=int, default=128, help="brightness from which a bitmap pixel is track")
+    parser.add_argument("--invert", action="store_true", help="dark bitmap pixels are track")
+    parser.add_argument("--start", help="start position as row,column, defaults to the widest part of the track")
+    parser.add_argument("--min-width", type=int, default=1)
+    parser.add_argument("--output", help="copy the track to this file, or to the next track_N.json in this directory")
+    args = parser.parse_args()
+
+    start = tuple(int(v) for v in args.start.split(",")) if args.start else None
+    try:
+        path = import_track(args.drawing, args.rows, args.cols, args.width, args.threshold, args.invert,
+                            start, args.min_width)
+    except ValueError as e:
+        print(f"Could not import {args.drawing}: {e}")
+        raise SystemExit(1)
+    if args.output:
+        destination = next_track_path(args.output) if os.path.isdir(args.output) else args.output
+        shutil.copyfile(path, destination)
+        print(f"Saved {destination}")
@@ -0,0 +1,405 @@
+import json
+import os
+import re
+import tempfile
+from collections import deque
+import numpy as np
+
+# Offsets of the 4-connected neighbors, the car can't pass between cells that only touch diagonally
+NEIGHBORS_4 = ((-1, 0), (1, 0), (0, -1), (0, 1))
+NEIGHBORS_8 = NEIGHBORS_4 + ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+# Start angles, 0 is right and positive is counter-clockwise like Car.angle
+DIRECTIONS = {0: (0, 1), 180: (0, -1), 90: (-1, 0), 270: (1, 0)}
+
+
+def binarize_layout(layout, threshold: float = 0) -> np.ndarray:
+    """
+    Converts a drawn layout with pressure values into track (1) and wall (0) cells.
+
+    Parameters
+    ----------
+    layout : array_like
+        2D layout, every value above the threshold is a track cell.
+    threshold : float, optional
+        Pressure value a cell needs to exceed to become track.
+
+    Returns
+    -------
+    np.ndarray
+        2D uint8 array of zeros and ones.
+    """
+    return (np.asarray(layout) > threshold).astype(np.uint8)
+
+
+def label_components(mask: np.ndarray, neighbors=NEIGHBORS_4) -> tuple:
+    """
+    Labels the connected components of a boolean mask with a breadth first search.
+
+    Parameters
+    ----------
+    mask : np.ndarray
+        2D boolean array.
+    neighbors : tuple, optional
+        Neighbor offsets, NEIGHBORS_4 or NEIGHBORS_8.
+
+    Returns
+    -------
+    labels : np.ndarray
+        2D int array, -1 outside the mask and the component index inside.
+    count : int
+        Number of components.
+    """
+    rows, cols = mask.shape
+    labels = np.full(mask.shape, -1, dtype=int)
+    count = 0
+    for r, c in zip(*np.nonzero(mask)):
+        if labels[r, c] >= 0:
+            continue
+        labels[r, c] = count
+        queue = deque([(r, c)])
+        while queue:
+            y, x = queue.popleft()
+            for dy, dx in neighbors:
+                ny, nx = y + dy, x + dx
+                if 0 <= ny < rows and 0 <= nx < cols and mask[ny, nx] and labels[ny, nx] < 0:
+                    labels[ny, nx] = count
+                    queue.append((ny, nx))
+        count += 1
+    return labels, count
+
+
+def encloses_infield(track: np.ndarray) -> bool:
+    """
+    Checks whether the track forms a loop, i.e. surrounds at least one wall
+    region that is not connected to the outside of the grid.
+
+    Parameters
+    ----------
+    track : np.ndarray
+        2D boolean array of track cells.
+
+    Returns
+    -------
+    bool
+        True if the track encloses an infield.
+    """
+    # Pad with walls so everything outside the grid is one region. Walls are
+    # 8-connected, they leak through diagonal gaps the car can't drive through.
+    walls = np.pad(~track, 1, constant_values=True)
+    labels, count = label_components(walls, NEIGHBORS_8)
+    return count > 1
+
+
+def corridor_mask(track: np.ndarray, width: int) -> np.ndarray:
+    """
+    Returns the part of the track that is at least `width` cells wide.
+
+    This is a morphological opening with a width x width square: a cell is kept
+    if it belongs to a fully drivable width x width block.
+
+    Parameters
+    ----------
+    track : np.ndarray
+        2D boolean array of track cells.
+    width : int
+        Minimum corridor width in cells.
+
+    Returns
+    -------
+    np.ndarray
+        2D boolean array of the cells in wide enough corridors.
+    """
+    if width <= 1:
+        return track.copy()
+    rows, cols = track.shape
+    # Top left corners of the blocks that fit
+    fits = np.ones((rows - width + 1, cols - width + 1), dtype=bool)
+    for dr in range(width):
+        for dc in range(width):
+            fits &= track[dr:dr + rows - width + 1, dc:dc + cols - width + 1]
+    # Cells covered by any fitting block
+    opened = np.zeros_like(track)
+    for dr in range(width):
+        for dc in range(width):
+            opened[dr:dr + rows - width + 1, dc:dc + cols - width + 1] |= fits
+    return opened
+
+
+def distance_field(track: np.ndarray) -> np.ndarray:
+    """
+    Computes the 4-connected distance of every cell to the nearest wall.
+
+    Cells outside the grid count as walls, so wall cells are 0 and track cells
+    next to a wall are 1.
+
+    Parameters
+    ----------
+    track : np.ndarray
+        2D boolean array of track cells.
+
+    Returns
+    -------
+    np.ndarray
+        2D int array of distances in cells.
+    """
+    walls = np.pad(~track, 1, constant_values=True)
+    distance = np.where(walls, 0, -1)
+    queue = deque(zip(*np.nonzero(walls)))
+    rows, cols = walls.shape
+    while queue:
+        y, x = queue.popleft()
+        for dy, dx in NEIGHBORS_4:
+            ny, nx = y + dy, x + dx
+            if 0 <= ny < rows and 0 <= nx < cols and distance[ny, nx] < 0:
+                distance[ny, nx] = distance[y, x] + 1
+                queue.append((ny, nx))
+    return distance[1:-1, 1:-1]
+
+
+def start_angle(track: np.ndarray, r: int, c: int, clearance: int = 2):
+    """
+    Returns the direction a car can start in from a cell.
+
+    Like Track.randomize_start_pos, right is preferred over left, vertical
+    directions are only used when neither horizontal one is free.
+
+    Parameters
+    ----------
+    track : np.ndarray
+        2D boolean array of track cells.
+    r, c : int
+        Cell of the start position.
+    clearance : int, optional
+        Number of free cells needed in front of the car.
+
+    Returns
+    -------
+    int or None
+        Start angle in degrees, None if no direction is free.
+    """
+    rows, cols = track.shape
+    for angle, (dr, dc) in DIRECTIONS.items():
+        cells = [(r + dr * i, c + dc * i) for i in range(1, clearance + 1)]
+        if all(0 <= y < rows and 0 <= x < cols and track[y, x] for y, x in cells):
+            return angle
+    return None
+
+
+def find_start_poses(track: np.ndarray, distance: np.ndarray) -> list:
+    """
+    Finds start poses for training, preferring cells away from the walls.
+
+    A pose is a track cell with two free cells to its right or left, the same
+    rule Track.randomize_start_pos uses. When there are cells at least two
+    cells away from every wall, only those are used.
+
+    Parameters
+    ----------
+    track : np.ndarray
+        2D boolean array of track cells.
+    distance : np.ndarray
+        Distance field of the track.
+
+    Returns
+    -------
+    list[list[int]]
+        [row, column, angle] for every start pose.
+    """
+    poses = []
+    for r, c in zip(*np.nonzero(track)):
+        angle = start_angle(track, r, c)
+        if angle in (0, 180):
+            poses.append([int(r), int(c), angle, int(distance[r, c])])
+    best = max((pose[3] for pose in poses), default=0)
+    minimum = min(best, 2)
+    return [pose[:3] for pose in poses if pose[3] >= minimum]
+
+
+def progress_index(track: np.ndarray, start_pos: tuple, angle: int) -> np.ndarray:
+    """
+    Computes how far along the loop every cell is, seen from the start position.
+
+    The corridor is cut at the start cell, perpendicular to the start direction,
+    and the track is flooded from the cells in front of the cut. The result is
+    the number of cells driven to reach a cell, normalized to 0..1, so it grows
+    monotonically around the loop. Walls and unreachable cells are -1.
+
+    Parameters
+    ----------
+    track : np.ndarray
+        2D boolean array of track cells.
+    start_pos : tuple
+        (row, column) of the start cell.
+    angle : int
+        Start angle, one of the DIRECTIONS.
+
+    Returns
+    -------
+    np.ndarray
+        2D float array with the progress of every cell.
+    """
+    rows, cols = track.shape
+    r, c = start_pos
+    dr, dc = DIRECTIONS[angle]
+
+    # The cross section of the corridor through the start cell
+    cut = [(r, c)]
+    for sign in (-1, 1):
+        y, x = r + dc * sign, c + dr * sign
+        while 0 <= y < rows and 0 <= x < cols and track[y, x]:
+            cut.append((y, x))
+            y, x = y + dc * sign, x + dr * sign
+
+    steps = np.full(track.shape, -1, dtype=int)
+    for y, x in cut:
+        steps[y, x] = 0
+    queue = deque()
+    for y, x in cut:
+        ny, nx = y + dr, x + dc
+        if 0 <= ny < rows and 0 <= nx < cols and track[ny, nx] and steps[ny, nx] < 0:
+            steps[ny, nx] = 1
+            queue.append((ny, nx))
+    while queue:
+        y, x = queue.popleft()
+        for ny, nx in ((y + oy, x + ox) for oy, ox in NEIGHBORS_4):
+            if 0 <= ny < rows and 0 <= nx < cols and track[ny, nx] and steps[ny, nx] < 0:
+                steps[ny, nx] = steps[y, x] + 1
+                queue.append((ny, nx))
+
+    progress = np.full(track.shape, -1.0)
+    reached = steps >= 0
+    progress[reached] = steps[reached] / max(steps.max(), 1)
+    return progress
+
+
+def prepare_track(layout, start_pos, min_width: int = 1) -> dict:
+    """
+    Validates and normalizes a drawn track and precomputes its derived data.
+
+    The layout is binarized and cells that are not 4-connected to the start
+    position are dropped. The track must form a loop that is at least
+    `min_width` cells wide everywhere along it.
+
+    Parameters
+    ----------
+    layout : array_like
+        2D layout as drawn, with pressure values.
+    start_pos : tuple
+        (row, column) of the start position.
+    min_width : int, optional
+        Minimum corridor width in cells. One cell already fits the car, the
+        loop check still rejects corridors that only touch diagonally.
+
+    Raises
+    ------
+    ValueError
+        If the track is not a drivable loop.
+
+    Returns
+    -------
+    dict
+        The track file contents: layout, start_pos, start_poses and progress.
+    """
+    track = binarize_layout(layout).astype(bool)
+    start_pos = (int(start_pos[0]), int(start_pos[1]))
+    if not track.any():
+        raise ValueError("Track is empty")
+    if not track[start_pos]:
+        raise ValueError(f"Start position {start_pos} is not on the track")
+
+    # Keep only the part of the track the car can reach from the start
+    labels, count = label_components(track)
+    if count > 1:
+        dropped = int(np.sum(track & (labels != labels[start_pos])))
+        print(f"Dropping {dropped} track cells not connected to the start position")
+        track = labels == labels[start_pos]
+
+    if not encloses_infield(track):
+        raise ValueError("Track does not form a loop")
+
+    # The loop has to survive removing every corridor narrower than min_width
+    corridors = corridor_mask(track, min_width)
+    labels, _ = label_components(corridors)
+    loops = [label for label in np.unique(labels[corridors]) if encloses_infield(labels == label)]
+    if not loops:
+        raise ValueError(f"Track is narrower than {min_width} cells somewhere along the loop")
+
+    angle = start_angle(track, *start_pos)
+    if angle is None:
+        raise ValueError(f"No free direction to start in from {start_pos}")
+
+    distance = distance_field(track)
+    start_poses = find_start_poses(track, distance)
+    if not start_poses:
+        raise ValueError("Track has no valid start poses")
+
+    # The distance field and start angle only pick the start poses and the direction of progress, they aren't stored
+    return {
+        "layout": track.astype(int).tolist(),
+        "start_pos": list(start_pos),
+        "start_poses": start_poses,
+        "progress": np.round(progress_index(track, start_pos, angle), 4).tolist()
+    }
+
+
+def next_track_path(directory: str) -> str:
+    """
+    Returns the path of the next free track_N.json file in a directory.
+
+    Parameters
+    ----------
+    directory : str
+        Directory the tracks are saved in.
+
+    Returns
+    -------
+    str
+        Path with N one higher than the highest existing track number.
+    """
+    numbers = [int(m.group(1)) for m in (re.fullmatch(r"track_(\d+)\.json", f) for f in os.listdir(directory)) if m]
+    return os.path.join(directory, f"track_{max(numbers, default=-1) + 1}.json")
+
+
+def write_track(data: dict, filepath: str) -> None:
+    """
+    Writes a track file atomically in compact JSON.
+
+    The data is written to a temporary file in the same directory which then
+    replaces the target, so a crash never leaves a half written track behind.
+
+    Parameters
+    ----------
+    data : dict
+        Track file contents.
+    filepath : str
+        Destination path.
+
+    Returns
+    -------
+    None
+    """
+    directory = os.path.dirname(filepath) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Normalize existing track files in place: python -m utils.track_pipeline assets/tracks/*.json
+    for path in sys.argv[1:]:
+        with open(path, "r") as f:
+            data = json.load(f)
+        try:
+            write_track(prepare_track(data["layout"], data["start_pos"]), path)
+            print(f"Prepared {path}")
+        except ValueError as e:
+            print(f"Skipping {path}: {e}")
@@ -0,0 +1,384 @@
+import os
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from utils.protocol import NUM_RAYS, encode_sensor_frame
+
+
+def open_serial(port: str, baudrate: int = 9600, timeout: float = 1):
+    """
+    Opens a serial port, or a simulated device for "sim://" URLs.
+
+    Supported simulated devices:
+
+    - sim://car?track=assets/tracks/track_0.json&rate=0&protocol=ascii
+    - sim://replay?file=trace.txt&rate=50&protocol=ascii
+    - sim://tsp?rows=27&columns=19&rate=0
+
+    A rate of 0 produces data as fast as the host consumes it. Anything else is
+    passed on to `serial.serial_for_url`, so real ports and pyserial URLs
+    (e.g. "loop://") keep working.
+
+    Parameters
+    ----------
+    port : str
+        Port name or URL.
+    baudrate : int, optional
+        Baud rate of a real port, ignored by simulated devices.
+    timeout : float, optional
+        Read timeout in seconds.
+
+    Returns
+    -------
+    serial.Serial or VirtualSerial
+        An object with the `serial.Serial` read/write interface.
+    """
+    if not port.startswith("sim://"):
+        import serial
+        return serial.serial_for_url(port, baudrate, timeout=timeout)
+
+    url = urlparse(port)
+    options = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    rate = float(options.get("rate", 0))
+    protocol = options.get("protocol", "ascii")  # What the firmware in the repo sends
+
+    if url.netloc == "car":
+        device = SimulatedCar(options.get("track", "assets/tracks/track_0.json"), rate=rate, protocol=protocol)
+    elif url.netloc == "replay":
+        device = TraceReplay.from_file(options["file"], rate=rate, protocol=protocol)
+    elif url.netloc == "tsp":
+        device = SimulatedTSP(int(options.get("rows", 27)), int(options.get("columns", 19)), rate=rate)
+    else:
+        raise ValueError(f"Unknown simulated device '{url.netloc}' in {port}")
+
+    return VirtualSerial(device, port=port, baudrate=baudrate, timeout=timeout)
+
+
+class VirtualSerial:
+    """
+    In-memory stand-in for `serial.Serial` connected to a simulated device.
+
+    Bytes produced by the device are buffered until the host reads them, bytes
+    written by the host are handed to the device. Only the part of the pyserial
+    interface used by the control scripts and the TSPDecoder is implemented.
+    """
+
+    def __init__(self, device, port: str = "sim://", baudrate: int = 9600, timeout: float = 1):
+        """
+        Initializes the VirtualSerial instance and starts the device.
+
+        Parameters
+        ----------
+        device : SimulatedDevice
+            The device on the other end of the line.
+        port : str, optional
+            Name reported as `port`/`name`.
+        baudrate : int, optional
+            Reported baud rate, the transfer itself is not throttled.
+        timeout : float, optional
+            Read timeout in seconds, None blocks forever.
+        """
+        self.port = port
+        self.name = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+
+        self.buffer = bytearray()
+        self.condition = threading.Condition()
+
+        self.device = device
+        self.device.start(self)
+
+    @property
+    def in_waiting(self) -> int:
+        """Number of bytes waiting to be read."""
+        return len(self.buffer)
+
+    def feed(self, data: bytes) -> None:
+        """Called by the device to make bytes available to the host."""
+        with self.condition:
+            self.buffer += data
+            self.condition.notify_all()
+
+    def _wait_for(self, ready) -> None:
+        """Blocks until `ready()` is true, the port closes or the timeout expires."""
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        while self.is_open and not ready():
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                break
+            self.condition.wait(remaining)
+
+    def read(self, size: int = 1) -> bytes:
+        with self.condition:
+            self._wait_for(lambda: len(self.buffer) >= size)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+    def readline(self) -> bytes:
+        with self.condition:
+            self._wait_for(lambda: b"\n" in self.buffer)
+            end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+            data = bytes(self.buffer[:end])
+            del self.buffer[:end]
+            return data
+
+    def write(self, data: bytes) -> int:
+        if not self.is_open:
+            import serial
+            raise serial.SerialException("Attempting to use a port that is not open")
+        self.device.receive(bytes(data))
+        return len(data)
+
+    def reset_input_buffer(self) -> None:
+        with self.condition:
+            self.buffer.clear()
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.device.stop()
+        with self.condition:
+            self.is_open = False
+            self.condition.notify_all()
+
+
+class PtyBridge:
+    """
+    Exposes a simulated device on a pseudo terminal (Linux/macOS only).
+
+    The slave side (`port`) can be opened with `serial.Serial` by any program,
+    so the scripts can be tested unchanged against the simulation.
+    """
+
+    def __init__(self, device):
+        """
+        Initializes the PtyBridge instance and starts the device.
+
+        Parameters
+        ----------
+        device : SimulatedDevice
+            The device on the other end of the line.
+        """
+        import tty
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.in_waiting = 0  # The pty applies its own backpressure
+        self.is_open = True
+
+        self.device = device
+        self.device.start(self)
+
+        readThread = threading.Thread(target=self._forward_writes)
+        readThread.daemon = True
+        readThread.start()
+
+    def feed(self, data: bytes) -> None:
+        os.write(self.master, data)
+
+    def _forward_writes(self) -> None:
+        """Hands everything the host writes to the pty over to the device."""
+        while self.is_open:
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                break
+            if data:
+                self.device.receive(data)
+
+    def close(self) -> None:
+        self.is_open = False
+        self.device.stop()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class SimulatedDevice:
+    """
+    Base class for simulated serial devices.
+
+    A background thread calls `step` `rate` times per second (or as fast as the
+    host reads when the rate is 0) and sends the returned bytes to the host.
+    """
+
+    MAX_BUFFER = 4096  # Bytes the host may lag behind before the device pauses
+
+    def __init__(self, rate: float = 0):
+        self.rate = rate
+        self.sink = None
+        self.running = False
+        self.messages_sent = 0
+
+    def start(self, sink) -> None:
+        self.sink = sink
+        self.running = True
+        deviceThread = threading.Thread(target=self.run)
+        deviceThread.daemon = True
+        deviceThread.start()
+
+    def stop(self) -> None:
+        self.running = False
+
+    def run(self) -> None:
+        interval = 1 / self.rate if self.rate else 0
+        next_time = time.perf_counter()
+        while self.running:
+            if self.sink.in_waiting > self.MAX_BUFFER:
+                time.sleep(0.0005)
+                continue
+            data = self.step()
+            if data is None:
+                break
+            self.sink.feed(data)
+            self.messages_sent += 1
+
+            if interval:
+                next_time += interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def step(self) -> bytes:
+        """Returns the bytes of the next message, or None when the device is done."""
+        raise NotImplementedError
+
+    def receive(self, data: bytes) -> None:
+        """Handles bytes written by the host."""
+        pass
+
+
+class SimulatedCar(SimulatedDevice):
+    """
+    Physical car stand-in backed by a headless `Car` driving on a `Track`.
+
+    Every step the car applies the last command it received, moves one
+    simulation tick and sends its ray distances (in pixels) using either the
+    binary or the ASCII protocol. Crashed cars are respawned at a random start
+    position. Commands are understood in both the one-byte and "L,0" forms.
+    """
+
+    def __init__(self, track_path: str, rate: float = 0, protocol: str = "ascii", width: int = 1000, height: int = 1000):
+        super().__init__(rate)
+        from objects.track import Track
+        from objects.car import Car
+
+        self.protocol = protocol
+        self.track = Track(track_path, width, height)
+        self.car = Car(0, 0, self.track)
+        self.steering = 0
+        self.stopped = True
+        self.seq = 0
+        self.commands_received = 0
+        self.respawn()
+
+    def respawn(self) -> None:
+        start_angle, start_pos = self.track.randomize_start_pos()
+        self.car.x, self.car.y = self.track.pixel_to_world(start_pos[1], start_pos[0])
+        self.car.angle = start_angle
+        self.car.is_alive = True
+        self.car.stuck_frames = 0
+        self.car.distance_traveled = 0
+
+    def step(self) -> bytes:
+        if not self.car.is_alive:
+            self.respawn()
+        if not self.stopped:
+            self.car.control(self.steering, 0.2)
+        distances = [length * self.car.max_ray_length for length in self.car.ray_cast()]
+
+        self.seq += 1
+        if self.protocol == "binary":
+            return encode_sensor_frame(self.seq, distances)
+        return (",".join(f"{d:.2f}" for d in distances) + "\r\n").encode()
+
+    def receive(self, data: bytes) -> None:
+        for command in data.upper():
+            command = chr(command)
+            if command in "LRF":
+                self.steering = {"L": 1, "R": -1, "F": 0}[command]
+                self.stopped = False
+                self.commands_received += 1
+            elif command == "S":
+                self.stopped = True
+                self.commands_received += 1
+
+
+class TraceReplay(SimulatedDevice):
+    """
+    Replays recorded sensor readings, optionally looping forever.
+    """
+
+    def __init__(self, readings, rate: float = 0, protocol: str = "ascii", loop: bool = True):
+        super().__init__(rate)
+        self.readings = [list(reading) for reading in readings]
+        self.protocol = protocol
+        self.loop = loop
+        self.index = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs):
+        """
+        Loads readings from a text trace, one "d1,d2,d3" line per reading as
+        sent by the ASCII firmware. Lines that don't parse or don't have
+        NUM_RAYS values (the size of a binary frame) are skipped.
+        """
+        readings = []
+        skipped = 0
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    values = [float(x) for x in line.strip().split(",") if x]
+                except ValueError:
+                    values = None
+                if values and len(values) == NUM_RAYS:
+                    readings.append(values)
+                elif line.strip():
+                    skipped += 1
+        if skipped:
+            print(f"Skipped {skipped} lines of {path} without {NUM_RAYS} readings")
+        return cls(readings, **kwargs)
+
+    def step(self) -> bytes:
+        if self.index >= len(self.readings):
+            if not self.loop or not self.readings:
+                return None
+            self.index = 0
+        distances = self.readings[self.index]
+        self.index += 1
+        if self.protocol == "binary":
+            return encode_sensor_frame(self.index, distances)
+        return (",".join(f"{d:.2f}" for d in distances) + "\r\n").encode()
+
+
+class SimulatedTSP(SimulatedDevice):
+    """
+    Pressure pad stand-in producing the TSP frame stream.
+
+    A pressure blob moves along a circle over the pad, so strokes drawn in
+    `track_edit.py` look like a finger tracing a loop.
+    """
+
+    def __init__(self, rows: int = 27, columns: int = 19, rate: float = 0):
+        super().__init__(rate)
+        self.rows = rows
+        self.columns = columns
+        self.t = 0
+        self.r, self.c = np.mgrid[0:rows, 0:columns]
+
+    def step(self) -> bytes:
+        self.t += 1
+        angle = self.t * 0.02
+        center_r = self.rows / 2 + self.rows / 3 * np.sin(angle)
+        center_c = self.columns / 2 + self.columns / 3 * np.cos(angle)
+        blob = 200 * np.exp(-((self.r - center_r) ** 2 + (self.c - center_c) ** 2) / 2)
+        # The decoder scales by 1.5 and rotates the frame by 180 degrees
+        frame = np.rot90(blob / 1.5, 2).astype(np.uint8)
+        return b"FRAME\n" + frame.tobytes() + b"\n"